@@ -1,7 +1,14 @@
-import networkx as nx
-import matplotlib.pyplot as plt
 import numpy as np
 import argparse
+import csv
+import json
+import os
+import sys
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import gml_stream, graph_cache, render
+from common.bfs import bfs_distances, bfs_many, connected_component_labels
 
 # Layout settings
 DEFAULT_WIDTH = 1        # Default horizontal width of the layout
@@ -13,64 +20,249 @@ TITLE_COLOR = '#3b943a'     # Color for the plot title
 NODE_COLOR = '#c5f542'      # Node color
 EDGE_COLOR = '#000000'      # Edge color
 
-# Make random graph based on equation and save it as gml
-def create_random_graph_in_gml(n, c, my_gml):
+# Edges of G(n, p) in O(n + m) with geometric skipping (Batagelj & Brandes).
+# The pairs (v, w) with w < v are numbered t = v(v-1)/2 + w; the gap between
+# two chosen pairs is geometric with parameter p, so we draw gaps in chunks,
+# add them up and turn every t back into (v, w). Yields (sources, targets).
+def erdos_renyi_edges(n, p, seed=None, chunk_size=1 << 20):
+    total_pairs = n * (n - 1) // 2
+    if p <= 0 or total_pairs == 0:
+        return
+    p = min(p, 1.0)
+    rng = np.random.default_rng(seed)
+    position = -1
+    while position < total_pairs:
+        t = position + np.cumsum(rng.geometric(p, size=chunk_size))
+        position = int(t[-1])
+        t = t[t < total_pairs]
+        if len(t) == 0:
+            continue
+        v = ((1 + np.sqrt(1 + 8 * t.astype(np.float64))) // 2).astype(np.int64)
+        # float sqrt can be off by one for huge t
+        v[v * (v - 1) // 2 > t] -= 1
+        v[(v + 1) * v // 2 <= t] += 1
+        w = t - v * (v - 1) // 2
+        yield w, v
+
+
+# Make random graph based on equation and save it as gml, or as a binary edge
+# list when the output name ends in .edges
+def create_random_graph_in_gml(n, c, my_gml, seed=None):
     p = (c * np.log(n)) / n
-    graph = nx.erdos_renyi_graph(n, p)
     if my_gml:
-        nx.write_gml(graph, my_gml)
-    print(f"Random graph with {n} nodes created and saved to {my_gml}.")
+        edges = erdos_renyi_edges(n, p, seed)
+        if my_gml.endswith(graph_cache.EDGE_LIST_EXTENSION):
+            num_edges = graph_cache.write_edge_list(my_gml, n, edges)
+        else:
+            num_edges = gml_stream.write_gml_edge_chunks(my_gml, n, edges)
+        print(f"Random graph with {n} nodes and {num_edges} edges created and saved to {my_gml}.")
 
-# Function for hierarchical layout positioning
-def hierarchy_pos(G, root=None, width=DEFAULT_WIDTH, vert_gap=DEFAULT_VERT_GAP, vert_loc=0, xcenter=0.5):
-    pos = _hierarchy_pos(G, root, width, vert_gap, vert_loc, xcenter)
-    return pos
+# One replica of the threshold sweep: generate G(n, c ln(n)/n), keep only the
+# statistics and let the arrays go when the function returns
+def _replica_stats(task):
+    n, c, replica, seed, source = task
+    p = (c * np.log(n)) / n
+    chunks = list(erdos_renyi_edges(n, p, seed))
+    sources = np.concatenate([w for w, _ in chunks]) if chunks else np.zeros(0, dtype=np.int64)
+    targets = np.concatenate([v for _, v in chunks]) if chunks else np.zeros(0, dtype=np.int64)
+    offsets, neighbors, _ = graph_cache.build_csr(n, sources, targets, directed=False)
+
+    labels = connected_component_labels(n, sources, targets)
+    sizes = np.bincount(labels, minlength=n)
+    giant = int(sizes.argmax())
+
+    # Double sweep: the eccentricity of the farthest node from a giant
+    # component node is a cheap lower bound on the diameter
+    first = bfs_distances(offsets, neighbors, giant)
+    diameter = int(bfs_distances(offsets, neighbors, int(first.argmax())).max())
 
-def _hierarchy_pos(G, root, width=DEFAULT_WIDTH, vert_gap=DEFAULT_VERT_GAP, vert_loc=0, xcenter=1, pos=None, parent=None):
-    if pos is None:
-        pos = {root: (xcenter, vert_loc)}
+    depth = int(bfs_distances(offsets, neighbors, source).max()) if source < n else -1
+    return {
+        'nodes': n,
+        'constant': c,
+        'replica': replica,
+        'edges': len(sources),
+        'connected': bool(sizes[giant] == n),
+        'components': int(np.count_nonzero(sizes)),
+        'giant_fraction': float(sizes[giant] / n),
+        'diameter_estimate': diameter,
+        'bfs_depth': depth,
+    }
+
+
+# Spread every (n, c, replica) over a process pool and write the averages per
+# (n, c) to a .csv file, or averages plus every replica to a .json file
+def run_ensemble_sweep(node_counts, constants, replicas, results_file, seed=None, source=0, processes=None):
+    seeds = np.random.SeedSequence(seed).spawn(len(node_counts) * len(constants) * replicas)
+    tasks = [(n, c, r, seeds[i], source) for i, (n, c, r) in enumerate(
+        (n, c, r) for n in node_counts for c in constants for r in range(replicas))]
+
+    rows = []
+    with Pool(processes) as pool:
+        for row in pool.imap_unordered(_replica_stats, tasks):
+            rows.append(row)
+            print(f"n={row['nodes']} c={row['constant']} replica {row['replica']}: "
+                  f"connected={row['connected']} giant={row['giant_fraction']:.3f}")
+
+    aggregate = []
+    for n in node_counts:
+        for c in constants:
+            group = [row for row in rows if row['nodes'] == n and row['constant'] == c]
+            aggregate.append({
+                'nodes': n,
+                'constant': c,
+                'replicas': len(group),
+                'p_connected': sum(row['connected'] for row in group) / len(group),
+                'mean_giant_fraction': float(np.mean([row['giant_fraction'] for row in group])),
+                'mean_components': float(np.mean([row['components'] for row in group])),
+                'mean_diameter_estimate': float(np.mean([row['diameter_estimate'] for row in group])),
+                'mean_bfs_depth': float(np.mean([row['bfs_depth'] for row in group])),
+            })
+
+    if results_file.endswith('.json'):
+        rows.sort(key=lambda row: (row['nodes'], row['constant'], row['replica']))
+        with open(results_file, 'w') as f:
+            json.dump({'aggregate': aggregate, 'replicas': rows}, f, indent=2)
     else:
-        pos[root] = (xcenter, vert_loc)
-    
-    children = list(G.neighbors(root))
-    if not isinstance(G, nx.DiGraph) and parent is not None:
-        children.remove(parent)  
-    
-    if len(children) != 0:
-        dx = width / len(children) 
-        nextx = xcenter - width/2 - dx/2
-        for child in children:
-            nextx += dx
-            pos = _hierarchy_pos(G, child, width=dx, vert_gap=vert_gap, vert_loc=vert_loc-vert_gap, xcenter=nextx, pos=pos, parent=root)
-    
-    return pos
+        with open(results_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(aggregate[0]))
+            writer.writeheader()
+            writer.writerows(aggregate)
+    print(f"Sweep of {len(tasks)} graphs saved to {results_file}.")
 
-# Read gml then make BFS then save it as a png
-def perform_bfs_with_hierarchy_layout(gml_filename, start_node):
+
+# Function for hierarchical layout positioning
+def hierarchy_pos(G, root=None, width=DEFAULT_WIDTH, vert_gap=DEFAULT_VERT_GAP, vert_loc=0, xcenter=0.5,
+                  proportional=False):
+    nodes, x, y = hierarchy_layout_arrays(G, root, width, vert_gap, vert_loc, xcenter, proportional)
+    return dict(zip(nodes, zip(x.tolist(), y.tolist())))
+
+# Same layout as NumPy arrays: (nodes, x, y) in BFS order from root
+def hierarchy_layout_arrays(G, root, width=DEFAULT_WIDTH, vert_gap=DEFAULT_VERT_GAP, vert_loc=0, xcenter=0.5,
+                            proportional=False):
+    # Iterative BFS that numbers the tree nodes 0, 1, 2, ... in visit order
+    nodes = [root]
+    index = {root: 0}
+    parent = [-1]
+    depth = [0]
+    head = 0
+    while head < len(nodes):
+        node = nodes[head]
+        for child in G.neighbors(node):
+            if child not in index:
+                index[child] = len(nodes)
+                nodes.append(child)
+                parent.append(head)
+                depth.append(depth[head] + 1)
+        head += 1
+
+    order = np.arange(len(nodes))
+    x, y = tree_layout(order, np.array(parent), np.array(depth), width, vert_gap, vert_loc, xcenter, proportional)
+    return nodes, x, y
+
+# Linear tree layout over arrays indexed by node id. order lists the tree nodes
+# root first with parents before children (e.g. BFS order), parent[root] = -1.
+# Each node gets a horizontal slot inside its parent's slot, either an equal
+# share per child or, with proportional=True, a share proportional to its
+# subtree size. Works level by level, so no recursion and no per-node lists.
+def tree_layout(order, parent, depth, width=DEFAULT_WIDTH, vert_gap=DEFAULT_VERT_GAP, vert_loc=0, xcenter=0.5,
+                proportional=False):
+    order = np.asarray(order)
+    parent = np.asarray(parent)
+    depth = np.asarray(depth)
+    size = len(parent)
+    x = np.full(size, np.nan)
+    y = np.full(size, np.nan)
+    slot = np.zeros(size)
+
+    rank = np.zeros(size, dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    by_level = order[np.argsort(depth[order], kind='stable')]
+    bounds = np.searchsorted(depth[by_level], np.arange(depth[order].max() + 2))
+    levels = [by_level[bounds[d]:bounds[d + 1]] for d in range(len(bounds) - 1)]
+
+    children = np.bincount(parent[order[1:]], minlength=size) if len(order) > 1 else np.zeros(size)
+    subtree = np.zeros(size)
+    subtree[order] = 1
+    for level in reversed(levels[1:]):
+        np.add.at(subtree, parent[level], subtree[level])
+
+    root = order[0]
+    x[root] = xcenter
+    y[root] = vert_loc
+    slot[root] = width
+    for d, level in enumerate(levels[1:], start=1):
+        # Siblings next to each other, families in the order of their parents
+        level = level[np.argsort(rank[parent[level]], kind='stable')]
+        par = parent[level]
+        if proportional:
+            share = subtree[level] / (subtree[par] - 1)
+        else:
+            share = 1 / children[par]
+        slot[level] = slot[par] * share
+
+        ends = np.cumsum(slot[level])
+        family_start = np.flatnonzero(np.r_[True, par[1:] != par[:-1]])
+        family_length = np.diff(np.r_[family_start, len(level)])
+        before = ends - slot[level] - np.repeat(ends[family_start] - slot[level][family_start], family_length)
+        x[level] = x[par] - slot[par] / 2 + before + slot[level] / 2
+        y[level] = vert_loc - d * vert_gap
+    return x, y
+
+# Read gml then make BFS from every start node with the CSR engine, print the
+# depths, optionally save the distance/parent arrays (.npz) and plot the tree
+# of the first start node (shown, or saved as png/svg when output is given)
+def perform_bfs_with_hierarchy_layout(gml_filename, start_nodes, plot=True, proportional=False, output=None,
+                                      density_threshold=render.DENSITY_THRESHOLD, bfs_output=None):
     try:
-        graph = nx.read_gml(gml_filename)
+        arrays = graph_cache.load_graph_arrays(gml_filename)
     except Exception as e:
         print(f"Error reading GML file: {e}")
         return
 
-    if start_node not in graph.nodes:
-        print(f"Start node {start_node} is not in the graph.")
+    # Start nodes come in as text; binary edge lists use integer node labels
+    labels = arrays['labels']
+    index = {str(label): i for i, label in enumerate(labels.tolist() if hasattr(labels, 'tolist') else labels)}
+    for start_node in start_nodes:
+        if start_node not in index:
+            print(f"Start node {start_node} is not in the graph.")
+            return
+    sources = [index[start_node] for start_node in start_nodes]
+
+    distances, parents = bfs_many(arrays['offsets'], arrays['neighbors'], sources, directed=arrays['directed'])
+    for start_node, row in zip(start_nodes, distances):
+        print(f"BFS from {start_node}: reached {np.count_nonzero(row >= 0)} nodes, depth {row.max()}")
+
+    if bfs_output:
+        np.savez(bfs_output, sources=np.array(sources), distances=distances, parents=parents)
+        print(f"BFS distances and parents saved to {bfs_output}.")
+
+    if not plot:
         return
 
-    bfs_tree = nx.bfs_tree(graph, source=start_node)
-    num_nodes = len(bfs_tree.nodes)
+    depth = distances[0]
+    order = np.flatnonzero(depth >= 0)
+    order = order[np.argsort(depth[order], kind='stable')]
+    parent = parents[0].astype(np.int64)
+    parent[sources[0]] = -1
+    num_nodes = len(order)
     vert_gap = max(0.05, 0.5 / (num_nodes ** 0.5))
     width = max(4, num_nodes ** 0.5)
 
-    pos = hierarchy_pos(bfs_tree, root=start_node, vert_gap=vert_gap, width=width)
+    x, y = tree_layout(order, parent, depth, width=width, vert_gap=vert_gap, proportional=proportional)
 
-    plt.figure(figsize=FIGURE_SIZE)
-    plt.title('BFS Tree by Taiki Tsukahara', color=TITLE_COLOR)
-    nx.draw(
-        bfs_tree, pos, with_labels=True, node_size=NODE_SIZE, font_size=FONT_SIZE, font_weight='bold',
-        node_color=NODE_COLOR, edge_color=EDGE_COLOR, arrows=True, alpha=0.9
+    fig, ax = render.new_figure(FIGURE_SIZE, output)
+    ax.set_title('BFS Tree by Taiki Tsukahara', color=TITLE_COLOR)
+    # Tree edges parent -> child, numbered by position in order
+    position = np.zeros(len(parent), dtype=np.int64)
+    position[order] = np.arange(num_nodes)
+    tree_labels = [labels[i] for i in order.tolist()] if num_nodes <= render.LABEL_LIMIT else None
+    render.draw_graph(
+        ax, x[order], y[order], position[parent[order[1:]]], np.arange(1, num_nodes), node_size=NODE_SIZE,
+        font_size=FONT_SIZE, font_weight='bold', node_color=NODE_COLOR, edge_color=EDGE_COLOR, alpha=0.9,
+        labels=tree_labels, density_threshold=density_threshold
     )
-    plt.show()
+    render.show_or_save(fig, output)
 
 # Takes command argument to run the application
 def main():
@@ -81,20 +273,43 @@ def main():
     parser.add_argument('--create_random_graph', action='store_true', help="To make random gml graph")
     parser.add_argument('--nodes', type=int, help="Number of nodes for the random graph")
     parser.add_argument('--constant', type=float, help="Constant to determine edge probability for the random graph")
-    parser.add_argument('--BFS', type=str, help="Start node for BFS")
+    parser.add_argument('--BFS', type=str, help="Start node(s) for BFS, comma separated")
     parser.add_argument('--plot', action='store_true', help="To make the BFS graph")
-    parser.add_argument('--output', type=str, help="Setting GML file name for the random graph")
+    parser.add_argument('--bfs_output', type=str, help="Save BFS distances and parents of every start node (.npz)")
+    parser.add_argument('--subtree_spacing', action='store_true', help="Give BFS subtrees room proportional to their size")
+    parser.add_argument('--save', type=str, help="Write the BFS plot to this PNG/SVG file instead of showing it")
+    parser.add_argument('--density_threshold', type=int, default=render.DENSITY_THRESHOLD,
+                        help="Nodes + edges above which the plot switches to density rendering")
+    parser.add_argument('--output', type=str, help="Setting GML file name for the random graph (.edges for binary)")
+    parser.add_argument('--seed', type=int, help="Random seed so the same graph can be generated again")
+    parser.add_argument('--sweep', action='store_true', help="Run many random graphs around the connectivity threshold")
+    parser.add_argument('--sweep_nodes', type=str, help="Comma separated node counts for --sweep")
+    parser.add_argument('--sweep_constants', type=str, help="Comma separated constants for --sweep")
+    parser.add_argument('--replicas', type=int, default=10, help="Graphs per (nodes, constant) pair for --sweep")
+    parser.add_argument('--processes', type=int, help="Worker processes for --sweep (default: all cores)")
+    parser.add_argument('--results', type=str, help="CSV or JSON file for the --sweep results")
 
     args = parser.parse_args()
 
     if args.create_random_graph:
         if args.nodes and args.constant and args.output:
-            create_random_graph_in_gml(args.nodes, args.constant, args.output)
+            create_random_graph_in_gml(args.nodes, args.constant, args.output, args.seed)
         else:
             print("Please provide --nodes, --constant, and --output arguments for creating a random graph.")
     
-    if args.input and args.BFS and args.plot:
-        perform_bfs_with_hierarchy_layout(args.input, args.BFS)
+    if args.sweep:
+        if args.sweep_nodes and args.sweep_constants and args.results:
+            node_counts = [int(n) for n in args.sweep_nodes.split(',')]
+            constants = [float(c) for c in args.sweep_constants.split(',')]
+            source = int(args.BFS) if args.BFS else 0
+            run_ensemble_sweep(node_counts, constants, args.replicas, args.results,
+                               seed=args.seed, source=source, processes=args.processes)
+        else:
+            print("Please provide --sweep_nodes, --sweep_constants, and --results arguments for a sweep.")
+
+    if args.input and args.BFS:
+        perform_bfs_with_hierarchy_layout(args.input, args.BFS.split(','), args.plot, args.subtree_spacing,
+                                          args.save, args.density_threshold, args.bfs_output)
     else:
         return
 
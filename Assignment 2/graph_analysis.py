@@ -1,247 +1,293 @@
 import argparse
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
 import networkx as nx
-import matplotlib.pyplot as plt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import gml_stream, graph_cache, layout, metrics, render
+from common.balance import (attribute_violations, check_balance, estimate_frustration, preview,
+                            violation_counts, write_violations)
+from common.graph_index import GraphIndex, color_signs
+from common.homophily import SIGNIFICANCE, homophily_test, read_colors
+from common.partition import (build_dendrogram, girvan_newman_splits, make_betweenness,
+                              serial_edge_betweenness, time_betweenness, write_dendrogram)
+from common.pipeline import ANALYSES, run_pipeline
 
 def is_graph_balanced(graph):
-    for cycle in nx.simple_cycles(graph):
-        if len(cycle) % 2 == 1:  # Check for odd-length cycles
-            negative_edges = sum(1 for u, v in zip(cycle, cycle[1:] + cycle[:1])
-                                  if graph[u][v].get('sign', 1) == -1)
-            if negative_edges % 2 == 1:
-                return False
-    return True
+    # Linear-time BFS two-colouring, see common/balance.py
+    balanced, _ = check_balance(graph)
+    return balanced
 
 def is_graph_balanced_by_attributes(graph, attribute):
-
-    for u, v, data in graph.edges(data=True):
-        # Check if both nodes have the attribute
-        if attribute in graph.nodes[u] and attribute in graph.nodes[v]:
-            node_u_attr = graph.nodes[u][attribute]
-            node_v_attr = graph.nodes[v][attribute]
-            
-            # If nodes have the same attribute, the edge should be positive
-            if node_u_attr == node_v_attr:
-                if data.get('sign', 1) != 1:
-                    print(f"Unbalanced edge between nodes {u} and {v}: same attribute but negative sign")
-                    return False
-            
-            # If nodes have different attributes, the edge should be negative
-            else:
-                if data.get('sign', 1) != -1:
-                    print(f"Unbalanced edge between nodes {u} and {v}: different attributes but positive sign")
-                    return False
-        else:
-            print(f"Nodes {u} or {v} are missing the attribute '{attribute}'")
-            return False
-
-    return True
-
+    # Every edge classified in one pass, see common/balance.py; graph is a
+    # networkx graph or a GraphIndex already built for it
+    index = graph if isinstance(graph, GraphIndex) else GraphIndex(graph)
+    codes, _ = index.node_codes(attribute)
+    return not (attribute_violations(codes, index.sources, index.targets, index.signs) >= 0).any()
 
 def main():
     parser = argparse.ArgumentParser(description='Graph Analysis Tool')
     parser.add_argument('input_graph_file', help='Input graph file in GML format')
     parser.add_argument('--components', type=int, help='Number of components to partition the graph')
+    parser.add_argument('--dendrogram', help='Write every Girvan-Newman split to this JSON file')
+    parser.add_argument('--betweenness', choices=['serial', 'parallel', 'sampled'], default='serial',
+                        help='Edge betweenness backend for --components/--dendrogram (default: serial)')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                        help='Worker processes for --betweenness parallel and the homophily permutations')
+    parser.add_argument('--pivots', type=int, help='Sampled source nodes for --betweenness sampled')
+    parser.add_argument('--epsilon', type=float, default=0.05,
+                        help='Error bound used to pick the pivot count when --pivots is not given')
+    parser.add_argument('--sample_budget', type=float,
+                        help='Seconds each sampled betweenness computation may spend')
     parser.add_argument('--plot', choices=['C', 'N', 'P'],
                         help='Plot type (C: clustering, N: neighborhood, P: attributes)')
+    parser.add_argument('--clustering_epsilon', type=float,
+                        help='Estimate --plot C clustering by wedge sampling to within this error')
+    parser.add_argument('--save', help='Write the --plot figure to this PNG/SVG file instead of showing it')
+    parser.add_argument('--layout_cache', default=layout.CACHE_DIRECTORY,
+                        help="Directory where plot layouts are cached by graph content ('none' disables it)")
+    parser.add_argument('--layout_cache_mb', type=int, default=layout.CACHE_LIMIT // (1024 * 1024),
+                        help='Size limit of the layout cache in MB; least recently used layouts are dropped')
+    parser.add_argument('--density_threshold', type=int, default=render.DENSITY_THRESHOLD,
+                        help='Nodes + edges above which plots switch to density rendering')
+    parser.add_argument('--overlap_output', help='Write the neighborhood overlap of every edge to this CSV file')
     parser.add_argument('--verify_homophily', action='store_true', help='Verify homophily in the graph')
+    parser.add_argument('--colors', help='Read the --verify_homophily node colors from this GML file')
+    parser.add_argument('--permutations', type=int, default=1000,
+                        help='Color shuffles used for the --verify_homophily p-value (0 skips the test)')
     parser.add_argument('--verify_balanced_graph', action='store_true', help='python3 ./graph_analysis.py homophily.gml --verify_homophily --plot N if the graph is balanced')
+    parser.add_argument('--frustration', action='store_true',
+                        help='Estimate how many edge signs must flip for the graph to become balanced')
+    parser.add_argument('--time_budget', type=float, default=10.0,
+                        help='Seconds the --frustration search may spend (default: 10)')
     parser.add_argument('--verify_balanced_by_attributes', action='store_true',
                         help='Check if the graph is balanced based on edge signs and node attributes')
-    parser.add_argument('--attribute', help='Node attribute to check for balance (e.g., color)')
+    parser.add_argument('--attribute', help='Node attribute to check for balance or homophily (e.g., color)')
+    parser.add_argument('--violations',
+                        help='Write every --verify_balanced_by_attributes violation to this CSV (or .jsonl) file')
+    parser.add_argument('--pipeline',
+                        help='Comma-separated analyses to run on one shared index: ' + ', '.join(ANALYSES))
+    parser.add_argument('--report', help='Write the --pipeline results to this JSON file')
     parser.add_argument('--output', help='Output graph file in GML format')
 
     args = parser.parse_args()
-
-    graph = nx.read_gml(args.input_graph_file)
+    layout_cache = None if args.layout_cache == 'none' else args.layout_cache
+    analyses = args.pipeline.split(',') if args.pipeline else []
+    unknown = [name for name in analyses if name not in ANALYSES]
+    if unknown:
+        parser.error(f"unknown --pipeline analyses: {', '.join(unknown)} (choose from {', '.join(ANALYSES)})")
+    if 'components' in analyses and not args.components:
+        parser.error("--pipeline components needs --components")
+    if 'attribute_balance' in analyses and not args.attribute:
+        parser.error("--pipeline attribute_balance needs --attribute")
+
+    load_start = time.perf_counter()
+    graph, arrays = graph_cache.read_graph_and_arrays(args.input_graph_file)
+    load_seconds = time.perf_counter() - load_start
     print(f"Graph loaded with {graph.number_of_nodes()} nodes and {graph.number_of_edges()} edges.")
 
     # Assign signs to edges based on 'color' attribute
     for u, v, data in graph.edges(data=True):
         data['sign'] = -1 if data.get('color') == 'r' else 1
 
-    if args.verify_homophily:
-        """Tests for homophily in the graph based on the assigned node colors."""
-        homophily_graph = nx.read_gml('homophily.gml')
-        color_map = {node: data['color'] for node, data in homophily_graph.nodes(data=True)}
+    # Degrees, CSR adjacency, signs and attribute columns, built once on first use
+    # (edge list, CSR and columns straight from the graph cache)
+    index = GraphIndex(graph, arrays, color_signs(arrays))
+
+    if analyses:
+        """Run the requested analyses against the shared index (see common/pipeline.py)"""
+        pool = Pool(args.processes) if args.betweenness == 'parallel' and 'components' in analyses else None
+        options = {
+            'attribute': args.attribute or 'color',
+            'permutations': args.permutations,
+            'processes': args.processes,
+            'components': args.components,
+            'betweenness': make_betweenness(args.betweenness, pool, args.processes, args.pivots,
+                                            args.epsilon, args.sample_budget),
+            'clustering_epsilon': args.clustering_epsilon,
+        }
+        report = {'graph': args.input_graph_file, 'nodes': index.num_nodes, 'edges': graph.number_of_edges(),
+                  'load_seconds': load_seconds, 'analyses': run_pipeline(index, analyses, options)}
+        if pool:
+            pool.close()
+
+        for name, result in report['analyses'].items():
+            summary = {key: value for key, value in result.items()
+                       if key not in ('seconds', 'frustrated_cycle', 'removed_edges', 'sizes', 'categories')}
+            print(f"{name} ({result['seconds']:.3f}s): {json.dumps(summary, default=str)}")
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump(report, f, indent=2, default=str)
+            print(f"Report saved to {args.report}.")
 
-        same_color_edges = 0
-        different_color_edges = 0
-
-        for u, v in graph.edges():
-            if color_map[u] == color_map[v]:
-                same_color_edges += 1
-            else:
-                different_color_edges += 1
+    if args.verify_homophily:
+        """Tests for homophily in the graph based on the assigned node colors.
+            Colors come from the input graph or from --colors, the expected proportion is the exact one
+            under random recoloring and the p-value comes from --permutations color shuffles (see common/homophily.py)"""
+        attribute = args.attribute or 'color'
+        if args.colors:
+            color_map = read_colors(args.colors, attribute)
+        else:
+            color_map = index.node_colors(attribute)
 
+        result = homophily_test(index.nodes, index.sources, index.targets, color_map, args.permutations,
+                                args.processes)
+        same_color_edges = result['same']
+        different_color_edges = result['different']
         total_edges = same_color_edges + different_color_edges
         print(
             f"Same-color edges: {same_color_edges}, Different-color edges: {different_color_edges}, Total edges: {total_edges}")
 
         if total_edges > 0:
-            proportion_same_color = same_color_edges / total_edges
-            print(f"Proportion of same-color edges: {proportion_same_color:.2f}")
-
-            # Count the number of nodes for each color
-            color_count = {}
-            for color in color_map.values():
-                color_count[color] = color_count.get(color, 0) + 1
-
-            # Calculate the expected number of same-color edges
-            expected_same_color = 0
-            for count in color_count.values():
-                expected_same_color += count * (count - 1) / 2  # Combination of choosing 2 nodes from `count`
-
-            expected_same_color /= (total_edges if total_edges > 0 else 1)  # Normalize by total edges if necessary
-            print(f"Expected same-color edges if random: {expected_same_color:.2f}")
+            print(f"Proportion of same-color edges: {result['fraction']:.2f}")
+            print(f"Expected proportion if colors were random: {result['expected']:.2f}")
 
             # Compare the observed with the expected
-            if same_color_edges > expected_same_color:
+            if result['p_value'] is not None:
+                print(f"Permutation p-value ({args.permutations} shuffles): {result['p_value']:.4g}")
+                significant = result['p_value'] < SIGNIFICANCE
+            else:
+                significant = result['fraction'] > result['expected']
+            if significant:
                 print("There is a significant homophily effect.")
             else:
                 print("No significant homophily effect found.")
         else:
-            print("No edges in the graph; cannot determine homophily.")
-            
+            print("No edges between colored nodes; cannot determine homophily.")
+
     if args.verify_balanced_graph:
         """Verify if the graph is balanced"""
-        is_balanced = is_graph_balanced(graph)
+        is_balanced, witness = check_balance(graph)
         if is_balanced:
+            camp_a, camp_b = witness
             print("The graph is balanced.")
+            print(f"Camp A ({len(camp_a)} nodes): {preview(camp_a)}")
+            print(f"Camp B ({len(camp_b)} nodes): {preview(camp_b)}")
         else:
             print("The graph is not balanced.")
+            print(f"Frustrated cycle: {' -> '.join(str(n) for n in witness + witness[:1])}")
+
+    if args.frustration:
+        """Estimate the frustration index with a local search over two-colourings"""
+        count, frustrated_edges = estimate_frustration(graph, time_budget=args.time_budget)
+        print(f"Estimated frustration index: {count} of {graph.number_of_edges()} edges")
+        if frustrated_edges:
+            print(f"Edges to flip: {preview(frustrated_edges)}")
 
     if args.verify_balanced_by_attributes:
-        """Verify if the graph is balanced based on node attributes and edge signs"""
+        """Verify if the graph is balanced based on node attributes and edge signs.
+            Every edge is checked in one pass and all violations are counted by type (see common/balance.py)"""
         if args.attribute:
-            is_balanced_by_attributes = is_graph_balanced_by_attributes(graph, args.attribute)
-            if is_balanced_by_attributes:
+            codes, _ = index.node_codes(args.attribute)
+            kinds = attribute_violations(codes, index.sources, index.targets, index.signs)
+            counts = violation_counts(kinds)
+            if args.violations:
+                write_violations(args.violations, args.attribute, index.nodes, index.node_values(args.attribute),
+                                 index.sources, index.targets, index.signs, kinds)
+                print(f"Violations saved to {args.violations}.")
+            if not any(counts.values()):
                 print(f"The graph is balanced based on the attribute '{args.attribute}'.")
             else:
                 print(f"The graph is not balanced based on the attribute '{args.attribute}'.")
+                for kind, count in counts.items():
+                    print(f"  {kind.replace('_', ' ')}: {count} edges")
         else:
             print("Please specify the node attribute to check for balance using --attribute.")
 
-    if args.components:
-        """Graph should be partitioned into n components.
-         Divides the graph into n subgraphs"""
-        while True:
-            # Compute edge betweenness centrality
-            edge_betweenness = nx.edge_betweenness_centrality(graph)
-            # Identify the edge with the highest betweenness centrality
-            highest_edge = max(edge_betweenness, key=edge_betweenness.get)
-
-            # Remove the edge from the graph
-            graph.remove_edge(*highest_edge)
-            print(f"Removed edge: {highest_edge} with betweenness {edge_betweenness[highest_edge]}")
-
-            # Check the number of components
-            components = list(nx.connected_components(graph))
-            num_components = len(components)
-
-            print(f"Current number of components: {num_components}")
-
-            # If the desired number of components is reached, break
-            if num_components >= args.components:
-                break
+    if args.components or args.dendrogram:
+        pool = Pool(args.processes) if args.betweenness == 'parallel' else None
+        betweenness = make_betweenness(args.betweenness, pool, args.processes, args.pivots,
+                                       args.epsilon, args.sample_budget)
+
+        if args.betweenness != 'serial':
+            """Compare the chosen backend with the plain networkx call once"""
+            serial_time = time_betweenness(graph, serial_edge_betweenness)
+            backend_time = time_betweenness(graph, betweenness)
+            print(f"Betweenness ({args.betweenness}): {backend_time:.3f}s vs serial networkx {serial_time:.3f}s "
+                  f"({serial_time / max(backend_time, 1e-9):.1f}x speedup)")
+
+        if args.dendrogram:
+            """Record the full split history so any k can be picked later"""
+            write_dendrogram(build_dendrogram(graph, betweenness), args.dendrogram)
+            print(f"Dendrogram saved to {args.dendrogram}.")
+
+        if args.components:
+            """Graph should be partitioned into n components.
+             Divides the graph into n subgraphs. Betweenness is only recomputed
+             inside the component that lost an edge (see common/partition.py)"""
+            num_components = nx.number_connected_components(graph)
+            if num_components < args.components:
+                for highest_edge, score, num_components, _ in girvan_newman_splits(graph, betweenness):
+                    print(f"Removed edge: {highest_edge} with betweenness {score}")
+                    print(f"Current number of components: {num_components}")
+
+                    # If the desired number of components is reached, break
+                    if num_components >= args.components:
+                        break
+                index = GraphIndex(graph)  # edges were removed
+
+        if pool:
+            pool.close()
 
     if args.plot == 'C':
         """Cluster Coefficient is proportional to its size
-            cluster_min = min, cluster_max = max coefficients, c_v = (c_v - cluster_min) / (cluster_max - cluster_min) of node v"""
-        clusterCoefficients = nx.clustering(graph)
-        cluster_min = min(clusterCoefficients.values())
-        cluster_max = max(clusterCoefficients.values())
-
-        min_pixel = 200
-        max_pixel = 2000
-        sizes = []
-        colors = []
-
-        # Maximum degree for color calculation:
-        degrees = dict(graph.degree())
-        max_degree = max(degrees.values())
-
-        for node in graph.nodes():
-            cv = clusterCoefficients[node]
-            pv = (cv - cluster_min) / (cluster_max - cluster_min) if cluster_max != cluster_min else 0
-            node_size = min_pixel + pv * (max_pixel - min_pixel)
-            sizes.append((node_size))
-
-            # Calculate color based on the degree
-            dv = degrees[node]
-            sv = dv / max_degree if max_degree > 0 else 0
-            color = (254 * sv / 255, 0, 254 / 255)
-            colors.append(color)
-
-        pos = nx.spring_layout(graph)
-        nx.draw(graph, pos, node_size=sizes, node_color=colors, with_labels=True)
-        plt.title('Graph with Clustering Coefficients')
-        plt.show()
+            cluster_min = min, cluster_max = max coefficients, c_v = (c_v - cluster_min) / (cluster_max - cluster_min) of node v
+            Triangles are counted with sparse adjacency products, or estimated by wedge sampling
+            with --clustering_epsilon (see common/metrics.py)"""
+        if args.clustering_epsilon:
+            clusterCoefficients, average, transitivity = metrics.approximate_clustering(
+                index.num_nodes, index.sources, index.targets, args.clustering_epsilon)
+        else:
+            clusterCoefficients, average, transitivity = metrics.clustering(index.num_nodes, index.sources,
+                                                                            index.targets)
+        print(f"Average clustering: {average:.4f}, transitivity: {transitivity:.4f}")
+
+        # Size from the clustering coefficient, color from degree
+        sizes, colors = metrics.size_color_arrays(clusterCoefficients, index.degrees)
+
+        pos = layout.graph_layout(graph, layout_cache, args.layout_cache_mb * 1024 * 1024)
+        fig, ax = render.new_figure(None, args.save)
+        render.draw_networkx(ax, graph, pos, node_size=sizes, node_color=colors,
+                             density_threshold=args.density_threshold)
+        ax.set_title('Graph with Clustering Coefficients')
+        render.show_or_save(fig, args.save)
+
+    if args.plot == 'N' or args.overlap_output:
+        """Neighborhood overlap of every edge from sparse adjacency products
+         (see common/metrics.py), averaged per node"""
+        edge_overlap, neighborhood_overlap = metrics.neighborhood_overlap(index.num_nodes, index.sources,
+                                                                          index.targets)
+        if args.overlap_output:
+            metrics.write_edge_overlap(args.overlap_output, index.nodes, index.sources, index.targets,
+                                       edge_overlap)
+            print(f"Edge overlap saved to {args.overlap_output}.")
 
     if args.plot == 'N':
         """Plot the graph highlighting neighborhood overlap"""
-        # Calculate neighborhood overlap
-        neighborhood_overlap = {}
-        for node in graph.nodes():
-            neighbors = set(graph.neighbors(node))
-            overlap_values = []
-            for neighbor in neighbors:
-                neighbor_neighbors = set(graph.neighbors(neighbor))
-                # Calculate overlap
-                overlap = len(neighbors.intersection(neighbor_neighbors))
-                total_neighbors = len(neighbors.union(neighbor_neighbors))
-                if total_neighbors > 0:
-                    overlap_values.append(overlap / total_neighbors)  # Normalize overlap
-            neighborhood_overlap[node] = sum(overlap_values) / len(overlap_values) if overlap_values else 0
-
-        # Calculate min and max values for normalization
-        overlap_min = min(neighborhood_overlap.values())
-        overlap_max = max(neighborhood_overlap.values())
-        min_pixel = 200  # Minimum size of nodes
-        max_pixel = 2000  # Maximum size of nodes
-        sizes = []
-        colors = []
-
-        # Determine maximum degree for color calculation
-        degrees = dict(graph.degree())
-        max_degree = max(degrees.values())
-
-        for node in graph.nodes():
-            # Calculate size based on neighborhood overlap
-            nv = neighborhood_overlap[node]
-            pv = (nv - overlap_min) / (overlap_max - overlap_min) if overlap_max != overlap_min else 0
-            node_size = min_pixel + pv * (max_pixel - min_pixel)
-            sizes.append(node_size)
-
-            # Calculate color based on degree
-            dv = degrees[node]
-            sv = dv / max_degree if max_degree > 0 else 0
-            color = (254 * sv / 255, 0, 254 / 255)  # Normalize RGB values to [0, 1]
-            colors.append(color)
+        # Size from neighborhood overlap, color from degree
+        sizes, colors = metrics.size_color_arrays(neighborhood_overlap, index.degrees)
 
         # Draw the graph with specified sizes and colors
-        pos = nx.spring_layout(graph)  # Layout for positioning nodes
-        nx.draw(graph, pos, node_size=sizes, node_color=colors, with_labels=True)
-        plt.title('Graph with Neighborhood Overlap Highlighted')
-        plt.show()
+        pos = layout.graph_layout(graph, layout_cache, args.layout_cache_mb * 1024 * 1024)
+        fig, ax = render.new_figure(None, args.save)
+        render.draw_networkx(ax, graph, pos, node_size=sizes, node_color=colors,
+                             density_threshold=args.density_threshold)
+        ax.set_title('Graph with Neighborhood Overlap Highlighted')
+        render.show_or_save(fig, args.save)
 
     if args.plot == 'P':
         """Color the node according to the attribute if it's assigned, or a default color if not"""
         # Default color if no attribute is assigned
         default_color = (0.5, 0.5, 0.5)  # Grey
 
-        # List to hold sizes and colors for the nodes
-        sizes = []
+        # Size scaled by degree, from the shared index
+        sizes = index.degrees * 100
         colors = []
 
-        # Determine maximum degree for color calculation
-        degrees = dict(graph.degree())
-        max_degree = max(degrees.values())
-
         for node in graph.nodes():
-            # Determine size based on degree
-            node_size = degrees[node] * 100  # Scale size based on degree
-            sizes.append(node_size)
-
             # Determine color based on attribute
             if args.attribute and args.attribute in graph.nodes[node]:
                 attr_value = graph.nodes[node][args.attribute]
@@ -252,14 +298,16 @@ def main():
             colors.append(color)
 
         # Draw the graph
-        pos = nx.spring_layout(graph)  # Layout for positioning nodes
-        nx.draw(graph, pos, node_size=sizes, node_color=colors, with_labels=True)
-        plt.title(f'Graph Colored by Attribute: {args.attribute}' if args.attribute else 'Graph with Default Color')
-        plt.show()
+        pos = layout.graph_layout(graph, layout_cache, args.layout_cache_mb * 1024 * 1024)
+        fig, ax = render.new_figure(None, args.save)
+        render.draw_networkx(ax, graph, pos, node_size=sizes, node_color=colors,
+                             density_threshold=args.density_threshold)
+        ax.set_title(f'Graph Colored by Attribute: {args.attribute}' if args.attribute else 'Graph with Default Color')
+        render.show_or_save(fig, args.save)
 
     # Save the output graph if specified
     if args.output:
-        nx.write_gml(graph, args.output)
+        gml_stream.write_gml(graph, args.output)
         print(f"Graph saved to {args.output}.")
 
 if __name__ == '__main__':
@@ -1,22 +1,29 @@
-import networkx as nx
-import matplotlib.pyplot as plt
 import sys
 import os
+import tempfile
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import render
+from common.auction_log import RoundRecorder, start_renderer
+from common.market import SOLVERS, Market, auction_rounds, solve_market
 
-def load_graph(filename):
+
+# Markets load into arrays (common.market.Market) from GML or a flat
+# "seller buyer valuation" file; a networkx graph is only built for plots
+def load_market(filename):
     if not os.path.exists(filename):
         print(f"Error: File '{filename}' does not exist.")
         sys.exit(1)
     try:
-        graph = nx.read_gml(filename)
+        market = Market.read(filename)
     except Exception as e:
-        print(f"Error loading graph: {e}")
+        print(f"Error loading market: {e}")
         sys.exit(1)
-    return graph
+    return market
 
-def plot_graph(graph, prices, buyer_labels, highlight_edges=None, tie_edges=None, round_number=None, title=None):
-    plt.figure(figsize=(12, 8))
+def plot_graph(graph, prices, buyer_labels, highlight_edges=None, tie_edges=None, round_number=None, title=None,
+               output=None):
+    fig, ax = render.new_figure((12, 8), output)
     
     # Separate the nodes into markets and buyers based on the bipartite attribute
     markets = [n for n, d in graph.nodes(data=True) if d['bipartite'] == 0]
@@ -25,200 +32,229 @@ def plot_graph(graph, prices, buyer_labels, highlight_edges=None, tie_edges=None
     # Create positions for markets (left side) and buyers (right side)
     pos = {**{node: (0, -i) for i, node in enumerate(markets)}, 
            **{node: (1, -i) for i, node in enumerate(buyers)}}
-    
-    # Draw market nodes with orange color
-    nx.draw_networkx_nodes(graph, pos, nodelist=markets, node_color='orange', node_size=1500, node_shape='o')
-    
-    # Draw buyer nodes with light green color
-    nx.draw_networkx_nodes(graph, pos, nodelist=buyers, node_color="#D4FF60", node_size=1500, node_shape='o')
+    nodes, x, y, sources, targets = render.graph_arrays(graph, pos)
+    index = {node: i for i, node in enumerate(nodes)}
     
     # Draw all edges in black
-    nx.draw_networkx_edges(graph, pos, edge_color='black')
+    render.draw_edges(ax, x, y, sources, targets, color='black')
     
     # Highlight edges selected by each buyer in red
     if highlight_edges:
-        nx.draw_networkx_edges(graph, pos, edgelist=highlight_edges, edge_color='red', width=2)
+        render.draw_edges(ax, x, y, [index[u] for u, _ in highlight_edges], [index[v] for _, v in highlight_edges],
+                          color='red', width=2)
     
     # Highlight tie edges in blue
     if tie_edges:
-        nx.draw_networkx_edges(graph, pos, edgelist=tie_edges, edge_color='blue', width=2, style='dashed')
+        render.draw_edges(ax, x, y, [index[u] for u, _ in tie_edges], [index[v] for _, v in tie_edges],
+                          color='blue', width=2, style='dashed')
+    
+    # Draw market nodes with orange color and buyer nodes with light green color
+    market_index = [index[node] for node in markets]
+    buyer_index = [index[node] for node in buyers]
+    render.draw_nodes(ax, x[market_index], y[market_index], size=1500, color='orange')
+    render.draw_nodes(ax, x[buyer_index], y[buyer_index], size=1500, color="#D4FF60")
     
     # Add labels to all nodes
-    nx.draw_networkx_labels(graph, pos)
+    render.draw_labels(ax, x, y, nodes)
     
     # Show prices for market nodes
     for node, (x, y) in pos.items():
         if node in markets:
             price = prices.get(node, 0)
-            plt.text(x, y - 0.1, f"Price: {price}", fontsize=10, ha='center')
+            ax.text(x, y - 0.1, f"Price: {price}", fontsize=10, ha='center')
     
     # Show valuations for buyer nodes
     for node, (x, y) in pos.items():
         if node in buyers:
-            plt.text(x, y - 0.1, buyer_labels.get(node, "[]"), fontsize=10, ha='center')
+            ax.text(x, y - 0.1, buyer_labels.get(node, "[]"), fontsize=10, ha='center')
     
     # Set plot title with the current round number or custom title
     if title:
-        plt.title(title)
+        ax.set_title(title)
     elif round_number is not None:
-        plt.title(f"Round {round_number}: Market vs Buyer")
-    
-    plt.xlim(-0.5, 1.5)
-    plt.axis('off')
-    plt.show()
-
-
-def update_valuations(graph, prices):
-    updated_valuations = {}
-    for u, v, data in graph.edges(data=True):
-        valuation = data['valuation'] - prices[u]
-        updated_valuations[(u, v)] = valuation
-    return updated_valuations
-
-
-def highest_valuations(updated_valuations):
-    connections = {}
-    for (u, v), valuation in updated_valuations.items():
-        if v not in connections or valuation > connections[v][1]:
-            connections[v] = (u, valuation)
-        elif valuation == connections[v][1]:  # Handle ties
-            connections[v] = (u, valuation)  # Simplified handling; expand for more complex tie logic if needed
-    return connections
-
-
-def constricted_set(connections):
-    counter = {}
-    for u, v in connections.values():
-        counter[u] = counter.get(u, 0) + 1
-    return [u for u, count in counter.items() if count > 1]
-
-
-def find_perfect_match_round(connections):
-    matched_nodes = set()
-    for node, (connected_node, _) in connections.items():
-        if connected_node not in matched_nodes:
-            matched_nodes.add(connected_node)
-        else:
-            return False
-    return True
-
-def detailed_valuations(graph, updated_valuations, prices):
-    detailed_list = []
-    # Iterate over all buyers (nodes with bipartite=1)
-    for v in [n for n, d in graph.nodes(data=True) if d['bipartite'] == 1]:
-        adjusted_vals = []
-        
-        # Calculate the adjusted valuations for each market
-        for u in [n for n, d in graph.nodes(data=True) if d['bipartite'] == 0]:
-            if (u, v) in updated_valuations:
-                valuation = updated_valuations[(u, v)]
-                adjusted_vals.append((u, valuation))
-            else:
-                # If no edge exists, set valuation to 0
-                adjusted_vals.append((u, 0))
-
-        # Sort adjusted values by market node for consistent display order
-        adjusted_vals.sort(key=lambda x: x[0])
-        
-        # Find the highest valuation
-        highest_market, highest_value = max(adjusted_vals, key=lambda x: x[1])
-        detailed_list.append((v, highest_market, highest_value, adjusted_vals))
+        ax.set_title(f"Round {round_number}: Market vs Buyer")
     
-    return detailed_list
+    ax.autoscale_view()
+    ax.set_xlim(-0.5, 1.5)
+    ax.axis('off')
+    render.show_or_save(fig, output)
 
-def main(filename, plot=False, interactive=False):
-    # Load the graph from the provided file
-    graph = load_graph(filename)
 
-    # Extract initial prices and buyer labels for the graph
-    prices = {node: graph.nodes[node].get('price', 0) for node in graph if graph.nodes[node]['bipartite'] == 0}
-    buyer_labels = {
-        v: f"[{', '.join(str(graph.edges[(u, v)]['valuation'] - prices[u]) for u, v_ in graph.edges if v_ == v)}]"
-        for v in graph if graph.nodes[v]['bipartite'] == 1
-    }
+# plot_graph for a market: prices, payoff labels and (seller, buyer) edges come
+# keyed by label and are moved onto the graph's nodes, which are the
+# market's node_keys (s0 and b0 when a flat file's sellers and buyers share ids)
+def plot_market(market, graph, prices, buyer_labels, highlight_edges=None, tie_edges=None, **kwargs):
+    seller_keys, buyer_keys = market.node_keys
+    plot_graph(graph, {seller_keys[seller]: price for seller, price in prices.items()},
+               {buyer_keys[buyer]: label for buyer, label in buyer_labels.items()},
+               highlight_edges=[(seller_keys[u], buyer_keys[v]) for u, v in highlight_edges or ()],
+               tie_edges=[(seller_keys[u], buyer_keys[v]) for u, v in tie_edges or ()], **kwargs)
 
-    # If only the plot flag is provided, just display the initial graph and exit
-    if plot and not interactive:
-        plot_graph(graph, prices, buyer_labels, title="Initial Graph")
-        return  # Exit after plotting
 
-    round_num = 1
-    perfect_match = False
+# With --save, every interactive round gets its own file: market_round3.png, ...
+def round_output(output, suffix):
+    if not output:
+        return None
+    stem, extension = os.path.splitext(output)
+    return f"{stem}_{suffix}{extension}"
 
-    while not perfect_match:
-        print(f"\n---- Round {round_num} ----")
 
-        # Display current prices for nodes in set A
-        print("\nCurrent Prices:")
-        for node, price in prices.items():
-            print(f"Node {node} = {price}")
+def detailed_valuations(state):
+    detailed_list = []
+    market = state.market
+    sellers = market.edge_sellers[market.by_buyer].tolist()
+    payoffs = state.payoffs[market.by_buyer].tolist()
+    offsets = market.buyer_offsets.tolist()
+    for i, v in enumerate(market.buyers):
+        # Adjusted valuations of the markets this buyer bid on, sorted by market node
+        adjusted_vals = sorted(((market.sellers[u], valuation) for u, valuation in
+                                zip(sellers[offsets[i]:offsets[i + 1]], payoffs[offsets[i]:offsets[i + 1]])),
+                               key=lambda x: x[0])
 
-        # Update valuations
-        updated_valuations = update_valuations(graph, prices)
+        # Find the highest valuation
+        highest_market, highest_value = max(adjusted_vals, key=lambda x: x[1])
+        detailed_list.append((v, highest_market, highest_value, adjusted_vals))
+
+    return detailed_list
 
-        # Calculate the highest valuations
-        connections = highest_valuations(updated_valuations)
 
-        # Extract highest valuation edges for this round
-        highlighted_edges = [(str(u), str(v)) for v, (u, _) in connections.items()]
+# --solver: clearing prices and the optimal matching computed directly, in
+# the same output format as the last round of the auction loop
+def solve(market, method, plot=False, output=None):
+    try:
+        prices, matching, rounds = solve_market(market, method)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"\n---- {method.capitalize()} solver ({rounds} iterations) ----")
+    print("\nMarket-clearing Prices:")
+    for node, price in prices.items():
+        print(f"Node {node} = {price}")
+    print("\nPerfect match found:")
+    for v, u in matching.items():
+        print(f"Node {u} is matched with Node {v}")
 
-        # Improved Tie Detection
-        tie_edges = []
-        for buyer in [n for n, d in graph.nodes(data=True) if d['bipartite'] == 1]:
-            highest_value = max(
-                updated_valuations[(u, buyer)] 
-                for u, v in updated_valuations if v == buyer
-            )
-            for (u, v), valuation in updated_valuations.items():
-                if v == buyer and valuation == highest_value and (str(u), str(v)) not in highlighted_edges:
-                    tie_edges.append((str(u), str(v)))
+    if plot:
+        plot_market(market, market.to_graph(), prices, market.payoff_labels(prices),
+                    highlight_edges=[(u, v) for v, u in matching.items()], title=f"Market-clearing Match ({method})",
+                    output=output)
 
-        # Prepare buyer labels for the plot
-        buyer_labels = {
-            v: f"[{', '.join(str(graph.edges[(u, v)]['valuation'] - prices[u]) for u, v_ in graph.edges if v_ == v)}]"
-            for v in graph if graph.nodes[v]['bipartite'] == 1
-        }
 
-        # Plot during interactive mode only for each round
-        if interactive:
-            plot_graph(graph, prices, buyer_labels, highlight_edges=highlighted_edges, tie_edges=tie_edges, round_number=round_num)
+# Wait for the background renderer, then drop the round log if it was only a temporary file
+def finish_rendering(renderer, temporary_log):
+    if renderer:
+        renderer.join()
+    if temporary_log:
+        os.remove(temporary_log)
 
-        # Check for perfect match
-        if find_perfect_match_round(connections):
-            perfect_match = True
-            break  # Exit the loop immediately
 
-        # Identify constricted set and update prices
-        nodes_to_increment = constricted_set(connections)
-        for node in nodes_to_increment:
-            prices[node] += 1
+def main(filename, plot=False, interactive=False, output=None, solver=None, details=False, record=None, animate=None):
+    # Load the market from the provided file
+    market = load_market(filename)
+    if solver:
+        solve(market, solver, plot or interactive, output)
+        return
 
-        round_num += 1
+    # Initial prices, and the graph and buyer labels for the plots
+    prices = market.price_dict()
+    graph = market.to_graph() if plot or interactive else None
+
+    # If only the plot flag is provided, just display the initial graph and exit
+    if plot and not interactive:
+        plot_market(market, graph, prices, market.payoff_labels(), title="Initial Graph", output=output)
+        return  # Exit after plotting
+
+    # --record writes one log line per round; --animate, or --interactive with
+    # --save, renders that log in a background process instead of drawing here.
+    # Without --record the log is a temporary file, deleted once rendered
+    if interactive and output and not animate:
+        animate = output
+    recorder = renderer = temporary_log = None
+    if animate and not record:
+        handle, temporary_log = tempfile.mkstemp(suffix='.rounds.jsonl')
+        os.close(handle)
+        record = temporary_log
+    if record:
+        recorder = RoundRecorder(record, market)
+    if animate:
+        renderer = start_renderer(record, animate)
+
+    # The auction itself lives in common/market.py; this loop reports every round
+    try:
+        for round_num, state in auction_rounds(market, prices):
+            print(f"\n---- Round {round_num} ----")
+
+            # Display current prices for nodes in set A
+            print("\nCurrent Prices:")
+            for node, price in prices.items():
+                print(f"Node {node} = {price}")
+
+            if details:
+                print("\nBest Payoffs:")
+                for v, u, value, adjusted_vals in detailed_valuations(state):
+                    print(f"Node {v}: Node {u} = {value} of {adjusted_vals}")
+
+            if recorder:
+                recorder.record(round_num, state)
+
+            # Plot during interactive mode only for each round; highlighted edges,
+            # ties and labels come straight from the auction state
+            if interactive and not renderer:
+                connections = state.connections()
+                highlighted_edges = [(u, v) for v, (u, _) in connections.items()]
+                tie_edges = state.tie_edges()
+                buyer_labels = state.payoff_labels()
+                plot_market(market, graph, prices, buyer_labels, highlight_edges=highlighted_edges, tie_edges=tie_edges,
+                            round_number=round_num, output=round_output(output, f"round{round_num}"))
+    except ValueError as e:
+        # Raised before the first round when the buyers cannot all get a seller
+        print(f"Error: {e}")
+        error = e
+    else:
+        error = None
+    finally:
+        if recorder:
+            recorder.close()
+    if error:
+        finish_rendering(renderer, temporary_log)
+        sys.exit(1)
 
     # Print the perfect match results after exiting the loop
     print("\nPerfect match found:")
-    final_matching_edges = [(str(u), str(v)) for v, (u, _) in connections.items()]
+    connections = state.connections()
+    final_matching_edges = [(u, v) for v, (u, _) in connections.items()]
     for v, (u, _) in connections.items():
         print(f"Node {u} is matched with Node {v}")
 
     # Plot the final perfect match if in interactive mode only once
-    if interactive:
-        plot_graph(graph, prices, buyer_labels, highlight_edges=final_matching_edges, 
-                   title=f"★★★Perfect Match Found at Round {round_num}★★★")
+    if renderer:
+        finish_rendering(renderer, temporary_log)
+    elif interactive:
+        plot_market(market, graph, prices, state.payoff_labels(), highlight_edges=final_matching_edges,
+                    title=f"★★★Perfect Match Found at Round {round_num}★★★", output=round_output(output, "final"))
 
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python market_strategy.py <filename> [--plot] [--interactive]")
+        print("Usage: python market_strategy.py <filename> [--plot] [--interactive] [--save <image file>] [--solver hungarian|auction] [--details] [--record <log.jsonl>] [--animate <gif|mp4|png>]")
         sys.exit(1)
 
     filename = sys.argv[1]
     plot = "--plot" in sys.argv
     interactive = "--interactive" in sys.argv
+    details = "--details" in sys.argv
+    output = sys.argv[sys.argv.index("--save") + 1] if "--save" in sys.argv[:-1] else None
+    solver = sys.argv[sys.argv.index("--solver") + 1] if "--solver" in sys.argv[:-1] else None
+    record = sys.argv[sys.argv.index("--record") + 1] if "--record" in sys.argv[:-1] else None
+    animate = sys.argv[sys.argv.index("--animate") + 1] if "--animate" in sys.argv[:-1] else None
+    if solver is not None and solver not in SOLVERS:
+        print(f"Error: unknown solver '{solver}', choose from {', '.join(SOLVERS)}.")
+        sys.exit(1)
 
     # Ensure that --plot and --interactive do not trigger both behaviors at the same time
     if plot and interactive:
         interactive = True
         plot = False
 
-    main(filename, plot=plot, interactive=interactive)
+    main(filename, plot=plot, interactive=interactive, output=output, solver=solver, details=details,
+         record=record, animate=animate)
@@ -0,0 +1,2 @@
+# Shared engines used by the assignment scripts. Each script puts the repository
+# root on sys.path and imports from here, so the folders can keep their names.
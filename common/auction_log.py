@@ -0,0 +1,228 @@
+import argparse
+import json
+import os
+import sys
+import time
+from multiprocessing import Process
+
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib import animation
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import render
+from common.market import Market
+
+
+# Round event log of the market auction and its offline renderer. The round
+# loop only appends one short JSON line per round, so it never waits on
+# matplotlib; the renderer replays the log into PNG frames, a GIF or an MP4
+# on a single figure whose artists are updated in place, and can run in a
+# background process that follows the log while the auction is still going.
+#
+# The first line of a log is the market: seller and buyer labels, starting
+# prices and the bids (edge_sellers, edge_buyers, valuations). Every further
+# line is a round:
+#   {"round": 3, "raised": [seller ids priced up by 1 since the last round],
+#    "chosen": [[buyer id, edge id], ...] for the buyers whose highlighted
+#    edge changed, "ties": [edge ids], "perfect": false}
+#
+#   python -m common.auction_log rounds.jsonl market.gif
+
+FOLLOW_INTERVAL = 0.05   # seconds between polls of a log that is still being written
+FIGURE_SIZE = (12, 8)
+FRAME_DPI = 100
+
+
+class RoundRecorder:
+    """Writes the event log of one auction; call record(round_num, state) every round."""
+
+    def __init__(self, filename, market):
+        self.filename = filename
+        self.file = open(filename, 'w')
+        self.prices = market.prices.copy()
+        self.shown = np.full(market.num_buyers, -1, dtype=np.int64)
+        header = {
+            'sellers': market.sellers,
+            'buyers': market.buyers,
+            'prices': market.prices.tolist(),
+            'edge_sellers': market.edge_sellers.tolist(),
+            'edge_buyers': market.edge_buyers.tolist(),
+            'valuations': market.valuations.tolist(),
+        }
+        self.file.write(json.dumps(header, default=str) + '\n')
+
+    def record(self, round_num, state):
+        raised = np.flatnonzero(state.price_vector != self.prices)
+        shown = state.shown_edges()
+        changed = np.flatnonzero(shown != self.shown)
+        event = {
+            'round': round_num,
+            'raised': raised.tolist(),
+            'chosen': np.column_stack([changed, shown[changed]]).tolist(),
+            'ties': state.tie_edge_ids().tolist(),
+            'perfect': bool(state.perfect),
+        }
+        self.prices = state.price_vector.copy()
+        self.shown = shown
+        # One line per round, flushed so a following renderer sees it at once
+        self.file.write(json.dumps(event) + '\n')
+        self.file.flush()
+
+    def close(self):
+        # Marks the end for a following renderer, also when the auction stopped early
+        self.file.write(json.dumps({'end': True}) + '\n')
+        self.file.close()
+
+
+def read_log(filename, follow=False):
+    """Yield the market header, then every round event of a log.
+
+    With follow=True a log that is still being written is polled until its
+    round with "perfect": true, or the end mark of a closed log, arrives.
+    """
+    with open(filename) as f:
+        pending = ''
+        while True:
+            line = f.readline()
+            if not line.endswith('\n'):
+                # Partial or no line yet
+                pending += line
+                if not follow:
+                    if pending.strip():
+                        yield json.loads(pending)
+                    return
+                time.sleep(FOLLOW_INTERVAL)
+                continue
+            record = json.loads(pending + line)
+            pending = ''
+            if record.get('end'):
+                return
+            yield record
+            if record.get('perfect'):
+                return
+
+
+class _Frame:
+    """The figure of market_strategy.plot_graph, built once and updated per round."""
+
+    def __init__(self, header):
+        self.market = Market(header['sellers'], header['buyers'], np.array(header['prices']),
+                             np.array(header['edge_sellers'], dtype=np.int64),
+                             np.array(header['edge_buyers'], dtype=np.int64), np.array(header['valuations']))
+        market = self.market
+        self.prices = market.prices.copy()
+        self.shown = np.full(market.num_buyers, -1, dtype=np.int64)
+
+        # Markets on the left, buyers on the right, as in plot_graph
+        self.x = np.r_[np.zeros(market.num_sellers), np.ones(market.num_buyers)]
+        self.y = -np.r_[np.arange(market.num_sellers), np.arange(market.num_buyers)].astype(float)
+        self.sources = market.edge_sellers
+        self.targets = market.num_sellers + market.edge_buyers
+
+        self.fig, self.ax = render.new_figure(FIGURE_SIZE, output=True)
+        ax = self.ax
+        render.draw_edges(ax, self.x, self.y, self.sources, self.targets, color='black')
+        self.highlight = render.draw_edges(ax, self.x, self.y, [], [], color='red', width=2)
+        self.tie = render.draw_edges(ax, self.x, self.y, [], [], color='blue', width=2, style='dashed')
+        render.draw_nodes(ax, self.x[:market.num_sellers], self.y[:market.num_sellers], size=1500, color='orange')
+        render.draw_nodes(ax, self.x[market.num_sellers:], self.y[market.num_sellers:], size=1500, color="#D4FF60")
+
+        self.labelled = market.num_sellers + market.num_buyers <= render.LABEL_LIMIT
+        self.price_texts, self.buyer_texts = [], []
+        if self.labelled:
+            seller_keys, buyer_keys = market.node_keys
+            render.draw_labels(ax, self.x, self.y, list(seller_keys.values()) + list(buyer_keys.values()))
+            self.price_texts = [ax.text(0, y - 0.1, '', fontsize=10, ha='center')
+                                for y in self.y[:market.num_sellers].tolist()]
+            self.buyer_texts = [ax.text(1, y - 0.1, '', fontsize=10, ha='center')
+                                for y in self.y[market.num_sellers:].tolist()]
+        self.title = ax.set_title('')
+        ax.autoscale_view()
+        ax.set_xlim(-0.5, 1.5)
+        ax.axis('off')
+
+    def _segments(self, edges):
+        edges = np.asarray(edges, dtype=np.int64)
+        sources, targets = self.sources[edges], self.targets[edges]
+        return np.stack([np.column_stack([self.x[sources], self.y[sources]]),
+                         np.column_stack([self.x[targets], self.y[targets]])], axis=1)
+
+    def update(self, event, final=False):
+        self.prices[event['raised']] += 1
+        chosen = np.array(event['chosen'], dtype=np.int64).reshape(-1, 2)
+        self.shown[chosen[:, 0]] = chosen[:, 1]
+        self.highlight.set_segments(self._segments(self.shown[self.shown >= 0]))
+        self.tie.set_segments(self._segments([] if final else event['ties']))
+        if self.labelled:
+            for text, price in zip(self.price_texts, self.prices.tolist()):
+                text.set_text(f"Price: {price}")
+            labels = self.market.payoff_labels(self.prices)
+            for text, buyer in zip(self.buyer_texts, self.market.buyers):
+                text.set_text(labels[buyer])
+        if final:
+            self.title.set_text(f"★★★Perfect Match Found at Round {event['round']}★★★")
+        else:
+            self.title.set_text(f"Round {event['round']}: Market vs Buyer")
+
+
+def render_log(filename, output, follow=False, fps=2):
+    """Render a round log to output: .gif or .mp4 for an animation, otherwise
+    PNG frames <stem>_round1.png, ... and <stem>_final.png.
+
+    Returns the number of frames written.
+    """
+    records = read_log(filename, follow)
+    frame = _Frame(next(records))
+    stem, extension = os.path.splitext(output)
+    frames = 0
+    if extension in ('.gif', '.mp4'):
+        writer = animation.PillowWriter(fps=fps) if extension == '.gif' else animation.FFMpegWriter(fps=fps)
+        with writer.saving(frame.fig, output, FRAME_DPI):
+            for event in records:
+                frame.update(event)
+                writer.grab_frame()
+                frames += 1
+                if event['perfect']:
+                    frame.update({**event, 'raised': [], 'chosen': []}, final=True)
+                    writer.grab_frame()
+                    frames += 1
+    else:
+        for event in records:
+            frame.update(event)
+            frame.fig.savefig(f"{stem}_round{event['round']}{extension}", dpi=FRAME_DPI)
+            frames += 1
+            if event['perfect']:
+                frame.update({**event, 'raised': [], 'chosen': []}, final=True)
+                frame.fig.savefig(f"{stem}_final{extension}", dpi=FRAME_DPI)
+                frames += 1
+    plt.close(frame.fig)
+    return frames
+
+
+def _render_worker(filename, output, follow):
+    frames = render_log(filename, output, follow)
+    print(f"Rendered {frames} frames to {output}.")
+
+
+def start_renderer(filename, output):
+    """Render a log in a background process that follows it as it is written."""
+    worker = Process(target=_render_worker, args=(filename, output, True), daemon=True)
+    worker.start()
+    return worker
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render a market round log to frames or an animation')
+    parser.add_argument('log', help='Round log written by market_strategy.py --record')
+    parser.add_argument('output', help='.gif or .mp4 for an animation, otherwise a PNG file name stem')
+    parser.add_argument('--fps', type=float, default=2, help='Frames per second of an animation (default: 2)')
+    args = parser.parse_args()
+    if not os.path.exists(args.log):
+        parser.error(f"File '{args.log}' does not exist.")
+    frames = render_log(args.log, args.output, fps=args.fps)
+    print(f"Rendered {frames} frames to {args.output}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+import csv
+import json
+import random
+import time
+from collections import deque
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import breadth_first_order, connected_components
+
+
+# Signed-graph balance checks shared by the graph_analysis scripts.
+# A positive edge keeps both endpoints in the same camp, a negative edge puts
+# them in opposite camps. The graph is balanced exactly when such a two-camp
+# split exists, so one BFS two-colouring answers the question in O(V + E)
+# instead of enumerating every cycle.
+
+def edge_sign(graph, u, v):
+    return graph[u][v].get('sign', 1)
+
+
+def check_balance(graph):
+    """Return (True, (camp_a, camp_b)) or (False, frustrated_cycle)."""
+    if graph.is_directed():
+        graph = graph.to_undirected(as_view=True)
+
+    camp = {}
+    parent = {}
+    for start in graph.nodes():
+        if start in camp:
+            continue
+        camp[start] = 0
+        parent[start] = None
+        queue = deque([start])
+        while queue:
+            u = queue.popleft()
+            for v in graph.neighbors(u):
+                expected = camp[u] if edge_sign(graph, u, v) != -1 else 1 - camp[u]
+                if v not in camp:
+                    camp[v] = expected
+                    parent[v] = u
+                    queue.append(v)
+                elif camp[v] != expected:
+                    return False, _frustrated_cycle(parent, u, v)
+
+    camp_a = [node for node, side in camp.items() if side == 0]
+    camp_b = [node for node, side in camp.items() if side == 1]
+    return True, (camp_a, camp_b)
+
+
+# Close the tree paths from u and v at their lowest common ancestor. The tree
+# path fixes the camps of u and v, and the edge (u, v) disagrees with it, so the
+# cycle carries an odd number of negative edges.
+def _frustrated_cycle(parent, u, v):
+    u_path = [u]
+    while parent[u_path[-1]] is not None:
+        u_path.append(parent[u_path[-1]])
+    on_u_path = {node: i for i, node in enumerate(u_path)}
+
+    v_path = [v]
+    while v_path[-1] not in on_u_path:
+        v_path.append(parent[v_path[-1]])
+
+    lca = v_path[-1]
+    return u_path[:on_u_path[lca] + 1] + v_path[-2::-1]
+
+
+def check_balance_csr(offsets, neighbors, edge_ids, signs):
+    """check_balance over arrays: a CSR adjacency holding both directions of
+    every edge (graph_cache.build_csr), edge_ids mapping its slots to edges,
+    and signs[edge] = -1 for a negative edge.
+
+    Returns (True, camp) with camp[v] 0 or 1 for every node, or (False,
+    frustrated cycle as a list of node ids).
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    neighbors = np.asarray(neighbors, dtype=np.int64)
+    num_nodes = len(offsets) - 1
+    rows = np.repeat(np.arange(num_nodes), np.diff(offsets))
+    negative = (np.asarray(signs)[np.asarray(edge_ids)] == -1).astype(np.int8)
+
+    # BFS forest: a virtual node (num_nodes) is joined to the first node of every component
+    adjacency = sp.csr_matrix((np.ones(len(neighbors)), neighbors, offsets), shape=(num_nodes, num_nodes))
+    _, labels = connected_components(adjacency, directed=False)
+    roots = np.unique(labels, return_index=True)[1]
+    forest = sp.csr_matrix((np.ones(len(neighbors) + len(roots)),
+                            (np.r_[rows, np.full(len(roots), num_nodes)], np.r_[neighbors, roots])),
+                           shape=(num_nodes + 1, num_nodes + 1))
+    order, parent = breadth_first_order(forest, num_nodes, directed=True)
+    parent = parent.astype(np.int64)
+    parent[num_nodes] = num_nodes
+
+    # A tree edge flips the camp when it is negative; look up the slot of every (parent, child)
+    keys = rows * num_nodes + neighbors
+    by_key = np.argsort(keys, kind='stable')
+    children = order[1:][parent[order[1:]] != num_nodes]
+    slots = by_key[np.searchsorted(keys[by_key], parent[children] * num_nodes + children)]
+    flip = np.zeros(num_nodes + 1, dtype=np.int8)
+    flip[children] = negative[slots]
+
+    # Camp = parity of the negative tree edges up to the root, by pointer jumping
+    camp, up = flip.copy(), parent.copy()
+    while np.any(up != num_nodes):
+        camp ^= camp[up]
+        up = up[up]
+    camp = camp[:num_nodes]
+
+    bad = np.flatnonzero((camp[rows] ^ camp[neighbors]) != negative)
+    if not len(bad):
+        return True, camp
+    u, v = int(rows[bad[0]]), int(neighbors[bad[0]])
+    tree = {node: (None if p == num_nodes else p) for node, p in _ancestors(parent, u, num_nodes)}
+    tree.update((node, None if p == num_nodes else p) for node, p in _ancestors(parent, v, num_nodes))
+    return False, _frustrated_cycle(tree, u, v)
+
+
+def _ancestors(parent, node, root):
+    while node != root:
+        yield node, int(parent[node])
+        node = int(parent[node])
+
+
+def is_graph_balanced(graph):
+    balanced, _ = check_balance(graph)
+    return balanced
+
+
+# Short printable form of a node list, so huge camps don't flood the terminal
+def preview(nodes, limit=20):
+    shown = ', '.join(str(node) for node in nodes[:limit])
+    if len(nodes) > limit:
+        shown += f", ... ({len(nodes) - limit} more)"
+    return f"[{shown}]"
+
+
+# Estimate the frustration index: the fewest edge signs that must flip before
+# the graph becomes balanced. Exact answers are NP-hard, so this seeds a camp
+# assignment from a random BFS spanning tree (every tree edge satisfied) and
+# then flips single nodes while that lowers the number of frustrated edges.
+# Random restarts run until max_restarts or the time budget (seconds) is used.
+def estimate_frustration(graph, time_budget=10.0, max_restarts=20, seed=None):
+    """Return (frustration_count, frustrated_edges) for the best split found."""
+    if graph.is_directed():
+        graph = graph.to_undirected(as_view=True)
+
+    rng = random.Random(seed)
+    deadline = time.perf_counter() + time_budget
+
+    nodes = list(graph.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    adjacency = [[] for _ in nodes]
+    self_loops = []
+    for u, v, data in graph.edges(data=True):
+        sign = data.get('sign', 1)
+        if u == v:
+            if sign == -1:
+                self_loops.append((u, v))
+            continue
+        i, j = index[u], index[v]
+        adjacency[i].append((j, sign))
+        adjacency[j].append((i, sign))
+
+    best_count = None
+    best_camp = None
+    for _ in range(max(1, max_restarts)):
+        camp = _spanning_tree_camps(adjacency, rng)
+        _local_search(adjacency, camp, deadline)
+        count = sum(1 for i in range(len(nodes)) for j, sign in adjacency[i]
+                    if i < j and _is_frustrated(camp, i, j, sign))
+        if best_count is None or count < best_count:
+            best_count, best_camp = count, camp
+        if best_count == 0 or time.perf_counter() >= deadline:
+            break
+
+    frustrated = [(nodes[i], nodes[j]) for i in range(len(nodes)) for j, sign in adjacency[i]
+                  if i < j and _is_frustrated(best_camp, i, j, sign)]
+    frustrated.extend(self_loops)
+    return len(frustrated), frustrated
+
+
+def _is_frustrated(camp, i, j, sign):
+    return (camp[i] == camp[j]) == (sign == -1)
+
+
+# BFS from randomly ordered roots, colouring each node so its tree edge holds
+def _spanning_tree_camps(adjacency, rng):
+    camp = [-1] * len(adjacency)
+    order = list(range(len(adjacency)))
+    rng.shuffle(order)
+    for start in order:
+        if camp[start] != -1:
+            continue
+        camp[start] = rng.randint(0, 1)
+        queue = deque([start])
+        while queue:
+            i = queue.popleft()
+            neighbors = adjacency[i][:]
+            rng.shuffle(neighbors)
+            for j, sign in neighbors:
+                if camp[j] == -1:
+                    camp[j] = camp[i] if sign != -1 else 1 - camp[i]
+                    queue.append(j)
+    return camp
+
+
+# gain[i] = frustrated minus satisfied edges at i, i.e. how many frustrated
+# edges disappear if i switches camp. Flip while some node has positive gain.
+def _local_search(adjacency, camp, deadline):
+    gain = [0] * len(adjacency)
+    for i, neighbors in enumerate(adjacency):
+        for j, sign in neighbors:
+            gain[i] += 1 if _is_frustrated(camp, i, j, sign) else -1
+
+    queue = deque(i for i in range(len(adjacency)) if gain[i] > 0)
+    steps = 0
+    while queue:
+        steps += 1
+        if steps % 4096 == 0 and time.perf_counter() >= deadline:
+            break
+        i = queue.popleft()
+        if gain[i] <= 0:
+            continue
+        for j, sign in adjacency[i]:
+            # The edge switches state, which moves j's gain by two
+            if _is_frustrated(camp, i, j, sign):
+                gain[j] -= 2
+            else:
+                gain[j] += 2
+                if gain[j] > 0:
+                    queue.append(j)
+        camp[i] = 1 - camp[i]
+        gain[i] = -gain[i]
+
+
+# Attribute balance: an edge between nodes with the same attribute value must
+# be positive, between different values negative. Every edge is classified in
+# one vectorised pass over attribute codes and signs, so a single run reports
+# all problems instead of stopping at the first one.
+VIOLATION_TYPES = ('missing_attribute', 'same_attribute_negative', 'different_attribute_positive')
+
+
+def attribute_violations(codes, sources, targets, signs):
+    """Classify every edge by its endpoints' attribute codes (-1 = missing).
+
+    Returns an int array with, per edge, the index of its VIOLATION_TYPES
+    entry, or -1 when the edge is consistent.
+    """
+    source_codes = codes[sources]
+    target_codes = codes[targets]
+    kinds = np.full(len(sources), -1, dtype=np.int8)
+    same = source_codes == target_codes
+    kinds[same & (signs != 1)] = 1
+    kinds[~same & (signs != -1)] = 2
+    kinds[(source_codes < 0) | (target_codes < 0)] = 0
+    return kinds
+
+
+def violation_counts(kinds):
+    counts = np.bincount(kinds[kinds >= 0], minlength=len(VIOLATION_TYPES))
+    return dict(zip(VIOLATION_TYPES, counts.tolist()))
+
+
+def write_violations(filename, attribute, nodes, values, sources, targets, signs, kinds):
+    """Write every violation to a CSV file, or JSON lines if filename ends in .jsonl.
+
+    nodes and values hold the label and attribute value of every node id.
+    """
+    fields = ['type', 'source', 'target', 'sign', f'source_{attribute}', f'target_{attribute}']
+    picked = np.flatnonzero(kinds >= 0)
+    rows = ([VIOLATION_TYPES[kind], nodes[u], nodes[v], sign, values[u], values[v]]
+            for kind, u, v, sign in zip(kinds[picked].tolist(), sources[picked].tolist(),
+                                        targets[picked].tolist(), signs[picked].tolist()))
+    with open(filename, 'w', newline='') as f:
+        if filename.endswith('.jsonl'):
+            for row in rows:
+                f.write(json.dumps(dict(zip(fields, row)), default=str) + '\n')
+        else:
+            writer = csv.writer(f)
+            writer.writerow(fields)
+            writer.writerows(rows)
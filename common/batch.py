@@ -0,0 +1,240 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import graph_cache, market
+
+
+# Batch market clearing: one base market and many what-if scenarios, each a
+# list of deltas against the base, cleared across a process pool. The base
+# market's arrays are handed to every worker once through the pool
+# initializer; a scenario applies its deltas to copies of those arrays, and
+# results stream out as JSONL in input order.
+#
+#   python -m common.batch market.gml scenarios.jsonl --processes 8 > results.jsonl
+#
+# A delta is (kind, seller, buyer, value):
+#   valuation      set the buyer's valuation of the seller (adds the edge,
+#                  and the buyer, when missing)
+#   price          set the seller's starting price
+#   remove_edge    drop the seller-buyer edge
+#   remove_buyer   drop the buyer and its edges
+# Scenario files are JSONL, one {"scenario": id, "deltas": [{"kind": ...,
+# "seller": ..., "buyer": ..., "value": ...}, ...]} per line, or CSV with
+# the columns scenario,kind,seller,buyer,value and one row per delta.
+
+DELTA_FIELDS = {                    # fields each kind of delta needs
+    'valuation': ('seller', 'buyer', 'value'),
+    'price': ('seller', 'value'),
+    'remove_edge': ('seller', 'buyer'),
+    'remove_buyer': ('buyer',),
+}
+DELTA_KINDS = tuple(DELTA_FIELDS)
+METHODS = ('rounds',) + tuple(market.SOLVERS)
+
+
+def read_scenarios(filename):
+    """Yield (scenario id, [(kind, seller, buyer, value), ...]) from a JSONL or CSV file."""
+    if filename.endswith('.csv'):
+        with open(filename, newline='') as f:
+            current, deltas = None, []
+            for row in csv.DictReader(f):
+                if row['scenario'] != current and deltas:
+                    yield current, deltas
+                    deltas = []
+                current = row['scenario']
+                deltas.append((row['kind'], row.get('seller') or None, row.get('buyer') or None,
+                               row.get('value') or None))
+            if deltas:
+                yield current, deltas
+        return
+    with open(filename) as f:
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                record = json.loads(line)
+                yield (record.get('scenario', number),
+                       [(d['kind'], d.get('seller'), d.get('buyer'), d.get('value')) for d in record.get('deltas', [])])
+
+
+def _number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def check_delta(kind, seller, buyer, value):
+    """Raise ValueError unless the delta has a known kind and every field that kind needs."""
+    if kind not in DELTA_FIELDS:
+        raise ValueError(f"unknown delta kind '{kind}'")
+    given = {'seller': seller, 'buyer': buyer, 'value': value}
+    missing = [field for field in DELTA_FIELDS[kind] if given[field] is None]
+    if missing:
+        raise ValueError(f"{kind} delta needs {' and '.join(missing)}")
+    if value is not None:
+        try:
+            float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{kind} delta value {value!r} is not a number") from None
+
+
+class BaseMarket:
+    """The base market of a batch: its Market arrays and label lookups, built once.
+
+    buyers lists every buyer label of the base market, including buyers
+    without bids, which Market leaves out (default: market.buyers).
+    """
+
+    def __init__(self, base, buyers=None):
+        self.market = base
+        self.seller_ids = {str(seller): i for i, seller in enumerate(base.sellers)}
+        self.buyer_labels = list(base.buyers)
+        bidding = set(self.buyer_labels)
+        self.buyer_labels += [buyer for buyer in buyers or () if buyer not in bidding]
+        self.buyer_ids = {str(buyer): i for i, buyer in enumerate(self.buyer_labels)}
+
+    @classmethod
+    def from_graph(cls, graph):
+        return cls(market.Market.from_graph(graph), market.buyers(graph))
+
+    def apply(self, deltas):
+        """Market of the base with the scenario's deltas applied; the base arrays are not changed."""
+        base = self.market
+        prices = base.prices.astype(float)
+        valuations = base.valuations.astype(float)
+        keep = np.ones(len(valuations), dtype=bool)
+        added = {}                                  # (seller, buyer) -> valuation of new bids
+        labels, ids = self.buyer_labels, self.buyer_ids
+        removed = set()
+        for kind, seller, buyer, value in deltas:
+            check_delta(kind, seller, buyer, value)
+            if seller is not None:
+                if str(seller) not in self.seller_ids:
+                    raise ValueError(f"seller {seller!r} not in market")
+                seller = self.seller_ids[str(seller)]
+            if buyer is not None:
+                if str(buyer) in self.seller_ids and str(buyer) not in ids:
+                    raise ValueError(f"buyer {buyer!r} is a seller")
+                if str(buyer) not in ids or ids[str(buyer)] in removed:
+                    if kind != 'valuation':
+                        raise ValueError(f"buyer {buyer!r} not in market")
+                    if str(buyer) not in ids:
+                        if labels is self.buyer_labels:
+                            labels, ids = list(labels), dict(ids)
+                        ids[str(buyer)] = len(labels)
+                        labels.append(str(buyer))
+                    removed.discard(ids[str(buyer)])
+                buyer = ids[str(buyer)]
+
+            if kind == 'price':
+                prices[seller] = _number(value)
+                continue
+            if kind == 'remove_buyer':
+                keep &= base.edge_buyers != buyer
+                added = {edge: v for edge, v in added.items() if edge[1] != buyer}
+                removed.add(buyer)
+                continue
+            existing = np.flatnonzero((base.edge_sellers == seller) & (base.edge_buyers == buyer))
+            if kind == 'valuation':
+                if len(existing):
+                    keep[existing] = True
+                    valuations[existing] = _number(value)
+                else:
+                    added[seller, buyer] = _number(value)
+            else:
+                keep[existing] = False
+                added.pop((seller, buyer), None)
+
+        new = np.array(list(added), dtype=np.int64).reshape(-1, 2)
+        return market.Market._from_edges(base.sellers, prices, np.r_[base.edge_sellers[keep], new[:, 0]],
+                                         np.r_[base.edge_buyers[keep], new[:, 1]], labels,
+                                         np.r_[valuations[keep], list(added.values())])
+
+
+# Worker side of the pool: the base market comes once per worker through the
+# initializer, tasks only carry a scenario
+_SHARED = {}
+
+
+def _init_worker(base, method):
+    _SHARED['base'] = base
+    _SHARED['method'] = method
+
+
+def _clear_scenario(job):
+    scenario, deltas = job
+    start = time.perf_counter()
+    try:
+        scenario_market = _SHARED['base'].apply(deltas)
+        if _SHARED['method'] == 'rounds':
+            prices, matching, rounds = market.clear_market(scenario_market)
+        else:
+            prices, matching, rounds = market.solve_market(scenario_market, _SHARED['method'])
+        result = {'scenario': scenario, 'prices': prices, 'matching': matching, 'rounds': rounds}
+    except Exception as e:
+        # One bad scenario must not end the batch
+        message = str(e.args[0]) if isinstance(e, (ValueError, KeyError)) and e.args else str(e)
+        result = {'scenario': scenario, 'error': message if message else type(e).__name__}
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def clear_scenarios(base, scenarios, method='rounds', processes=1, chunksize=None):
+    """Clear every (id, deltas) scenario against the base market; yields result dicts in input order.
+
+    base is a BaseMarket or a market graph. A result has 'scenario',
+    'prices', 'matching', 'rounds' and 'seconds', or 'error' in place of
+    the market for a scenario that cannot clear.
+    """
+    if not isinstance(base, BaseMarket):
+        base = BaseMarket.from_graph(base)
+    if processes and processes > 1:
+        with Pool(processes, _init_worker, (base, method)) as pool:
+            yield from pool.imap(_clear_scenario, scenarios, chunksize or 8)
+    else:
+        _init_worker(base, method)
+        yield from map(_clear_scenario, scenarios)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Clear many market scenarios against one base market')
+    parser.add_argument('market', help='Base market graph (GML)')
+    parser.add_argument('scenarios', help='Scenario deltas (.jsonl or .csv)')
+    parser.add_argument('--method', choices=METHODS, default='rounds',
+                        help='rounds: the market_strategy.py auction loop; hungarian/auction: direct solvers')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='Worker processes (default: all cores)')
+    parser.add_argument('--chunksize', type=int, default=8, help='Scenarios handed to a worker at a time')
+    parser.add_argument('--output', help='JSONL file for the results (default: standard output)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.market):
+        parser.error(f"File '{args.market}' does not exist.")
+    if not os.path.exists(args.scenarios):
+        parser.error(f"File '{args.scenarios}' does not exist.")
+    if args.processes < 1 or args.chunksize < 1:
+        parser.error("--processes and --chunksize must be at least 1")
+
+    base = BaseMarket.from_graph(graph_cache.read_graph(args.market))
+    out = open(args.output, 'w') if args.output else sys.stdout
+    start = time.perf_counter()
+    count = errors = 0
+    try:
+        for result in clear_scenarios(base, read_scenarios(args.scenarios), args.method, args.processes,
+                                      args.chunksize):
+            out.write(json.dumps(result, default=str) + '\n')
+            count += 1
+            errors += 'error' in result
+    finally:
+        if args.output:
+            out.close()
+    print(f"Cleared {count - errors} of {count} scenarios in {time.perf_counter() - start:.2f}s "
+          f"with {args.processes} processes.", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,340 @@
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from functools import cached_property
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import gml_stream, graph_cache
+from common.bfs import connected_component_labels
+from common.graph_index import GraphIndex
+from common.market import Market, clear_market
+from common.partition import serial_edge_betweenness
+from common.pipeline import run_pipeline
+
+
+# Benchmarks of the hot paths of the four assignment scripts on synthetic
+# inputs of increasing size: Erdős–Rényi graphs from create_random_graph_in_gml,
+# the same graphs with balanced edge signs and node colours, and random
+# bipartite markets. Every benchmark runs --repeat times per size and keeps
+# the best and the median time; results go to JSON with the log-log slope of
+# time over size per benchmark, and are compared with a stored baseline so a
+# slower run shows up before it is deployed.
+#
+#   python -m common.benchmark --output results.json --baseline baseline.json
+#   python -m common.benchmark --baseline baseline.json --save_baseline
+#
+# The exit status is 1 when a benchmark is more than --tolerance slower than
+# in the baseline.
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+CONSTANT = 1.5          # c of the random graphs, p = c ln(n) / n
+MARKET_DEGREE = 4       # bids per buyer in the random markets
+MAX_VALUATION = 50      # valuations are drawn from 0..MAX_VALUATION - 1
+NOISE_FLOOR = 0.005     # seconds; smaller differences never count as a change
+
+
+def _load_script(path, name):
+    """Import one of the assignment scripts, whose folders are not packages."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+erdos_renyi_graph = _load_script(os.path.join('Assignment 1 (Graph)', 'erdos_renyi_graph.py'), 'erdos_renyi_graph')
+graph_analysis = _load_script(os.path.join('Assignment 3', 'graph_analysis.py'), 'graph_analysis')
+
+
+class Inputs:
+    """Synthetic inputs of one size, each built on first use in a scratch directory."""
+
+    def __init__(self, size, directory, seed=0):
+        self.size = size
+        self.directory = directory
+        self.seed = seed
+
+    def path(self, name):
+        return os.path.join(self.directory, f"{name}_{self.size}.gml")
+
+    def make_random_gml(self, filename):
+        # create_random_graph_in_gml reports every graph it writes; keep the benchmark output readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            erdos_renyi_graph.create_random_graph_in_gml(self.size, CONSTANT, filename, self.seed)
+
+    @cached_property
+    def random_file(self):
+        filename = self.path('random')
+        self.make_random_gml(filename)
+        return filename
+
+    @cached_property
+    def graph(self):
+        return graph_cache.read_graph(self.random_file, use_cache=False)
+
+    @cached_property
+    def signed_graph(self):
+        """The random graph with two colour camps: green edges inside a camp,
+        red edges across, so the graph is balanced and the checks visit all of it.
+        """
+        graph = self.graph.copy()
+        rng = np.random.default_rng(self.seed)
+        camp = dict(zip(graph.nodes(), rng.integers(0, 2, graph.number_of_nodes()).tolist()))
+        for node, data in graph.nodes(data=True):
+            data['color'] = 'g' if camp[node] else 'r'
+        for u, v, data in graph.edges(data=True):
+            data['color'] = 'g' if camp[u] == camp[v] else 'r'
+            data['sign'] = 1 if camp[u] == camp[v] else -1
+        return graph
+
+    @cached_property
+    def signed_file(self):
+        filename = self.path('signed')
+        gml_stream.write_gml(self.signed_graph, filename)
+        return filename
+
+    @cached_property
+    def index(self):
+        return GraphIndex(self.signed_graph)
+
+    @cached_property
+    def market(self):
+        """size sellers and size buyers; buyer i always bids on seller i, so the market can clear."""
+        rng = np.random.default_rng(self.seed)
+        edge_buyers = np.repeat(np.arange(self.size), MARKET_DEGREE)
+        edge_sellers = rng.integers(0, self.size, len(edge_buyers))
+        edge_sellers[::MARKET_DEGREE] = np.arange(self.size)
+        bids = np.unique(np.column_stack([edge_buyers, edge_sellers]), axis=0)
+        return Market([str(i) for i in range(self.size)], [str(self.size + i) for i in range(self.size)],
+                      np.zeros(self.size, dtype=np.int64), bids[:, 1], bids[:, 0],
+                      rng.integers(0, MAX_VALUATION, len(bids)))
+
+
+# A benchmark takes the inputs of one size and returns the call to time;
+# building the inputs is never part of the measurement
+
+def _random_gml(inputs):
+    return lambda: inputs.make_random_gml(inputs.path('generated'))
+
+
+def _gml_save(inputs):
+    return lambda: gml_stream.write_gml(inputs.signed_graph, inputs.path('saved'))
+
+
+def _gml_load(inputs):
+    filename = inputs.signed_file
+    return lambda: graph_cache.read_graph(filename, use_cache=False)
+
+
+def _gml_load_cached(inputs):
+    filename = inputs.signed_file
+    graph_cache.read_graph(filename)   # writes the cache
+    return lambda: graph_cache.read_graph(filename)
+
+
+def _balance(inputs):
+    graph = inputs.signed_graph
+    return lambda: graph_analysis.is_graph_balanced(graph)
+
+
+def _attribute_balance(inputs):
+    # The index, its edge arrays and the colour column are built once; only the check is timed
+    index = inputs.index
+    index.sources, index.node_values('color')
+    return lambda: graph_analysis.is_graph_balanced_by_attributes(index, 'color')
+
+
+# The analyses below run through the pipeline on a fresh GraphIndex, so the
+# index arrays they need are built inside the measurement as in a real run
+
+
+def _components(inputs):
+    graph = inputs.signed_graph
+    index = inputs.index
+    # One more component than the graph has: at least one Girvan-Newman split
+    k = len(np.unique(connected_component_labels(index.num_nodes, index.sources, index.targets))) + 1
+    options = {'components': k, 'betweenness': serial_edge_betweenness}
+    return lambda: run_pipeline(GraphIndex(graph), ['components'], options)
+
+
+def _clustering(inputs):
+    graph = inputs.signed_graph
+    return lambda: run_pipeline(GraphIndex(graph), ['clustering'], {'clustering_epsilon': None})
+
+
+def _overlap(inputs):
+    graph = inputs.signed_graph
+    return lambda: run_pipeline(GraphIndex(graph), ['overlap'], {})
+
+
+def _hierarchy_layout(inputs):
+    graph = inputs.graph
+    root = next(iter(graph.nodes()))
+    return lambda: erdos_renyi_graph.hierarchy_layout_arrays(graph, root)
+
+
+def _market_rounds(inputs):
+    market = inputs.market
+    return lambda: clear_market(market)
+
+
+# name -> (benchmark, sizes at --scale 1); sizes are nodes, or buyers for the market
+BENCHMARKS = {
+    'random_gml': (_random_gml, (1000, 10000, 100000)),
+    'gml_save': (_gml_save, (1000, 10000, 100000)),
+    'gml_load': (_gml_load, (1000, 10000, 100000)),
+    'gml_load_cached': (_gml_load_cached, (1000, 10000, 100000)),
+    'balance': (_balance, (1000, 10000, 100000)),
+    'attribute_balance': (_attribute_balance, (1000, 10000, 100000)),
+    'components': (_components, (50, 100, 200)),
+    'clustering': (_clustering, (1000, 10000, 100000)),
+    'overlap': (_overlap, (1000, 10000, 100000)),
+    'hierarchy_layout': (_hierarchy_layout, (1000, 10000, 100000)),
+    'market_rounds': (_market_rounds, (100, 1000, 10000)),
+}
+
+
+def time_call(call, repeat):
+    """Seconds of every one of repeat calls."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_benchmarks(names, scale=1.0, repeat=3, seed=0):
+    """Time the named benchmarks at every size; returns a list of result dicts."""
+    sizes = sorted({max(2, int(size * scale)) for name in names for size in BENCHMARKS[name][1]})
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            # Inputs are shared by the benchmarks of one size and dropped before the next
+            inputs = Inputs(size, directory, seed)
+            for name in names:
+                benchmark, default_sizes = BENCHMARKS[name]
+                if size not in {max(2, int(s * scale)) for s in default_sizes}:
+                    continue
+                times = time_call(benchmark(inputs), repeat)
+                result = {'benchmark': name, 'size': size, 'best': min(times), 'median': float(np.median(times)),
+                          'repeat': repeat}
+                results.append(result)
+                print(f"{name} n={size}: {result['best']:.4f}s (median {result['median']:.4f}s)")
+    return results
+
+
+def scaling_exponents(results):
+    """Slope of log(best time) over log(size) per benchmark: 1 is linear, 2 quadratic."""
+    exponents = {}
+    for name in dict.fromkeys(result['benchmark'] for result in results):
+        points = [(result['size'], result['best']) for result in results
+                  if result['benchmark'] == name and result['best'] > 0]
+        if len(points) > 1:
+            sizes, seconds = np.log(np.array(points)).T
+            exponents[name] = float(np.polyfit(sizes, seconds, 1)[0])
+    return exponents
+
+
+def compare(results, baseline, tolerance=0.25):
+    """Compare with the results of a baseline run; one entry per benchmark and size found in both.
+
+    An entry's ratio divides the new time by the baseline time, taken as at
+    least NOISE_FLOOR so a baseline of 0 still gives a number.
+    """
+    previous = {(result['benchmark'], result['size']): result['best'] for result in baseline['results']}
+    comparison = []
+    for result in results:
+        key = (result['benchmark'], result['size'])
+        if key not in previous:
+            continue
+        before, after = previous[key], result['best']
+        if abs(after - before) < NOISE_FLOOR:
+            status = 'same'
+        elif after > before * (1 + tolerance):
+            status = 'regression'
+        elif after * (1 + tolerance) < before:
+            status = 'improvement'
+        else:
+            status = 'same'
+        comparison.append({'benchmark': key[0], 'size': key[1], 'baseline': before, 'best': after,
+                           'ratio': after / max(before, NOISE_FLOOR), 'status': status})
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths of the graph and market tools')
+    parser.add_argument('--only', help=f"Comma separated benchmarks (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiply every input size by this factor')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per benchmark and size')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic inputs')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--save_baseline', action='store_true', help='Store this run as the --baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Slowdown over the baseline that counts as a regression (default: 0.25 = 25%%)')
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)} (choose from {', '.join(BENCHMARKS)})")
+    if args.repeat < 1 or args.scale <= 0:
+        parser.error("--repeat must be at least 1 and --scale positive")
+    if args.save_baseline and not args.baseline:
+        parser.error("--save_baseline needs --baseline")
+    baseline = None
+    if args.baseline and not args.save_baseline:
+        if not os.path.exists(args.baseline):
+            parser.error(f"File '{args.baseline}' does not exist.")
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = run_benchmarks(names, args.scale, args.repeat, args.seed)
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.platform(),
+        'cpus': os.cpu_count(),
+        'scale': args.scale,
+        'seed': args.seed,
+        'results': results,
+        'scaling': scaling_exponents(results),
+    }
+    for name, exponent in report['scaling'].items():
+        print(f"{name}: time grows as size^{exponent:.2f}")
+
+    regressions = []
+    if baseline:
+        report['baseline'] = {'file': args.baseline, 'created': baseline.get('created')}
+        report['comparison'] = compare(results, baseline, args.tolerance)
+        regressions = [entry for entry in report['comparison'] if entry['status'] == 'regression']
+        for entry in report['comparison']:
+            if entry['status'] != 'same':
+                print(f"{entry['status']}: {entry['benchmark']} n={entry['size']} "
+                      f"{entry['baseline']:.4f}s -> {entry['best']:.4f}s ({entry['ratio']:.2f}x)")
+        print(f"{len(regressions)} regressions in {len(report['comparison'])} comparisons with {args.baseline}.")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.output}.")
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}.")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
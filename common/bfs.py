@@ -0,0 +1,136 @@
+import numpy as np
+
+
+# Breadth-first search and connectivity over CSR arrays (see graph_cache.build_csr).
+# Whole frontiers are expanded at once with NumPy instead of visiting nodes one
+# by one, so BFS on million-node graphs stays in C loops, and no networkx tree
+# is built per source.
+
+# Switching thresholds from Beamer et al.: go bottom-up once the frontier has
+# more than 1/ALPHA of the unexplored edges, back to top-down once it holds
+# fewer than 1/BETA of the nodes.
+ALPHA = 14
+BETA = 24
+
+
+# Visited sets are bitsets of uint64 words, 1 bit per node
+def _bitset(num_nodes):
+    return np.zeros((num_nodes + 63) // 64, dtype=np.uint64)
+
+
+def _bits_test(bits, nodes):
+    return ((bits[nodes >> 6] >> (nodes & 63).astype(np.uint64)) & np.uint64(1)).astype(bool)
+
+
+def _bits_set(bits, nodes):
+    np.bitwise_or.at(bits, nodes >> 6, np.left_shift(np.uint64(1), (nodes & 63).astype(np.uint64)))
+
+
+# Every neighbour slot of the given rows, with the row each slot belongs to
+def _row_slots(offsets, rows):
+    starts = offsets[rows]
+    counts = offsets[rows + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    # Position of every slot: start of its row plus its rank in the row
+    firsts = np.cumsum(counts) - counts
+    slots = np.arange(total) - np.repeat(firsts, counts) + np.repeat(starts, counts)
+    return slots, np.repeat(rows, counts)
+
+
+def direction_optimizing_bfs(offsets, neighbors, source, directed=False):
+    """BFS from source; returns (distances, parents) as int32 arrays, -1 where unreached.
+
+    Each level is expanded either top-down (scan the frontier's edges) or
+    bottom-up (let every unvisited node look for a parent in the frontier),
+    whichever touches fewer edges. Bottom-up needs in-edges, so directed
+    graphs stay top-down.
+    """
+    offsets = np.asarray(offsets)
+    neighbors = np.asarray(neighbors)
+    num_nodes = len(offsets) - 1
+    degree = np.diff(offsets)
+    distances = np.full(num_nodes, -1, dtype=np.int32)
+    parents = np.full(num_nodes, -1, dtype=np.int32)
+    visited = _bitset(num_nodes)
+
+    frontier = np.array([source], dtype=np.int64)
+    distances[source] = 0
+    parents[source] = source
+    _bits_set(visited, frontier)
+    unexplored_edges = int(offsets[-1]) - int(degree[source])
+    top_down = True
+    level = 0
+
+    while len(frontier):
+        level += 1
+        frontier_edges = int(degree[frontier].sum())
+        if top_down and not directed and frontier_edges > unexplored_edges / ALPHA:
+            top_down = False
+        elif not top_down and len(frontier) < num_nodes / BETA:
+            top_down = True
+
+        if top_down:
+            slots, owners = _row_slots(offsets, frontier)
+            reached = neighbors[slots]
+            fresh = ~_bits_test(visited, reached)
+            reached, first = np.unique(reached[fresh], return_index=True)
+            parents[reached] = owners[fresh][first]
+        else:
+            in_frontier = _bitset(num_nodes)
+            _bits_set(in_frontier, frontier)
+            unvisited = np.flatnonzero(distances < 0)
+            slots, owners = _row_slots(offsets, unvisited)
+            candidates = neighbors[slots]
+            hit = _bits_test(in_frontier, candidates)
+            reached, first = np.unique(owners[hit], return_index=True)
+            parents[reached] = candidates[hit][first]
+
+        distances[reached] = level
+        _bits_set(visited, reached)
+        unexplored_edges -= int(degree[reached].sum())
+        frontier = reached
+
+    return distances, parents
+
+
+def bfs_many(offsets, neighbors, sources, directed=False):
+    """Run direction_optimizing_bfs from every source.
+
+    Returns (distances, parents), each an int32 array of shape
+    (len(sources), num_nodes): row i belongs to sources[i].
+    """
+    num_nodes = len(offsets) - 1
+    distances = np.empty((len(sources), num_nodes), dtype=np.int32)
+    parents = np.empty((len(sources), num_nodes), dtype=np.int32)
+    for i, source in enumerate(sources):
+        distances[i], parents[i] = direction_optimizing_bfs(offsets, neighbors, source, directed)
+    return distances, parents
+
+
+def bfs_distances(offsets, neighbors, source):
+    """Hop distance from source to every node, -1 where unreachable."""
+    return direction_optimizing_bfs(offsets, neighbors, source)[0]
+
+
+def connected_component_labels(num_nodes, sources, targets):
+    """Label every node with the smallest node id in its component.
+
+    Each round pulls the smaller label across every edge, then shortcuts
+    label chains by pointer jumping, until no label changes.
+    """
+    labels = np.arange(num_nodes, dtype=np.int64)
+    sources = np.asarray(sources)
+    targets = np.asarray(targets)
+    while True:
+        previous = labels.copy()
+        np.minimum.at(labels, sources, labels[targets])
+        np.minimum.at(labels, targets, labels[sources])
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, previous):
+            return labels
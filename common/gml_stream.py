@@ -0,0 +1,390 @@
+import html
+import math
+import re
+from array import array
+
+import networkx as nx
+import numpy as np
+
+
+# Streaming GML reader/writer shared by all the assignment scripts.
+# nx.read_gml tokenises the whole file before building the graph, which is slow
+# and memory hungry on multi-GB files. Here the file is read line by line and
+# every node/edge block is handed out as soon as its closing bracket is seen,
+# so memory stays bounded by the largest block (plus whatever the caller keeps).
+
+INT64_MIN, INT64_MAX = -(1 << 63), (1 << 63) - 1
+
+_TOKEN = re.compile(
+    r'(?P<string>"[^"]*")'
+    r'|(?P<real>[+-]?(?:\d*\.\d+|\d+\.\d*)(?:[Ee][+-]?\d+)?|[+-]?\d+[Ee][+-]?\d+|[+-]?INF\b|NAN\b)'
+    r'|(?P<int>[+-]?\d+)'
+    r'|(?P<key>[A-Za-z_][0-9A-Za-z_]*)'
+    r'|(?P<open>\[)'
+    r'|(?P<close>\])'
+    r'|(?P<comment>#.*$)'
+    r'|(?P<space>\s+)'
+)
+
+
+def _tokens(filename):
+    with open(filename, encoding='utf-8') as f:
+        pending = ''
+        for lineno, line in enumerate(f, start=1):
+            # A quoted string may run over several lines; wait for its end
+            if pending:
+                line = pending + line
+                pending = ''
+            if line.count('"') % 2 == 1:
+                pending = line
+                continue
+            simple = _simple_tokens(line)
+            if simple is not None:
+                yield from simple
+                continue
+            pos = 0
+            while pos < len(line):
+                match = _TOKEN.match(line, pos)
+                if match is None:
+                    raise nx.NetworkXError(f"cannot tokenize {line[pos:].strip()!r} at line {lineno}")
+                pos = match.end()
+                kind = match.lastgroup
+                if kind == 'string':
+                    yield 'value', html.unescape(match.group()[1:-1])
+                elif kind == 'real':
+                    yield 'value', float(match.group())
+                elif kind == 'int':
+                    yield 'value', int(match.group())
+                elif kind in ('key', 'open', 'close'):
+                    yield kind, match.group()
+        if pending:
+            raise nx.NetworkXError("unterminated string at end of file")
+
+
+# Fast path for the usual one-pair-per-line layout ('key value', 'key [',
+# ']'); anything unusual returns None and goes through the regex tokenizer.
+def _simple_tokens(line):
+    if '#' in line:
+        return None
+    parts = line.split(None, 1)
+    if not parts:
+        return []
+    if len(parts) == 1:
+        return [('close', ']')] if parts[0] == ']' else None
+    key, rest = parts[0], parts[1].strip()
+    if not key.isidentifier():
+        return None
+    if rest == '[':
+        return [('key', key), ('open', '[')]
+    if rest[:1] == '"':
+        if rest[-1] != '"' or rest.count('"') != 2:
+            return None
+        return [('key', key), ('value', html.unescape(rest[1:-1]) if '&' in rest else rest[1:-1])]
+    try:
+        return [('key', key), ('value', int(rest))]
+    except ValueError:
+        if _TOKEN.fullmatch(rest) and _TOKEN.fullmatch(rest).lastgroup == 'real':
+            return [('key', key), ('value', float(rest))]
+    return None
+
+
+def _store(block, key, value):
+    # Repeated keys become lists, as in nx.read_gml
+    if key in block:
+        if not isinstance(block[key], list):
+            block[key] = [block[key]]
+        block[key].append(value)
+    else:
+        block[key] = value
+
+
+def iter_gml(filename):
+    """Yield ('graph', {key: value}), ('node', attrs) and ('edge', attrs) in file order.
+
+    Graph-level attributes come out one at a time; node and edge attributes are
+    plain dicts holding the raw GML keys (id, label, source, target, ...).
+    """
+    stack = []       # [(key, dict)] of the blocks currently open
+    key = None
+    for kind, token in _tokens(filename):
+        if kind == 'key':
+            if key is not None:
+                raise nx.NetworkXError(f"expected a value for {key!r}, found key {token!r}")
+            key = token
+        elif kind == 'open':
+            if key is None:
+                raise nx.NetworkXError("'[' without a key")
+            stack.append((key, {}))
+            key = None
+        elif kind == 'close':
+            if not stack or key is not None:
+                raise nx.NetworkXError("unexpected ']'")
+            block_key, block = stack.pop()
+            if len(stack) == 1 and stack[0][0] == 'graph' and block_key in ('node', 'edge'):
+                yield block_key, block
+            elif len(stack) == 1 and stack[0][0] == 'graph':
+                yield 'graph', {block_key: block}
+            elif stack:
+                _store(stack[-1][1], block_key, block)
+        else:
+            if key is None:
+                raise nx.NetworkXError(f"value {token!r} without a key")
+            if len(stack) == 1 and stack[0][0] == 'graph':
+                yield 'graph', {key: token}
+            elif stack:
+                _store(stack[-1][1], key, token)
+            key = None
+    if stack:
+        raise nx.NetworkXError("unexpected end of file, missing ']'")
+
+
+def read_gml(filename, label='label'):
+    """Build a networkx graph the way nx.read_gml(filename, label) would."""
+    graph_attrs = {}
+    graph = None
+    ids = {}
+
+    def make_graph():
+        directed = graph_attrs.pop('directed', 0) == 1
+        multigraph = graph_attrs.pop('multigraph', 0) == 1
+        cls = {(False, False): nx.Graph, (True, False): nx.DiGraph,
+               (False, True): nx.MultiGraph, (True, True): nx.MultiDiGraph}[directed, multigraph]
+        new_graph = cls()
+        new_graph.graph.update(graph_attrs)
+        return new_graph
+
+    for kind, attrs in iter_gml(filename):
+        if kind == 'graph':
+            if graph is None:
+                for key, value in attrs.items():
+                    _store(graph_attrs, key, value)
+            else:
+                for key, value in attrs.items():
+                    _store(graph.graph, key, value)
+            continue
+        if graph is None:
+            graph = make_graph()
+        if kind == 'node':
+            node_id = attrs.pop('id')
+            node = attrs.pop(label, node_id) if label not in (None, 'id') else node_id
+            ids[node_id] = node
+            graph.add_node(node, **attrs)
+        else:
+            u = ids[attrs.pop('source')]
+            v = ids[attrs.pop('target')]
+            if graph.is_multigraph():
+                graph.add_edge(u, v, key=attrs.pop('key', None), **attrs)
+            else:
+                graph.add_edge(u, v, **attrs)
+
+    return graph if graph is not None else make_graph()
+
+
+# Streaming into compact arrays without building a networkx object. Attribute
+# columns are encoded as they stream (value -> small integer code) so repeated
+# strings such as colours are stored once. Returns a dict with:
+#   labels        list of node labels, index = compact node id
+#   sources       int64 array of edge source ids
+#   targets       int64 array of edge target ids
+#   node_attrs    {name: column} for the requested node attributes
+#   edge_attrs    {name: column} for the requested edge attributes
+#   kinds         {'node': {name: kind}, 'edge': {name: kind}}, kind being
+#                 'int', 'float' or 'category'
+#   graph_attrs   graph-level attributes other than directed/multigraph
+#   directed, multigraph
+#   complete      False when a nested (list/dict) attribute was skipped
+# An 'int' column (only integers that fit int64) or 'float' column (only
+# reals) is a numpy masked array, masked where the value is missing; a NaN in
+# the file is a value, not a missing one. Anything else, including columns
+# that mix ints and reals, is a 'category' column: a (codes int32 array with
+# -1 where missing, categories) pair that keeps every value as parsed.
+# Passing None for node_attributes/edge_attributes keeps every scalar
+# attribute found in the file.
+def read_gml_arrays(filename, edge_attributes=(), node_attributes=(), label='label'):
+    labels = []
+    ids = {}
+    sources = array('q')
+    targets = array('q')
+    node_columns = _Columns(node_attributes, ('id', label))
+    edge_columns = _Columns(edge_attributes, ('source', 'target'))
+    graph_attrs = {}
+
+    for kind, attrs in iter_gml(filename):
+        if kind == 'graph':
+            for key, value in attrs.items():
+                _store(graph_attrs, key, value)
+        elif kind == 'node':
+            ids[attrs['id']] = len(labels)
+            labels.append(attrs.get(label, attrs['id']))
+            node_columns.append(attrs)
+        else:
+            sources.append(ids[attrs['source']])
+            targets.append(ids[attrs['target']])
+            edge_columns.append(attrs)
+
+    node_attrs, node_kinds = node_columns.finish()
+    edge_attrs, edge_kinds = edge_columns.finish()
+    return {
+        'labels': labels,
+        'sources': np.frombuffer(sources, dtype=np.int64) if sources else np.zeros(0, dtype=np.int64),
+        'targets': np.frombuffer(targets, dtype=np.int64) if targets else np.zeros(0, dtype=np.int64),
+        'node_attrs': node_attrs,
+        'edge_attrs': edge_attrs,
+        'kinds': {'node': node_kinds, 'edge': edge_kinds},
+        'graph_attrs': {key: value for key, value in graph_attrs.items() if key not in ('directed', 'multigraph')},
+        'directed': graph_attrs.get('directed') == 1,
+        'multigraph': graph_attrs.get('multigraph') == 1,
+        'complete': node_columns.complete and edge_columns.complete,
+    }
+
+
+# The attribute columns of either nodes or edges. With names=None a column is
+# opened the first time an attribute shows up, back-filled as missing.
+class _Columns:
+    def __init__(self, names, skip):
+        self.discover = names is None
+        self.columns = {} if names is None else {name: _Column() for name in names}
+        self.skip = skip
+        self.rows = 0
+        self.complete = True
+
+    def append(self, attrs):
+        if self.discover:
+            for name, value in attrs.items():
+                if name in self.skip:
+                    continue
+                if isinstance(value, (dict, list)):
+                    self.complete = False
+                elif name not in self.columns:
+                    self.columns[name] = _Column(backfill=self.rows)
+        for name, column in self.columns.items():
+            value = attrs.get(name)
+            column.append(None if isinstance(value, (dict, list)) else value)
+        self.rows += 1
+
+    def finish(self):
+        values = {}
+        kinds = {}
+        for name, column in self.columns.items():
+            values[name], kinds[name] = column.finish()
+        return values, kinds
+
+
+class _Column:
+    def __init__(self, backfill=0):
+        self.codes = array('i', [-1]) * backfill
+        self.lookup = {}
+        self.categories = []
+
+    def append(self, value):
+        if value is None:
+            self.codes.append(-1)
+            return
+        # 3 and 3.0 are different values here, and every NaN is the same one
+        key = (type(value), value if value == value else 'nan')
+        code = self.lookup.get(key)
+        if code is None:
+            code = self.lookup[key] = len(self.categories)
+            self.categories.append(value)
+        self.codes.append(code)
+
+    def finish(self):
+        codes = np.frombuffer(self.codes, dtype=np.int32) if self.codes else np.zeros(0, dtype=np.int32)
+        types = {type(value) for value in self.categories}
+        if types == {int} and all(INT64_MIN <= value <= INT64_MAX for value in self.categories):
+            kind, dtype, fill = 'int', np.int64, 0
+        elif types == {float}:
+            kind, dtype, fill = 'float', np.float64, np.nan
+        else:
+            return (codes, self.categories), 'category'
+        values = np.append(np.array(self.categories, dtype=dtype), np.array([fill], dtype=dtype))
+        return np.ma.MaskedArray(values[codes], mask=codes < 0), kind   # -1 picks the trailing fill
+
+
+def _format_value(value):
+    if hasattr(value, 'item'):
+        value = value.item()     # numpy scalars
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        # Same text as nx.write_gml: upper-case repr, +INF, and a decimal point before any exponent
+        text = repr(value).upper()
+        if math.isinf(value):
+            return '+INF' if value > 0 else '-INF'
+        exponent = text.rfind('E')
+        if exponent != -1 and text.find('.', 0, exponent) == -1:
+            text = text[:exponent] + '.' + text[exponent:]
+        return text
+    text = str(value)
+    escaped = ''.join(c if ' ' <= c <= '~' and c not in '"&' else f'&#{ord(c)};' for c in text)
+    return f'"{escaped}"'
+
+
+def _write_attrs(f, attrs, indent):
+    for key, value in attrs.items():
+        if value is None:
+            continue
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for item in values:
+            if isinstance(item, dict):
+                f.write(f'{indent}{key} [\n')
+                _write_attrs(f, item, indent + '  ')
+                f.write(f'{indent}]\n')
+            else:
+                f.write(f'{indent}{key} {_format_value(item)}\n')
+
+
+def write_gml_stream(filename, nodes, edges, directed=False, multigraph=False, graph_attrs=None):
+    """Write GML from iterables without holding a graph in memory.
+
+    nodes yields (label, attrs) and gets GML ids 0, 1, 2, ... in order.
+    edges yields (source_id, target_id, attrs) using those ids.
+    """
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('graph [\n')
+        if directed:
+            f.write('  directed 1\n')
+        if multigraph:
+            f.write('  multigraph 1\n')
+        _write_attrs(f, graph_attrs or {}, '  ')
+        for node_id, (label, attrs) in enumerate(nodes):
+            f.write(f'  node [\n    id {node_id}\n    label {_format_value(str(label))}\n')
+            _write_attrs(f, attrs or {}, '    ')
+            f.write('  ]\n')
+        for source, target, attrs in edges:
+            f.write(f'  edge [\n    source {source}\n    target {target}\n')
+            _write_attrs(f, attrs or {}, '    ')
+            f.write('  ]\n')
+        f.write(']\n')
+
+
+def write_gml(graph, filename):
+    """Drop-in for nx.write_gml(graph, filename) that streams to disk."""
+    ids = {node: i for i, node in enumerate(graph)}
+    if graph.is_multigraph():
+        edges = ((ids[u], ids[v], {'key': key, **data}) for u, v, key, data in graph.edges(keys=True, data=True))
+    else:
+        edges = ((ids[u], ids[v], data) for u, v, data in graph.edges(data=True))
+    write_gml_stream(filename, graph.nodes(data=True), edges, directed=graph.is_directed(),
+                     multigraph=graph.is_multigraph(), graph_attrs=graph.graph)
+
+
+# Fast path for plain integer graphs (nodes 0..n-1, labelled "0", "1", ...):
+# edge_chunks yields (sources, targets) integer arrays that are formatted a
+# whole chunk at a time. Used by the random graph generator.
+def write_gml_edge_chunks(filename, num_nodes, edge_chunks, chunk_size=1 << 16):
+    edges = 0
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('graph [\n')
+        for start in range(0, num_nodes, chunk_size):
+            f.write(''.join(f'  node [\n    id {i}\n    label "{i}"\n  ]\n'
+                            for i in range(start, min(start + chunk_size, num_nodes))))
+        for sources, targets in edge_chunks:
+            f.write(''.join(f'  edge [\n    source {u}\n    target {v}\n  ]\n'
+                            for u, v in zip(sources.tolist(), targets.tolist())))
+            edges += len(sources)
+        f.write(']\n')
+    return edges
+
@@ -0,0 +1,294 @@
+import hashlib
+import json
+import os
+import shutil
+
+import networkx as nx
+import numpy as np
+
+from common import gml_stream
+
+
+# Binary sidecar cache for GML (and binary edge list) files. The first load parses the GML with
+# gml_stream and saves a '<file>.gml.cache' directory next to it holding:
+#   offsets.npy, neighbors.npy, edge_ids.npy   CSR adjacency (edge_ids maps
+#                                              every CSR slot to its edge)
+#   sources.npy, targets.npy                   the edge list in file order
+#   labels.npy                                 node label table
+#   node_<name>.npy / edge_<name>.npy          numeric attribute columns
+#   node_<name>.mask.npy / edge_<name>...      their missing-value masks
+#   node_<name>.codes.npy / edge_<name>...     encoded string columns
+#   meta.json                                  source fingerprint, categories,
+#                                              graph attributes
+# Later loads memory-map the .npy files, so they start almost instantly and
+# concurrent processes share the same pages. The cache is used while the
+# source keeps its size and mtime, or failing that its SHA-1.
+
+CACHE_VERSION = 2
+
+# Binary edge list: the magic bytes, the node count as int64, then int64
+# (source, target) pairs until the end of the file. Nodes are 0..n-1.
+EDGE_LIST_MAGIC = b'EDGELST1'
+EDGE_LIST_EXTENSION = '.edges'
+
+
+def write_edge_list(filename, num_nodes, edge_chunks):
+    """Stream (sources, targets) array chunks to a binary edge list file."""
+    edges = 0
+    with open(filename, 'wb') as f:
+        f.write(EDGE_LIST_MAGIC)
+        f.write(np.int64(num_nodes).tobytes())
+        for sources, targets in edge_chunks:
+            pairs = np.empty((len(sources), 2), dtype=np.int64)
+            pairs[:, 0] = sources
+            pairs[:, 1] = targets
+            f.write(pairs.tobytes())
+            edges += len(sources)
+    return edges
+
+
+def read_edge_list_arrays(filename):
+    """Memory-map a binary edge list into the read_gml_arrays layout."""
+    with open(filename, 'rb') as f:
+        if f.read(len(EDGE_LIST_MAGIC)) != EDGE_LIST_MAGIC:
+            raise nx.NetworkXError(f"{filename} is not a binary edge list")
+        num_nodes = int(np.frombuffer(f.read(8), dtype=np.int64)[0])
+    header = len(EDGE_LIST_MAGIC) + 8
+    num_edges = (os.path.getsize(filename) - header) // 16
+    if num_edges:
+        pairs = np.memmap(filename, dtype=np.int64, mode='r', offset=header, shape=(num_edges, 2))
+    else:
+        pairs = np.zeros((0, 2), dtype=np.int64)
+    return {
+        'labels': np.arange(num_nodes, dtype=np.int64),
+        'sources': pairs[:, 0],
+        'targets': pairs[:, 1],
+        'node_attrs': {},
+        'edge_attrs': {},
+        'kinds': {'node': {}, 'edge': {}},
+        'graph_attrs': {},
+        'directed': False,
+        'multigraph': False,
+        'complete': True,
+    }
+
+
+def cache_path(filename):
+    return filename + '.cache'
+
+
+def _content_hash(filename):
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _fingerprint(filename):
+    stat = os.stat(filename)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def build_csr(num_nodes, sources, targets, directed):
+    """Return (offsets, neighbors, edge_ids) for the edge list.
+
+    Undirected edges are stored in both directions (self-loops once), so
+    neighbors[offsets[i]:offsets[i + 1]] lists every neighbour of node i.
+    """
+    edge_index = np.arange(len(sources), dtype=np.int64)
+    if directed:
+        src, dst, eid = sources, targets, edge_index
+    else:
+        back = sources != targets
+        src = np.concatenate([sources, targets[back]])
+        dst = np.concatenate([targets, sources[back]])
+        eid = np.concatenate([edge_index, edge_index[back]])
+    order = np.argsort(src, kind='stable')
+    offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=num_nodes), out=offsets[1:])
+    return offsets, dst[order].astype(np.int64), eid[order].astype(np.int64)
+
+
+def _label_array(labels):
+    if isinstance(labels, np.ndarray):
+        return labels
+    if labels and all(isinstance(label, str) for label in labels):
+        return np.array(labels, dtype=str)
+    if all(isinstance(label, int) for label in labels):
+        return np.array(labels, dtype=np.int64)
+    return None
+
+
+def _write_cache(directory, filename, arrays):
+    tmp = f"{directory}.tmp{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    meta = {
+        'version': CACHE_VERSION,
+        'source': _fingerprint(filename),
+        'sha1': _content_hash(filename),
+        'directed': arrays['directed'],
+        'multigraph': arrays['multigraph'],
+        'complete': arrays['complete'],
+        'graph_attrs': arrays['graph_attrs'],
+        'kinds': arrays['kinds'],
+        'categories': {'node': {}, 'edge': {}},
+    }
+
+    for name in ('offsets', 'neighbors', 'edge_ids', 'sources', 'targets'):
+        np.save(os.path.join(tmp, f'{name}.npy'), arrays[name])
+    labels = _label_array(arrays['labels'])
+    if labels is None:
+        meta['labels'] = list(arrays['labels'])
+    else:
+        np.save(os.path.join(tmp, 'labels.npy'), labels)
+
+    for owner in ('node', 'edge'):
+        for name, column in arrays[f'{owner}_attrs'].items():
+            if arrays['kinds'][owner][name] == 'category':
+                codes, categories = column
+                np.save(os.path.join(tmp, f'{owner}_{name}.codes.npy'), codes)
+                meta['categories'][owner][name] = categories
+            else:
+                np.save(os.path.join(tmp, f'{owner}_{name}.npy'), np.ma.getdata(column))
+                np.save(os.path.join(tmp, f'{owner}_{name}.mask.npy'), np.ma.getmaskarray(column))
+
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp, directory)
+
+
+def _read_meta(directory, filename):
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != CACHE_VERSION:
+        return None
+
+    fingerprint = _fingerprint(filename)
+    if meta['source'] == fingerprint:
+        return meta
+    # Touched but maybe not changed (e.g. a fresh checkout): compare content
+    if meta['source']['size'] == fingerprint['size'] and meta['sha1'] == _content_hash(filename):
+        meta['source'] = fingerprint
+        try:
+            with open(os.path.join(directory, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+        except OSError:
+            pass
+        return meta
+    return None
+
+
+def _open_cache(directory, meta):
+    def load(name):
+        return np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+
+    arrays = {name: load(name) for name in ('offsets', 'neighbors', 'edge_ids', 'sources', 'targets')}
+    arrays['labels'] = meta['labels'] if 'labels' in meta else load('labels')
+    for owner in ('node', 'edge'):
+        columns = {}
+        for name, kind in meta['kinds'][owner].items():
+            if kind == 'category':
+                columns[name] = (load(f'{owner}_{name}.codes'), meta['categories'][owner][name])
+            else:
+                columns[name] = np.ma.MaskedArray(load(f'{owner}_{name}'), mask=load(f'{owner}_{name}.mask'),
+                                                  copy=False)
+        arrays[f'{owner}_attrs'] = columns
+    for key in ('kinds', 'graph_attrs', 'directed', 'multigraph', 'complete'):
+        arrays[key] = meta[key]
+    return arrays
+
+
+def load_graph_arrays(filename, use_cache=True):
+    """Arrays for a GML or binary edge list file plus CSR adjacency.
+
+    The layout is the one of gml_stream.read_gml_arrays. Served memory-mapped
+    from the sidecar cache when it is current; otherwise the file is parsed and
+    the cache (re)written. A read-only directory just means nothing gets cached.
+    """
+    directory = cache_path(filename)
+    if use_cache:
+        meta = _read_meta(directory, filename)
+        if meta is not None:
+            return _open_cache(directory, meta)
+
+    if filename.endswith(EDGE_LIST_EXTENSION):
+        arrays = read_edge_list_arrays(filename)
+    else:
+        arrays = gml_stream.read_gml_arrays(filename, edge_attributes=None, node_attributes=None)
+    arrays['offsets'], arrays['neighbors'], arrays['edge_ids'] = build_csr(
+        len(arrays['labels']), arrays['sources'], arrays['targets'], arrays['directed'])
+    if use_cache:
+        try:
+            _write_cache(directory, filename, arrays)
+        except OSError:
+            pass
+    return arrays
+
+
+# Python values of a column, None where missing
+def column_values(column, kind):
+    if kind == 'category':
+        codes, categories = column
+        return [categories[code] if code >= 0 else None for code in codes.tolist()]
+    values = np.ma.getdata(column).tolist()
+    return [None if missing else value for value, missing in zip(values, np.ma.getmaskarray(column).tolist())]
+
+
+# Column as a float64 array with NaN where missing, for numeric use
+def column_array(column, kind):
+    if kind == 'category':
+        codes, categories = column
+        if not all(isinstance(value, (int, float)) for value in categories):
+            raise ValueError("column is not numeric")
+        return np.append(np.array(categories, dtype=np.float64), np.nan)[codes]
+    return np.ma.filled(column.astype(np.float64), np.nan)
+
+
+def graph_from_arrays(arrays):
+    cls = {(False, False): nx.Graph, (True, False): nx.DiGraph,
+           (False, True): nx.MultiGraph, (True, True): nx.MultiDiGraph}[arrays['directed'], arrays['multigraph']]
+    graph = cls()
+    graph.graph.update(arrays['graph_attrs'])
+
+    labels = arrays['labels']
+    labels = labels.tolist() if hasattr(labels, 'tolist') else list(labels)
+    node_columns = [(name, column_values(column, arrays['kinds']['node'][name]))
+                    for name, column in arrays['node_attrs'].items()]
+    graph.add_nodes_from(
+        (label, {name: values[i] for name, values in node_columns if values[i] is not None})
+        for i, label in enumerate(labels))
+
+    edge_columns = [(name, column_values(column, arrays['kinds']['edge'][name]))
+                    for name, column in arrays['edge_attrs'].items()]
+    edges = ((labels[u], labels[v], {name: values[i] for name, values in edge_columns if values[i] is not None})
+             for i, (u, v) in enumerate(zip(arrays['sources'].tolist(), arrays['targets'].tolist())))
+    if graph.is_multigraph():
+        graph.add_edges_from((u, v, attrs.pop('key', None), attrs) for u, v, attrs in edges)
+    else:
+        graph.add_edges_from(edges)
+    return graph
+
+
+def read_graph_and_arrays(filename, use_cache=True):
+    """read_graph(filename) together with the load_graph_arrays it was built from."""
+    arrays = load_graph_arrays(filename, use_cache)
+    if not arrays['complete']:
+        return gml_stream.read_gml(filename), arrays
+    return graph_from_arrays(arrays), arrays
+
+
+def read_graph(filename, use_cache=True):
+    """Same graph as gml_stream.read_gml(filename), built from the cache when possible.
+
+    Files with nested attributes (lists or blocks) can't be cached column-wise
+    and are always parsed from GML.
+    """
+    return read_graph_and_arrays(filename, use_cache)[0]
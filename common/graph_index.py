@@ -0,0 +1,135 @@
+from functools import cached_property
+
+import numpy as np
+
+from common import graph_cache, metrics
+
+
+# Index arrays of one graph, shared by every analysis of a graph_analysis run.
+# Each array is built the first time an analysis asks for it and then reused,
+# so node ids, degrees, the CSR adjacency and the attribute columns are
+# computed once per graph instead of once per analysis. Given the
+# graph_cache arrays the graph was read from, the index takes its edge list,
+# CSR adjacency and attribute columns from them (memory-mapped when cached)
+# instead of walking the networkx graph. Build a new index, without arrays,
+# after the graph changes (e.g. after --components removed edges).
+
+def color_signs(arrays):
+    """Edge signs of the graph_analysis scripts from the arrays' edge colours: -1 for 'r', else +1."""
+    signs = np.ones(len(arrays['sources']), dtype=np.int64)
+    if 'color' in arrays['edge_attrs']:
+        colors = arrays['edge_attrs']['color']
+        if arrays['kinds']['edge']['color'] == 'category':
+            codes, categories = colors
+            if 'r' in categories:
+                signs[np.asarray(codes) == categories.index('r')] = -1
+    return signs
+
+
+class GraphIndex:
+    """Arrays for a networkx graph: nodes are 0..n-1 in graph.nodes() order,
+    edges follow graph.edges() order, or the file order with arrays.
+
+    arrays are the graph_cache.load_graph_arrays of the file the graph was
+    read from, and signs the sign of every one of their edges (default:
+    each edge's 'sign' attribute, or +1).
+    """
+
+    def __init__(self, graph, arrays=None, signs=None):
+        self.graph = graph
+        self.arrays = arrays
+        self._node_columns = {}
+        self._signs = signs
+
+    @cached_property
+    def nodes(self):
+        if self.arrays is not None:
+            labels = self.arrays['labels']
+            return labels.tolist() if hasattr(labels, 'tolist') else list(labels)
+        return list(self.graph.nodes())
+
+    @cached_property
+    def ids(self):
+        """label -> node id"""
+        return {node: i for i, node in enumerate(self.nodes)}
+
+    @property
+    def num_nodes(self):
+        return len(self.nodes)
+
+    @cached_property
+    def _edges(self):
+        if self.arrays is not None:
+            signs = np.ones(len(self.arrays['sources']), dtype=np.int64) if self._signs is None else self._signs
+            return self.arrays['sources'], self.arrays['targets'], np.asarray(signs, dtype=np.int64)
+        ids = self.ids
+        rows = [(ids[u], ids[v], data.get('sign', 1)) for u, v, data in self.graph.edges(data=True)]
+        rows = np.array(rows, dtype=np.int64).reshape(-1, 3)
+        signs = rows[:, 2] if self._signs is None else np.asarray(self._signs, dtype=np.int64)
+        return rows[:, 0], rows[:, 1], signs
+
+    @property
+    def sources(self):
+        return self._edges[0]
+
+    @property
+    def targets(self):
+        return self._edges[1]
+
+    @property
+    def signs(self):
+        return self._edges[2]
+
+    @cached_property
+    def degrees(self):
+        return metrics.degree_array(self.num_nodes, self.sources, self.targets)
+
+    @cached_property
+    def _csr(self):
+        if self.arrays is not None:
+            return self.arrays['offsets'], self.arrays['neighbors'], self.arrays['edge_ids']
+        return graph_cache.build_csr(self.num_nodes, self.sources, self.targets, self.graph.is_directed())
+
+    @property
+    def offsets(self):
+        return self._csr[0]
+
+    @property
+    def neighbors(self):
+        return self._csr[1]
+
+    @property
+    def edge_ids(self):
+        """Edge of every CSR slot"""
+        return self._csr[2]
+
+    @cached_property
+    def undirected_csr(self):
+        """(offsets, neighbors, edge_ids) with both directions of every edge, also for a directed graph."""
+        if not self.graph.is_directed():
+            return self._csr
+        return graph_cache.build_csr(self.num_nodes, self.sources, self.targets, directed=False)
+
+    def node_values(self, attribute):
+        """Attribute value of every node, None where it is missing."""
+        if attribute not in self._node_columns:
+            if self.arrays is not None:
+                columns = self.arrays['node_attrs']
+                self._node_columns[attribute] = (
+                    graph_cache.column_values(columns[attribute], self.arrays['kinds']['node'][attribute])
+                    if attribute in columns else [None] * self.num_nodes)
+            else:
+                self._node_columns[attribute] = [value for _, value in self.graph.nodes(data=attribute)]
+        return self._node_columns[attribute]
+
+    def node_codes(self, attribute):
+        """(codes, categories): codes[i] indexes categories, -1 where missing."""
+        values = self.node_values(attribute)
+        categories = sorted({value for value in values if value is not None}, key=str)
+        lookup = {value: i for i, value in enumerate(categories)}
+        codes = np.array([lookup.get(value, -1) for value in values], dtype=np.int64)
+        return codes, categories
+
+    def node_colors(self, attribute='color'):
+        """{label: value} for the nodes that have the attribute."""
+        return {node: value for node, value in zip(self.nodes, self.node_values(attribute)) if value is not None}
@@ -0,0 +1,128 @@
+import math
+from multiprocessing import Pool
+
+import numpy as np
+
+from common import graph_cache
+
+
+# Homophily test for the graph_analysis scripts. Node colours become small
+# integer codes and edges index arrays, so counting same-colour edges is one
+# vectorised comparison. Significance comes from shuffling the colours over the
+# nodes: the p-value is the share of shuffles with at least as many
+# same-colour edges as observed, and the shuffles are spread over a Pool.
+
+SIGNIFICANCE = 0.05
+BATCH_SIZE = 50   # permutations per pool task
+
+
+def read_colors(filename, attribute='color'):
+    """{node label: colour} from the node attribute of a graph file."""
+    arrays = graph_cache.load_graph_arrays(filename)
+    if attribute not in arrays['node_attrs']:
+        return {}
+    values = graph_cache.column_values(arrays['node_attrs'][attribute], arrays['kinds']['node'][attribute])
+    labels = arrays['labels']
+    labels = labels.tolist() if hasattr(labels, 'tolist') else list(labels)
+    return {label: value for label, value in zip(labels, values) if value is not None}
+
+
+def color_arrays(nodes, sources, targets, colors):
+    """Restrict an index graph to its coloured nodes.
+
+    Returns (codes, sources, targets, categories): codes[i] is the colour code
+    of the i-th coloured node and the edges, renumbered to match, keep only
+    the ones whose endpoints both have a colour.
+    """
+    categories = sorted({color for color in colors.values()}, key=str)
+    lookup = {color: i for i, color in enumerate(categories)}
+    codes = np.array([lookup.get(colors.get(node), -1) for node in nodes], dtype=np.int64)
+    colored = codes >= 0
+    renumber = np.cumsum(colored) - 1
+    keep = colored[sources] & colored[targets]
+    dtype = np.int8 if len(categories) < 128 else np.int32
+    return codes[colored].astype(dtype), renumber[sources[keep]], renumber[targets[keep]], categories
+
+
+def same_color_count(codes, sources, targets):
+    return int(np.count_nonzero(codes[sources] == codes[targets]))
+
+
+def expected_same_fraction(codes, sources, targets):
+    """Exact expected share of same-colour edges when colours are shuffled.
+
+    Two distinct nodes get the same colour with probability
+    sum c_i (c_i - 1) / (N (N - 1)) for colour counts c_i over N nodes;
+    a self-loop is always same-colour.
+    """
+    if len(sources) == 0:
+        return 0.0
+    counts = np.bincount(codes).astype(float)
+    total = counts.sum()
+    pair = (counts * (counts - 1)).sum() / (total * (total - 1)) if total > 1 else 1.0
+    loops = np.count_nonzero(sources == targets)
+    return float((loops + (len(sources) - loops) * pair) / len(sources))
+
+
+# Worker side of the pool: the arrays are handed over once per worker through
+# the initializer, tasks only carry a seed and a number of shuffles
+_SHARED = {}
+
+
+def _init_worker(codes, sources, targets):
+    _SHARED['arrays'] = (codes, sources, targets)
+
+
+def _permutation_batch(job):
+    seed, count, observed = job
+    codes, sources, targets = _SHARED['arrays']
+    rng = np.random.default_rng(seed)
+    hits = 0
+    for _ in range(count):
+        shuffled = rng.permutation(codes)
+        hits += np.count_nonzero(shuffled[sources] == shuffled[targets]) >= observed
+    return hits
+
+
+def permutation_p_value(codes, sources, targets, observed, permutations=1000, processes=1, seed=None):
+    """One-sided p-value of `observed` same-colour edges under colour shuffling."""
+    # Edges sorted by source make the colour lookups mostly sequential
+    order = np.argsort(sources, kind='stable')
+    index = np.int32 if len(codes) < 2 ** 31 else np.int64
+    sources, targets = sources[order].astype(index), targets[order].astype(index)
+
+    batches = [BATCH_SIZE] * (permutations // BATCH_SIZE)
+    if permutations % BATCH_SIZE:
+        batches.append(permutations % BATCH_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(batches))
+    jobs = [(seeds[i], count, observed) for i, count in enumerate(batches)]
+    if processes and processes > 1 and len(jobs) > 1:
+        with Pool(min(processes, len(jobs)), _init_worker, (codes, sources, targets)) as pool:
+            hits = sum(pool.imap_unordered(_permutation_batch, jobs))
+    else:
+        _init_worker(codes, sources, targets)
+        hits = sum(_permutation_batch(job) for job in jobs)
+    return (int(hits) + 1) / (permutations + 1)
+
+
+def homophily_test(nodes, sources, targets, colors, permutations=1000, processes=1, seed=None):
+    """Same/different-colour edge counts, their expected share and a permutation p-value.
+
+    Returns a dict with 'same', 'different', 'fraction', 'expected',
+    'p_value' (None without permutations) and 'categories'. Nodes without a
+    colour and their edges are left out.
+    """
+    codes, sources, targets, categories = color_arrays(
+        nodes, np.asarray(sources, dtype=np.int64), np.asarray(targets, dtype=np.int64), colors)
+    same = same_color_count(codes, sources, targets)
+    result = {
+        'same': same,
+        'different': len(sources) - same,
+        'fraction': same / len(sources) if len(sources) else math.nan,
+        'expected': expected_same_fraction(codes, sources, targets),
+        'p_value': None,
+        'categories': categories,
+    }
+    if permutations and len(sources):
+        result['p_value'] = permutation_p_value(codes, sources, targets, same, permutations, processes, seed)
+    return result
@@ -0,0 +1,212 @@
+import hashlib
+import math
+import os
+
+import networkx as nx
+import numpy as np
+
+from common import graph_cache
+
+
+# Node layouts for the graph_analysis plots. Positions are stored in a cache
+# directory under a hash of the graph's nodes and edges, so every plot of the
+# same graph (C, N or P, this run or a later one) draws on the same picture and
+# only the first one pays for it. The directory is trimmed back to
+# CACHE_LIMIT bytes by dropping the least recently used layouts.
+# Small graphs keep nx.spring_layout (with a fixed seed); larger ones use a
+# multilevel force-directed layout whose repulsion is summed on a particle
+# mesh by FFT, so an iteration costs O(n + mesh log mesh) instead of O(n^2).
+
+CACHE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'graph_analysis', 'layouts')
+CACHE_LIMIT = 256 * 1024 * 1024
+SPRING_LIMIT = 1000     # nodes up to which nx.spring_layout is used
+EXACT_LIMIT = 1000      # nodes up to which repulsion is summed over all pairs
+COARSEST = 50           # multilevel coarsening stops at this many nodes
+SEED = 42
+MESH_LIMIT = 1024       # largest particle mesh, cells per side
+
+
+def graph_key(nodes, sources, targets):
+    """Content hash of a graph given as node list and index edge arrays."""
+    digest = hashlib.sha1()
+    digest.update(repr(list(nodes)).encode())
+    digest.update(np.ascontiguousarray(sources, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(targets, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def _repulsion_exact(xy, k):
+    delta = xy[:, None, :] - xy[None, :, :]
+    dist2 = np.maximum((delta ** 2).sum(axis=2), 1e-12)
+    return (delta * (k * k / dist2)[:, :, None]).sum(axis=1)
+
+
+# FFT of the unit repulsion kernel r / |r|^2 on a (2 * grid)^2 mesh, indexed
+# by cell offset with negative offsets wrapped around
+_KERNELS = {}
+
+
+def _mesh_kernel(grid):
+    if grid not in _KERNELS:
+        size = 2 * grid
+        offset = np.fft.fftfreq(size) * size
+        dx, dy = np.meshgrid(offset, offset, indexing='ij')
+        dist2 = dx ** 2 + dy ** 2
+        dist2[0, 0] = np.inf
+        _KERNELS[grid] = (np.fft.rfft2(dx / dist2), np.fft.rfft2(dy / dist2))
+    return _KERNELS[grid]
+
+
+def _repulsion_mesh(xy, k):
+    """Approximate all-pairs repulsion by particle-mesh summation.
+
+    Nodes are spread onto a grid x grid mesh (cloud-in-cell), the mesh is
+    convolved with the repulsion kernel by FFT, and the field is read back at
+    every node with the same weights. Cost is O(n + grid^2 log grid) instead of
+    O(n^2); pairs closer than one cell repel less than exactly.
+    """
+    n = len(xy)
+    grid = min(MESH_LIMIT, 1 << max(2, math.ceil(math.log2(math.sqrt(n)))))
+    low = xy.min(axis=0)
+    spacing = max(float((xy.max(axis=0) - low).max()), 1e-12) / (grid - 1)
+    scaled = (xy - low) / spacing
+    corner = np.minimum(scaled.astype(np.int64), grid - 2)
+    frac = scaled - corner
+
+    cells, weights = [], []
+    for di in (0, 1):
+        for dj in (0, 1):
+            cells.append((corner[:, 0] + di) * grid + corner[:, 1] + dj)
+            weights.append((frac[:, 0] if di else 1 - frac[:, 0]) * (frac[:, 1] if dj else 1 - frac[:, 1]))
+    mass = sum(np.bincount(c, w, grid * grid) for c, w in zip(cells, weights)).reshape(grid, grid)
+
+    size = 2 * grid
+    spectrum = np.fft.rfft2(mass, s=(size, size))
+    force = np.zeros_like(xy)
+    for axis, kernel in enumerate(_mesh_kernel(grid)):
+        field = np.fft.irfft2(spectrum * kernel, s=(size, size))[:grid, :grid].ravel()
+        force[:, axis] = sum(field[c] * w for c, w in zip(cells, weights))
+    return force * (k * k / spacing)
+
+
+# Fruchterman-Reingold steps as in nx.spring_layout: attraction d^2 / k along
+# edges, repulsion k^2 / d between all nodes, moves capped by a cooling step
+def _force_steps(xy, sources, targets, iterations, step):
+    n = len(xy)
+    k = 1 / math.sqrt(n)
+    cooling = step / (iterations + 1)
+    for _ in range(iterations):
+        force = _repulsion_exact(xy, k) if n <= EXACT_LIMIT else _repulsion_mesh(xy, k)
+        delta = xy[sources] - xy[targets]
+        pull = delta * (np.sqrt((delta ** 2).sum(axis=1)) / k)[:, None]
+        for axis in (0, 1):
+            force[:, axis] -= np.bincount(sources, pull[:, axis], n)
+            force[:, axis] += np.bincount(targets, pull[:, axis], n)
+        length = np.maximum(np.sqrt((force ** 2).sum(axis=1)), 1e-12)
+        xy += force * (np.minimum(length, step) / length)[:, None]
+        step -= cooling
+    return xy
+
+
+# Merge every node into the highest-priority node of its closed neighbourhood.
+# Returns the coarse node count, its edges and the group of every fine node.
+def _coarsen(num_nodes, sources, targets, rng):
+    priority = rng.permutation(num_nodes)
+    offsets, neighbors, _ = graph_cache.build_csr(num_nodes, sources, targets, False)
+    best = priority.copy()
+    rows = np.flatnonzero(np.diff(offsets) > 0)
+    if len(rows):
+        best[rows] = np.maximum(best[rows], np.maximum.reduceat(priority[neighbors], offsets[rows]))
+    by_priority = np.argsort(priority)
+    groups, group_of = np.unique(by_priority[best], return_inverse=True)
+
+    coarse_sources, coarse_targets = group_of[sources], group_of[targets]
+    keep = coarse_sources != coarse_targets
+    keys = np.unique(np.minimum(coarse_sources, coarse_targets)[keep] * len(groups) +
+                     np.maximum(coarse_sources, coarse_targets)[keep])
+    return len(groups), keys // len(groups), keys % len(groups), group_of
+
+
+def multilevel_layout(num_nodes, sources, targets, seed=SEED, iterations=50, coarsest=COARSEST):
+    """Force-directed layout of an index graph; returns an (n, 2) array in [-1, 1].
+
+    The graph is coarsened until at most `coarsest` nodes are left (or it stops
+    shrinking), the coarsest graph is laid out from random positions, and each
+    finer level starts from its group's position and is refined with a
+    shorter, cooler run.
+    """
+    rng = np.random.default_rng(seed)
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    keep = sources != targets
+    levels = [(num_nodes, sources[keep], targets[keep], None)]
+    while levels[-1][0] > coarsest:
+        n, level_sources, level_targets, _ = levels[-1]
+        coarse = _coarsen(n, level_sources, level_targets, rng)
+        if coarse[0] > 0.8 * n:
+            break
+        levels[-1] = levels[-1][:3] + (coarse[3],)
+        levels.append(coarse[:3] + (None,))
+
+    n, level_sources, level_targets, _ = levels[-1]
+    xy = _force_steps(rng.random((n, 2)), level_sources, level_targets, iterations, 0.1)
+    for n, level_sources, level_targets, group_of in reversed(levels[:-1]):
+        k = 1 / math.sqrt(n)
+        xy = xy[group_of] + rng.normal(scale=k, size=(n, 2))
+        xy = _force_steps(xy, level_sources, level_targets, max(10, iterations // 2), 3 * k)
+
+    if num_nodes:
+        xy -= xy.mean(axis=0)
+        xy /= max(np.abs(xy).max(), 1e-12)
+    return xy
+
+
+def _trim_cache(directory, limit):
+    entries = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.endswith('.npy') and os.path.isfile(path):
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        os.remove(path)
+        total -= size
+
+
+def graph_layout(graph, directory=CACHE_DIRECTORY, limit=CACHE_LIMIT):
+    """{node: (x, y)} for the graph, from the layout cache when it has been seen before.
+
+    directory=None disables the cache.
+    """
+    nodes = list(graph.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = np.array([(index[u], index[v]) for u, v in graph.edges()], dtype=np.int64).reshape(-1, 2)
+    path = None
+    if directory:
+        path = os.path.join(directory, graph_key(nodes, edges[:, 0], edges[:, 1]) + '.npy')
+        try:
+            xy = np.load(path)
+            os.utime(path)
+            return dict(zip(nodes, xy))
+        except (OSError, ValueError):
+            pass
+
+    if len(nodes) <= SPRING_LIMIT:
+        pos = nx.spring_layout(graph, seed=SEED)
+        xy = np.array([pos[node] for node in nodes], dtype=float).reshape(-1, 2)
+    else:
+        xy = multilevel_layout(len(nodes), edges[:, 0], edges[:, 1])
+
+    if path:
+        try:
+            os.makedirs(directory, exist_ok=True)
+            tmp = f"{path}.tmp{os.getpid()}.npy"
+            np.save(tmp, xy)
+            os.replace(tmp, path)
+            _trim_cache(directory, limit)
+        except OSError:
+            pass
+    return dict(zip(nodes, xy))
@@ -0,0 +1,662 @@
+import copy
+import os
+import warnings
+from functools import cached_property
+
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import maximum_bipartite_matching, min_weight_full_bipartite_matching
+
+from common import graph_cache
+
+
+# Market-clearing auction shared by market_strategy.py and the analysis server.
+# Sellers have bipartite 0 and a starting price, buyers bipartite 1; every
+# edge carries the buyer's valuation of the seller. Each round every buyer
+# prefers the sellers with the best payoff (valuation - price); while the
+# preferred sellers admit no perfect matching, the price of every seller in
+# the constricted sets of the unmatched buyers goes up by 1. Markets are held
+# as arrays (Market), so large ones never need a networkx graph, and the
+# round state lives in AuctionState as index arrays updated in place.
+
+def sellers(graph):
+    return [n for n, d in graph.nodes(data=True) if d['bipartite'] == 0]
+
+
+def buyers(graph):
+    return [n for n, d in graph.nodes(data=True) if d['bipartite'] == 1]
+
+
+def initial_prices(graph):
+    return {node: graph.nodes[node].get('price', 0) for node in graph if graph.nodes[node]['bipartite'] == 0}
+
+
+def _positions(offsets, rows):
+    """Positions offsets[r]..offsets[r + 1] of all given rows of a CSR layout."""
+    counts = offsets[rows + 1] - offsets[rows]
+    return np.repeat(offsets[rows] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+
+def _integral(values):
+    """values as int64 when they are all whole numbers, so prices print like the GML ones."""
+    values = np.asarray(values)
+    if values.dtype.kind == 'f' and np.array_equal(values, np.round(values)):
+        return values.astype(np.int64)
+    return values
+
+
+# Flat market files: one bid per line, "seller buyer valuation" separated by
+# commas (.csv) or whitespace, with numeric seller and buyer ids and '#'
+# comments. Sellers and buyers are separate id ranges; starting prices are 0.
+FLAT_EXTENSIONS = ('.csv', '.tsv', '.txt')
+BID_CHUNK = 1 << 18   # lines parsed at a time
+
+
+def _read_bids(filename):
+    """(n, 3) array of a flat market file, parsed in chunks to bound the parser's memory."""
+    chunks = []
+    with open(filename) as f, warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)   # loadtxt warns about the empty read at the end
+        while True:
+            chunk = np.loadtxt(f, delimiter=',' if filename.endswith('.csv') else None, comments='#',
+                               ndmin=2, max_rows=BID_CHUNK)
+            chunks.append(chunk.reshape(-1, 3))
+            if len(chunk) < BID_CHUNK:
+                return np.concatenate(chunks)
+
+
+class Market:
+    """A market as arrays: seller and buyer labels, starting prices, and one entry per bid.
+
+    Bids keep their file (or graph.edges()) order in edge_sellers,
+    edge_buyers and valuations. Buyers are numbered by their first bid and
+    buyers without bids are left out, as they take no part in the auction.
+    """
+
+    def __init__(self, sellers, buyers, prices, edge_sellers, edge_buyers, valuations):
+        self.sellers = sellers
+        self.buyers = buyers
+        self.prices = _integral(prices)
+        self.edge_sellers = edge_sellers
+        self.edge_buyers = edge_buyers
+        self.valuations = _integral(valuations)
+
+    @classmethod
+    def _from_edges(cls, seller_labels, prices, edge_sellers, buyer_nodes, buyer_labels, valuations):
+        # Number buyers by their first bid; buyer_labels maps node ids to labels (None: the ids are the labels)
+        nodes, first, edge_buyers = np.unique(buyer_nodes, return_index=True, return_inverse=True)
+        order = np.argsort(first, kind='stable')
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        buyers = nodes[order].tolist()
+        if buyer_labels is not None:
+            buyers = [buyer_labels[node] for node in buyers]
+        return cls(seller_labels, buyers, prices, np.asarray(edge_sellers, dtype=np.int64),
+                   rank[edge_buyers.reshape(-1)], np.asarray(valuations))
+
+    @classmethod
+    def from_graph(cls, graph, prices=None):
+        """Market of a bipartite networkx graph, with its own or the given starting prices."""
+        seller_list = sellers(graph)
+        prices = initial_prices(graph) if prices is None else prices
+        seller_ids = {node: i for i, node in enumerate(seller_list)}
+        buyer_list = buyers(graph)
+        buyer_ids = {node: i for i, node in enumerate(buyer_list)}
+        bids = [(seller_ids[u], buyer_ids[v], valuation) if u in seller_ids else
+                (seller_ids[v], buyer_ids[u], valuation) for u, v, valuation in graph.edges(data='valuation')]
+        bids = np.array(bids, dtype=float).reshape(-1, 3)
+        return cls._from_edges(seller_list, [prices[node] for node in seller_list], bids[:, 0].astype(np.int64),
+                               bids[:, 1].astype(np.int64), buyer_list, bids[:, 2])
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Market of a graph in the graph_cache array layout, without building the graph."""
+        labels = arrays['labels']
+        labels = labels.tolist() if hasattr(labels, 'tolist') else list(labels)
+        if 'bipartite' not in arrays['node_attrs'] or 'valuation' not in arrays['edge_attrs']:
+            raise ValueError("a market needs a 'bipartite' node and a 'valuation' edge attribute")
+        kinds = arrays['kinds']
+        side = graph_cache.column_array(arrays['node_attrs']['bipartite'], kinds['node']['bipartite'])
+        start = (graph_cache.column_array(arrays['node_attrs']['price'], kinds['node']['price'])
+                 if 'price' in arrays['node_attrs'] else np.zeros(len(side)))
+        seller_nodes = np.flatnonzero(side == 0)
+        seller_ids = np.full(len(side), -1, dtype=np.int64)
+        seller_ids[seller_nodes] = np.arange(len(seller_nodes))
+
+        sources = np.asarray(arrays['sources'], dtype=np.int64)
+        targets = np.asarray(arrays['targets'], dtype=np.int64)
+        flipped = side[sources] != 0
+        edge_sellers = np.where(flipped, targets, sources)
+        buyer_nodes = np.where(flipped, sources, targets)
+        return cls._from_edges([labels[node] for node in seller_nodes.tolist()],
+                               np.nan_to_num(start[seller_nodes]), seller_ids[edge_sellers],
+                               buyer_nodes, labels,
+                               graph_cache.column_array(arrays['edge_attrs']['valuation'], kinds['edge']['valuation']))
+
+    @classmethod
+    def read(cls, filename):
+        """Market from a GML file (through the graph cache) or a flat bid file."""
+        if os.path.splitext(filename)[1] in FLAT_EXTENSIONS:
+            bids = _read_bids(filename)
+            seller_ids, edge_sellers = np.unique(_integral(bids[:, 0]), return_inverse=True)
+            return cls._from_edges(seller_ids.tolist(), np.zeros(len(seller_ids)), edge_sellers.reshape(-1),
+                                   _integral(bids[:, 1]), None, bids[:, 2])
+        arrays = graph_cache.load_graph_arrays(filename)
+        if not arrays['complete']:
+            return cls.from_graph(graph_cache.read_graph(filename))
+        return cls.from_arrays(arrays)
+
+    @property
+    def num_sellers(self):
+        return len(self.sellers)
+
+    @property
+    def num_buyers(self):
+        return len(self.buyers)
+
+    # Bids grouped by buyer and by seller (file order within a group): the
+    # CSR layout of the buyer x seller valuation matrix and of its transpose
+    @cached_property
+    def by_buyer(self):
+        return np.argsort(self.edge_buyers, kind='stable')
+
+    @cached_property
+    def buyer_offsets(self):
+        return np.r_[0, np.cumsum(np.bincount(self.edge_buyers, minlength=self.num_buyers))]
+
+    @cached_property
+    def by_seller(self):
+        return np.argsort(self.edge_sellers, kind='stable')
+
+    @cached_property
+    def seller_offsets(self):
+        return np.r_[0, np.cumsum(np.bincount(self.edge_sellers, minlength=self.num_sellers))]
+
+    def with_prices(self, prices):
+        """The same market with the given {seller: price} as starting prices; the bid arrays are shared."""
+        missing = [seller for seller in self.sellers if seller not in prices]
+        if missing:
+            raise ValueError(f"no price given for seller {missing[0]!r}")
+        market = copy.copy(self)
+        market.prices = _integral([prices[seller] for seller in self.sellers])
+        return market
+
+    def price_dict(self, prices=None):
+        """{seller: price} for a price vector (default: the starting prices)."""
+        prices = self.prices if prices is None else prices
+        return dict(zip(self.sellers, prices.tolist()))
+
+    def payoff_labels(self, prices=None):
+        """{buyer: "[payoff, ...]"} over the buyer's bids in file order, for the plots.
+
+        prices is a price vector or {seller: price} (default: the starting prices).
+        """
+        if prices is None:
+            prices = self.prices
+        elif isinstance(prices, dict):
+            prices = np.array([prices[seller] for seller in self.sellers])
+        payoffs = (self.valuations - prices[self.edge_sellers])[self.by_buyer].tolist()
+        offsets = self.buyer_offsets.tolist()
+        return {buyer: f"[{', '.join(str(p) for p in payoffs[offsets[i]:offsets[i + 1]])}]"
+                for i, buyer in enumerate(self.buyers)}
+
+    @cached_property
+    def node_keys(self):
+        """({seller: node}, {buyer: node}) of the to_graph nodes.
+
+        Nodes are the labels as strings, or s<label> and b<label> when a
+        seller and a buyer share a label, as the ids of a flat file do.
+        """
+        seller_keys = [str(seller) for seller in self.sellers]
+        buyer_keys = [str(buyer) for buyer in self.buyers]
+        if not set(seller_keys).isdisjoint(buyer_keys):
+            seller_keys = [f"s{key}" for key in seller_keys]
+            buyer_keys = [f"b{key}" for key in buyer_keys]
+        return dict(zip(self.sellers, seller_keys)), dict(zip(self.buyers, buyer_keys))
+
+    def to_graph(self):
+        """networkx graph of the market on the node_keys, for plotting."""
+        seller_keys, buyer_keys = self.node_keys
+        sellers = [seller_keys[seller] for seller in self.sellers]
+        buyers = [buyer_keys[buyer] for buyer in self.buyers]
+        graph = nx.Graph()
+        graph.add_nodes_from((seller, {'bipartite': 0, 'price': price})
+                             for seller, price in zip(sellers, self.prices.tolist()))
+        graph.add_nodes_from((buyer, {'bipartite': 1}) for buyer in buyers)
+        graph.add_edges_from((sellers[u], buyers[v], {'valuation': valuation}) for u, v, valuation in
+                             zip(self.edge_sellers.tolist(), self.edge_buyers.tolist(), self.valuations.tolist()))
+        return graph
+
+
+class AuctionState:
+    """Payoffs, preferred sellers and a matching of one auction, kept up to date incrementally.
+
+    Works on the bid arrays of a Market, grouped per buyer and per seller. Raising a price only touches that seller's
+    edges and re-evaluates the buyers on them, so a round costs the edges
+    it affects instead of the whole market.
+
+    A buyer prefers every seller with its best payoff, ties included. The
+    preferred-seller graph is matched with Hopcroft-Karp; the matching stays
+    valid when constricted sellers get dearer (their matched buyers are the
+    ones whose best payoff drops), so each round only has to augment it.
+    The preferred sellers, the matching and the unmatched buyers are kept as
+    plain lists and a set between rounds and only changed for the buyers a
+    price rise re-evaluates.
+    """
+
+    def __init__(self, market, prices=None):
+        self.market = market
+        self.prices = prices   # optional {seller: price} dict kept in step with the rounds
+        self.sellers, self.buyers = market.sellers, market.buyers
+        self.edge_sellers, self.edge_buyers = market.edge_sellers, market.edge_buyers
+        self.price_vector = market.prices.copy()
+        self.payoffs = market.valuations - self.price_vector[self.edge_sellers]
+        _check_feasible(len(self.buyers), len(self.sellers), self.edge_buyers, self.edge_sellers)
+        self.by_buyer, self.buyer_offsets = market.by_buyer, market.buyer_offsets
+        self.by_seller, self.seller_offsets = market.by_seller, market.seller_offsets
+
+        self.best = np.zeros(len(self.buyers), dtype=self.payoffs.dtype)  # best payoff of each buyer
+        self.choice = np.full(len(self.buyers), -1, dtype=np.int64)       # last best edge of each buyer
+        self.ties = np.zeros(len(self.buyers), dtype=np.int64)            # other edges with the best payoff
+        self.matched = np.full(len(self.buyers), -1, dtype=np.int64)      # matched edge of each buyer
+        self.owner = np.full(len(self.sellers), -1, dtype=np.int64)       # matched buyer of each seller
+        self.reached = np.zeros(0, dtype=np.int64)
+        # Python copies for the matching loop: preferred (edge, seller) pairs per buyer, owner, matched and free buyers
+        self.preferred = [[] for _ in self.buyers]
+        self.owner_list, self.matched_list = self.owner.tolist(), self.matched.tolist()
+        self.free = set(range(len(self.buyers)))
+        self._choose(np.arange(len(self.buyers)))
+        self._match()
+
+    def _choose(self, buyers):
+        """Re-evaluate the best payoff of the given buyers, dropping matches that fell behind."""
+        if not len(buyers):
+            return
+        positions = _positions(self.buyer_offsets, buyers)
+        edges = self.by_buyer[positions]
+        starts = np.r_[0, np.cumsum(self.buyer_offsets[buyers + 1] - self.buyer_offsets[buyers])[:-1]]
+        payoffs = self.payoffs[edges]
+        self.best[buyers] = best = np.maximum.reduceat(payoffs, starts)
+        top = payoffs == np.repeat(best, np.diff(np.r_[starts, len(edges)]))
+        self.choice[buyers] = self.by_buyer[np.maximum.reduceat(np.where(top, positions, -1), starts)]
+        counts = np.add.reduceat(top, starts)
+        self.ties[buyers] = counts - 1
+        picked = edges[top]
+        pairs = list(zip(picked.tolist(), self.edge_sellers[picked].tolist()))
+        begin = 0
+        for buyer, end in zip(buyers.tolist(), np.cumsum(counts).tolist()):
+            self.preferred[buyer] = pairs[begin:end]
+            begin = end
+
+        matched = buyers[self.matched[buyers] >= 0]
+        stale = matched[self.payoffs[self.matched[matched]] < self.best[matched]]
+        dropped = self.edge_sellers[self.matched[stale]]
+        self.owner[dropped] = -1
+        self.matched[stale] = -1
+        for buyer, seller in zip(stale.tolist(), dropped.tolist()):
+            self.owner_list[seller] = -1
+            self.matched_list[buyer] = -1
+            self.free.add(buyer)
+
+    def _match(self):
+        """Grow the matching to a maximum one of the preferred-seller graph (Hopcroft-Karp).
+
+        Each phase layers the buyers by alternating paths from the unmatched
+        ones and augments along vertex-disjoint shortest paths. The last
+        phase finds no free seller; the sellers it reached are the
+        constricted set.
+        """
+        owner, matched, preferred = self.owner_list, self.matched_list, self.preferred
+        augmented = []   # buyers whose match changed, copied back to the arrays at the end
+        while True:
+            free = sorted(self.free)
+            layer = dict.fromkeys(free, 0)
+            reached = set()
+            found = False
+            queue = free
+            while queue:
+                following = []
+                for buyer in queue:
+                    for _, seller in preferred[buyer]:
+                        if seller in reached:
+                            continue
+                        reached.add(seller)
+                        other = owner[seller]
+                        if other < 0:
+                            found = True
+                        elif other not in layer:
+                            layer[other] = layer[buyer] + 1
+                            following.append(other)
+                # Shortest augmenting paths end in this layer; no need to go deeper
+                if found:
+                    break
+                queue = following
+            if not found:
+                buyers = np.array(augmented, dtype=np.int64)
+                self.matched[buyers] = edges = [matched[buyer] for buyer in augmented]
+                self.owner[self.edge_sellers[np.array(edges, dtype=np.int64)]] = buyers
+                self.reached = np.array(sorted(reached), dtype=np.int64)
+                return
+
+            depth = layer[queue[0]]   # length of the shortest augmenting paths
+            used = set()
+            for first in free:
+                # Depth-first along the layers, sellers used at most once per phase
+                path = [(first, iter(preferred[first]))]
+                taken = []
+                while path:
+                    buyer, candidates = path[-1]
+                    for edge, seller in candidates:
+                        if seller in used:
+                            continue
+                        other = owner[seller]
+                        if other < 0:
+                            used.add(seller)
+                            taken.append((edge, seller))
+                            for (b, _), (e, s) in zip(path, taken):
+                                matched[b] = e
+                                owner[s] = b
+                                augmented.append(b)
+                            self.free.discard(first)
+                            path = []
+                            break
+                        if layer.get(other) == layer[buyer] + 1 and layer[other] <= depth:
+                            used.add(seller)
+                            taken.append((edge, seller))
+                            path.append((other, iter(preferred[other])))
+                            break
+                    else:
+                        path.pop()
+                        if taken:
+                            taken.pop()
+
+    @property
+    def perfect(self):
+        """True when every buyer is matched to a preferred seller."""
+        return not (self.matched < 0).any()
+
+    def constricted(self, buyer=None):
+        """(sellers, buyers) ids of the constricted set of one unmatched buyer (default: the first).
+
+        It is the buyer's alternating tree in the preferred-seller graph: the
+        sellers the buyer prefers, the buyers matched to them, the sellers
+        those prefer, and so on. The matching is a maximum one, so every
+        seller of the tree is matched to one of its buyers and the buyers
+        outnumber the sellers by one. Empty when every buyer is matched.
+
+        The round loop raises the union of the trees of all unmatched
+        buyers, self.reached, which is a constricted set as well.
+        """
+        if buyer is None:
+            if not self.free:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+            buyer = min(self.free)
+        elif buyer not in self.free:
+            raise ValueError(f"buyer {self.buyers[buyer]!r} is matched")
+        buyers, sellers = [buyer], set()
+        for current in buyers:
+            for _, seller in self.preferred[current]:
+                if seller not in sellers:
+                    sellers.add(seller)
+                    buyers.append(self.owner_list[seller])
+        return np.array(sorted(sellers), dtype=np.int64), np.array(sorted(buyers), dtype=np.int64)
+
+    def raise_prices(self, sellers, amount=1):
+        positions = _positions(self.seller_offsets, sellers)
+        edges = self.by_seller[positions]
+        self.price_vector[sellers] += amount
+        self.payoffs[edges] -= amount
+        if self.prices is not None:
+            for seller in sellers.tolist():
+                self.prices[self.sellers[seller]] += amount
+        self._choose(np.unique(self.edge_buyers[edges]))
+        self._match()
+
+    def shown_edges(self):
+        """Matched edge of every buyer, its last best edge while unmatched."""
+        return np.where(self.matched >= 0, self.matched, self.choice)
+
+    def connections(self):
+        """{buyer: (seller, payoff)} of every buyer's current pick."""
+        shown = self.shown_edges()
+        return {buyer: (self.sellers[seller], payoff) for buyer, seller, payoff in
+                zip(self.buyers, self.edge_sellers[shown].tolist(), self.payoffs[shown].tolist())}
+
+    def tie_edge_ids(self):
+        """Edges as good for their buyer as its pick, other than the pick."""
+        tied = np.flatnonzero(self.ties > 0)
+        edges = self.by_buyer[_positions(self.buyer_offsets, tied)]
+        owners = self.edge_buyers[edges]
+        return edges[(self.payoffs[edges] == self.best[owners]) & (edges != self.shown_edges()[owners])]
+
+    def tie_edges(self):
+        """(seller, buyer) labels of tie_edge_ids()."""
+        edges = self.tie_edge_ids()
+        return [(self.sellers[u], self.buyers[v]) for u, v in
+                zip(self.edge_sellers[edges].tolist(), self.edge_buyers[edges].tolist())]
+
+    def price_dict(self):
+        return self.market.price_dict(self.price_vector)
+
+    def payoff_labels(self):
+        return self.market.payoff_labels(self.price_vector)
+
+
+def auction_rounds(market, prices=None):
+    """Run the auction on a Market or market graph, yielding (round_num, state) every round.
+
+    A prices dict, if given, gives the starting prices and is updated in
+    place after a round that did not end the auction; the last round
+    yielded has state.perfect set. A market in which no matching gives
+    every buyer a seller raises ValueError, since its prices would rise
+    forever.
+    """
+    if not isinstance(market, Market):
+        market = Market.from_graph(market, prices)
+    elif prices is not None:
+        market = market.with_prices(prices)
+    state = AuctionState(market, prices)
+    round_num = 1
+    while True:
+        yield round_num, state
+        if state.perfect:
+            return
+        state.raise_prices(state.reached)
+        round_num += 1
+
+
+def clear_market(market, prices=None):
+    """Run the auction to the end; returns (prices, {buyer: seller}, rounds).
+
+    prices, if given, are the starting {seller: price}; the dict is not changed.
+    """
+    if not isinstance(market, Market):
+        market = Market.from_graph(market, prices)
+    elif prices is not None:
+        market = market.with_prices(prices)
+    for round_num, state in auction_rounds(market):
+        pass
+    return state.price_dict(), {v: u for v, (u, _) in state.connections().items()}, round_num
+
+
+# Direct solvers. Market-clearing prices are the dual of the assignment
+# problem: the buyers take an assignment that maximises total payoff, and the
+# prices are the smallest ones (not below the starting prices) at which every
+# buyer prefers its own seller. Both methods return (prices, {buyer: seller},
+# rounds) like clear_market, with rounds the number of solver iterations.
+AUCTION_SCALING = 10   # epsilon shrinks by this factor between auction phases
+MAX_DECIMALS = 6       # valuations and prices with more decimals are solved as floats
+
+
+def _check_feasible(num_buyers, num_sellers, edge_buyers, edge_sellers):
+    adjacency = sp.csr_matrix((np.ones(len(edge_buyers)), (edge_buyers, edge_sellers)),
+                              shape=(num_buyers, num_sellers))
+    if (maximum_bipartite_matching(adjacency, perm_type='column') < 0).any():
+        raise ValueError("no matching gives every buyer a seller; the market cannot clear")
+
+
+def _decimal_scale(values):
+    """Smallest 10 ** k (k <= MAX_DECIMALS) that makes every value whole, None if there is none.
+
+    Scaled values must stay exact in a float, so the solvers can treat them
+    as integers.
+    """
+    values = np.asarray(values, dtype=float)
+    for k in range(MAX_DECIMALS + 1):
+        scaled = values * 10 ** k
+        if np.abs(scaled).max(initial=0) >= 2 ** 52:
+            return None
+        if np.allclose(scaled, np.round(scaled), rtol=1e-12, atol=1e-9):
+            return 10 ** k
+    return None
+
+
+# Kuhn-Munkres style shortest augmenting paths on the sparse benefit matrix
+# (scipy's LAPJVsp), so missing edges cost nothing instead of a dense n x n
+# matrix; costs are shifted to stay positive
+def _hungarian(num_buyers, num_sellers, offsets, edge_buyers, edge_sellers, benefits):
+    cost = benefits.max() - benefits + 1 if len(benefits) else benefits
+    rows, cols = min_weight_full_bipartite_matching(
+        sp.csr_matrix((cost, (edge_buyers, edge_sellers)), shape=(num_buyers, num_sellers)))
+    match = np.full(num_buyers, -1, dtype=np.int64)
+    match[rows] = cols
+    return match, 1
+
+
+# Bertsekas' auction with epsilon scaling. All unassigned buyers bid at once
+# on their best seller, raising its price by (best - second best payoff) +
+# epsilon; each seller goes to its highest bidder and its previous owner bids
+# again next round. Every phase divides epsilon until it is below 1 / n, where
+# an integral market is solved exactly (solve_market scales decimal markets to
+# integers and checks the result otherwise).
+#
+# Scaled forward auctions are only exact on square problems, so with more
+# sellers than buyers, num_sellers - num_buyers dummy buyers that value every
+# seller at 0 take the leftovers. They are not given edges: being identical,
+# the k unassigned dummies of a round bid on the k cheapest sellers, each at
+# the (k + 1)-th lowest price plus epsilon, which keeps every one of them
+# within epsilon of its best payoff.
+def _auction(num_buyers, num_sellers, offsets, edge_buyers, edge_sellers, benefits):
+    if not num_buyers:
+        return np.zeros(0, dtype=np.int64), 0
+    prices = np.zeros(num_sellers)
+    values = np.r_[benefits, 0] if num_sellers > num_buyers else benefits
+    span = float(values.max() - values.min()) + 1 if len(values) else 1
+    final = 1 / (num_sellers + 1)
+    epsilon = max(span / AUCTION_SCALING, final)
+    rounds = 0
+    while True:
+        # Bidders num_buyers.. are the dummies
+        match = np.full(num_sellers, -1, dtype=np.int64)
+        owner = np.full(num_sellers, -1, dtype=np.int64)
+        bidding = np.arange(num_sellers)
+        while len(bidding):
+            rounds += 1
+            real, idle = bidding[bidding < num_buyers], bidding[bidding >= num_buyers]
+            edges = _positions(offsets, real)
+            bidders, targets = edge_buyers[edges], edge_sellers[edges]
+            payoff = benefits[edges] - prices[targets]
+            order = np.lexsort((-payoff, bidders))
+            bidders, payoff, targets = bidders[order], payoff[order], targets[order]
+            first = np.flatnonzero(np.r_[True, bidders[1:] != bidders[:-1]])[:len(bidders)]
+            has_second = np.r_[first[1:], len(bidders)] - first > 1
+            second = np.where(has_second, payoff[np.minimum(first + 1, len(payoff) - 1)], payoff[first] - span)
+            bidders, targets = bidders[first], targets[first]
+            bids = prices[targets] + payoff[first] - second + epsilon
+            if len(idle):
+                cheapest = np.argpartition(prices, len(idle))[:len(idle) + 1]
+                cheapest = cheapest[np.argsort(prices[cheapest], kind='stable')]
+                bidders = np.r_[bidders, idle]
+                targets = np.r_[targets, cheapest[:-1]]
+                bids = np.r_[bids, np.full(len(idle), prices[cheapest[-1]] + epsilon)]
+
+            # Highest bid per seller wins it
+            won = np.lexsort((-bids, targets))
+            won = won[np.r_[True, targets[won][1:] != targets[won][:-1]]]
+            sold, winners = targets[won], bidders[won]
+            outbid = owner[sold]
+            outbid = outbid[outbid >= 0]
+            match[outbid] = -1
+            owner[sold] = winners
+            match[winners] = sold
+            prices[sold] = bids[won]
+            bidding = np.concatenate([np.setdiff1d(bidders, winners, assume_unique=True), outbid])
+        if epsilon <= final:
+            return match[:num_buyers], rounds
+        epsilon = max(epsilon / AUCTION_SCALING, final)
+
+
+def minimal_prices(num_sellers, offsets, edge_buyers, edge_sellers, benefits, match):
+    """Smallest non-negative price increments at which match is envy-free.
+
+    Buyer i on seller m(i) must not prefer seller k, so the price of k is at
+    least price[m(i)] - benefit(i, m(i)) + benefit(i, k). Relaxed to the fixed
+    point like Bellman-Ford, each pass only from the sellers whose price just
+    rose. No fixed point, or an unsold seller priced above its start, means
+    match was not optimal.
+    """
+    own = np.zeros(len(match))
+    mine = match[edge_buyers] == edge_sellers
+    own[edge_buyers[mine]] = benefits[mine]
+    owner = np.full(num_sellers, -1, dtype=np.int64)
+    owner[match] = np.arange(len(match))
+    prices = np.zeros(num_sellers)
+    changed = match
+    for _ in range(num_sellers + 1):
+        active = owner[changed]
+        active = active[active >= 0]
+        if not len(active):
+            # Sellers left without a buyer must stay at their starting price
+            if (prices[owner < 0] > 0).any():
+                break
+            return prices
+        edges = _positions(offsets, active)
+        updated = prices.copy()
+        np.maximum.at(updated, edge_sellers[edges],
+                      prices[match[edge_buyers[edges]]] - own[edge_buyers[edges]] + benefits[edges])
+        changed = np.flatnonzero(updated > prices)
+        prices = updated
+    raise ValueError("the assignment is not optimal; no market-clearing prices support it")
+
+
+SOLVERS = {'hungarian': _hungarian, 'auction': _auction}
+
+
+def solve_market(market, method='hungarian', prices=None):
+    """Market-clearing prices and an optimal matching without the round loop.
+
+    Takes a Market or a market graph. Returns (prices, {buyer: seller},
+    rounds) with the starting prices of the market (or the given ones) as
+    the floor.
+    """
+    if not isinstance(market, Market):
+        market = Market.from_graph(market, prices)
+    elif prices is not None:
+        market = market.with_prices(prices)
+    # Decimal valuations and prices are solved as integers in units of 1 / scale,
+    # which keeps the auction exact and the prices free of float noise
+    scale = _decimal_scale(np.r_[market.valuations, market.prices])
+    if scale is None:
+        scale, valuations, start = 1, market.valuations.astype(float), market.prices.astype(float)
+    else:
+        valuations, start = np.round(market.valuations * scale), np.round(market.prices * scale)
+    order, offsets = market.by_buyer, market.buyer_offsets
+    edge_buyers, edge_sellers = market.edge_buyers[order], market.edge_sellers[order]
+    benefits = (valuations - start[market.edge_sellers])[order]
+    _check_feasible(market.num_buyers, market.num_sellers, edge_buyers, edge_sellers)
+    match, rounds = SOLVERS[method](market.num_buyers, market.num_sellers, offsets, edge_buyers, edge_sellers,
+                                    benefits)
+    try:
+        increments = minimal_prices(market.num_sellers, offsets, edge_buyers, edge_sellers, benefits, match)
+    except ValueError:
+        if method == 'hungarian':
+            raise
+        # The auction is only exact on integral benefits; finish with the exact solver
+        match, extra = _hungarian(market.num_buyers, market.num_sellers, offsets, edge_buyers, edge_sellers,
+                                  benefits)
+        rounds += extra
+        increments = minimal_prices(market.num_sellers, offsets, edge_buyers, edge_sellers, benefits, match)
+    clearing = _integral((start + increments) / scale)
+    return (market.price_dict(clearing),
+            {buyer: market.sellers[seller] for buyer, seller in zip(market.buyers, match.tolist())}, rounds)
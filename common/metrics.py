@@ -0,0 +1,229 @@
+import csv
+import math
+
+import numpy as np
+import scipy.sparse as sp
+
+
+# Vectorised per-node and per-edge metrics for the graph_analysis plots.
+# Everything works on integer index arrays (nodes 0..n-1 plus edge source and
+# target arrays) so it can run without networkx objects or plotting.
+
+def graph_index_arrays(graph):
+    """(nodes, sources, targets) index arrays for a networkx graph."""
+    nodes = list(graph.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = np.array([(index[u], index[v]) for u, v in graph.edges()], dtype=np.int64).reshape(-1, 2)
+    return nodes, edges[:, 0], edges[:, 1]
+
+
+def degree_array(num_nodes, sources, targets):
+    # Same counting as graph.degree(): a self-loop adds 2
+    return np.bincount(sources, minlength=num_nodes) + np.bincount(targets, minlength=num_nodes)
+
+
+def adjacency_matrix(num_nodes, sources, targets):
+    """Symmetric 0/1 CSR adjacency matrix (parallel edges collapse)."""
+    rows = np.concatenate([sources, targets])
+    cols = np.concatenate([targets, sources])
+    matrix = sp.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)), shape=(num_nodes, num_nodes))
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+
+# Common-neighbour counts for every edge: (A . A)[u, v] restricted to the
+# edges themselves. Rows are done in blocks so A . A is never held whole.
+def common_neighbor_counts(adjacency, sources, targets, block_size=20000):
+    counts = np.zeros(len(sources), dtype=np.int64)
+    order = np.argsort(sources, kind='stable')
+    ordered_sources = sources[order]
+    for start in range(0, adjacency.shape[0], block_size):
+        stop = min(start + block_size, adjacency.shape[0])
+        lo, hi = np.searchsorted(ordered_sources, [start, stop])
+        if lo == hi:
+            continue
+        block = (adjacency[start:stop] @ adjacency).tocsr()
+        picked = order[lo:hi]
+        counts[picked] = np.asarray(block[sources[picked] - start, targets[picked]]).ravel()
+    return counts
+
+
+def neighborhood_overlap(num_nodes, sources, targets):
+    """Jaccard overlap of every edge and its per-node average.
+
+    For an edge (u, v) the overlap is |N(u) & N(v)| / |N(u) | N(v)|, and a
+    node's value is the mean over its edges (0 without edges). Returns
+    (edge_overlap, node_average) as float arrays.
+    """
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    adjacency = adjacency_matrix(num_nodes, sources, targets)
+    neighbors = np.diff(adjacency.indptr)
+
+    common = common_neighbor_counts(adjacency, sources, targets)
+    union = neighbors[sources] + neighbors[targets] - common
+    edge_overlap = np.divide(common, union, out=np.zeros(len(common)), where=union > 0)
+
+    # A self-loop counts once for its node
+    loop = sources == targets
+    totals = np.bincount(sources, edge_overlap, minlength=num_nodes) + \
+        np.bincount(targets[~loop], edge_overlap[~loop], minlength=num_nodes)
+    edge_counts = np.bincount(sources, minlength=num_nodes) + np.bincount(targets[~loop], minlength=num_nodes)
+    node_average = np.divide(totals, edge_counts, out=np.zeros(num_nodes), where=edge_counts > 0)
+    return edge_overlap, node_average
+
+
+# Adjacency without self-loops and its edges with u < v, once each: the
+# simple graph that triangles and wedges are counted on (as nx.clustering does)
+def _simple_adjacency(num_nodes, sources, targets):
+    adjacency = adjacency_matrix(num_nodes, np.asarray(sources, dtype=np.int64), np.asarray(targets, dtype=np.int64))
+    adjacency.setdiag(0)
+    adjacency.eliminate_zeros()
+    upper = sp.triu(adjacency, k=1).tocoo()
+    return adjacency, upper.row.astype(np.int64), upper.col.astype(np.int64)
+
+
+def triangle_counts(num_nodes, sources, targets):
+    """(triangles, degrees): triangles through every node and its simple degree.
+
+    Each edge's common-neighbour count is the number of triangles on it;
+    summed over a node's edges every triangle at the node is seen twice.
+    """
+    adjacency, upper_sources, upper_targets = _simple_adjacency(num_nodes, sources, targets)
+    common = common_neighbor_counts(adjacency, upper_sources, upper_targets)
+    twice = np.bincount(upper_sources, common, minlength=num_nodes) + \
+        np.bincount(upper_targets, common, minlength=num_nodes)
+    return (twice // 2).astype(np.int64), np.diff(adjacency.indptr)
+
+
+def clustering(num_nodes, sources, targets):
+    """Exact clustering; returns (local, average, transitivity).
+
+    local[v] = triangles(v) / wedges(v) with wedges(v) = d(d - 1) / 2, 0 for
+    nodes of degree < 2, the same values as nx.clustering. average is their
+    mean and transitivity the global 3 * triangles / connected triples.
+    """
+    triangles, degrees = triangle_counts(num_nodes, sources, targets)
+    wedges = degrees * (degrees - 1) / 2
+    local = np.divide(triangles, wedges, out=np.zeros(num_nodes), where=wedges > 0)
+    total_wedges = wedges.sum()
+    transitivity = triangles.sum() / total_wedges if total_wedges else 0.0
+    return local, (local.mean() if num_nodes else 0.0), transitivity
+
+
+# Wedges each estimate needs so that, by Hoeffding, it is within epsilon of
+# the exact value with probability at least 1 - delta
+def wedges_for_error(epsilon, delta=0.1):
+    return math.ceil(math.log(2 / delta) / (2 * epsilon ** 2))
+
+
+# Is every (a, b) an edge? keys holds u * n + v for the sorted u < v edges
+def _has_edges(keys, num_nodes, a, b):
+    wanted = np.minimum(a, b) * num_nodes + np.maximum(a, b)
+    if not len(keys):
+        return np.zeros(len(wanted), dtype=bool)
+    # Looking the pairs up in sorted order keeps searchsorted cache friendly
+    order = np.argsort(wanted)
+    found = np.empty(len(wanted), dtype=bool)
+    positions = np.minimum(np.searchsorted(keys, wanted[order]), len(keys) - 1)
+    found[order] = keys[positions] == wanted[order]
+    return found
+
+
+# Closed fraction of `samples` random wedges centred at each of the given nodes
+def _sample_wedges(adjacency, keys, centers, samples, rng):
+    num_nodes = adjacency.shape[0]
+    centers = np.repeat(centers, samples)
+    degrees = np.diff(adjacency.indptr)[centers]
+    first = rng.integers(0, degrees)
+    second = rng.integers(0, degrees - 1)
+    second += second >= first
+    starts = adjacency.indptr[centers]
+    return _has_edges(keys, num_nodes, adjacency.indices[starts + first].astype(np.int64),
+                      adjacency.indices[starts + second].astype(np.int64))
+
+
+# Every wedge (pair of distinct neighbours) at each of the given centres, as
+# (centre position, first neighbour, second neighbour)
+def _all_wedges(adjacency, centers):
+    degrees = np.diff(adjacency.indptr)[centers]
+    # One row per (centre, neighbour position i), paired with the positions after i
+    owner = np.repeat(np.arange(len(centers)), degrees)
+    position = np.arange(len(owner)) - np.repeat(np.cumsum(degrees) - degrees, degrees)
+    partners = degrees[owner] - 1 - position
+    row = np.repeat(np.arange(len(owner)), partners)
+    second = position[row] + 1 + np.arange(len(row)) - np.repeat(np.cumsum(partners) - partners, partners)
+    starts = adjacency.indptr[centers][owner[row]]
+    return (owner[row], adjacency.indices[starts + position[row]].astype(np.int64),
+            adjacency.indices[starts + second].astype(np.int64))
+
+
+def approximate_clustering(num_nodes, sources, targets, epsilon, delta=0.1, seed=None, block_size=1 << 22):
+    """Wedge-sampling estimate of clustering(); same (local, average, transitivity).
+
+    A node with no more wedges than wedges_for_error(epsilon, delta) gets its
+    exact value from checking every wedge; a node with more gets that many
+    random wedges (two distinct neighbours) and its estimate is the fraction
+    that are closed. Transitivity samples as many wedges over the whole graph,
+    centres drawn in proportion to their wedge count. Each value is within
+    epsilon of the exact one with probability at least 1 - delta; no triangle
+    is listed.
+    """
+    rng = np.random.default_rng(seed)
+    samples = wedges_for_error(epsilon, delta)
+    adjacency, upper_sources, upper_targets = _simple_adjacency(num_nodes, sources, targets)
+    keys = np.sort(upper_sources * num_nodes + upper_targets)
+    degrees = np.diff(adjacency.indptr)
+    wedges = degrees * (degrees - 1) // 2
+
+    local = np.zeros(num_nodes)
+    centers = np.flatnonzero(degrees >= 2)
+    exact = centers[wedges[centers] <= samples]
+    # Blocks of whole centres holding about block_size wedges each
+    ends = np.cumsum(wedges[exact])
+    start = 0
+    while start < len(exact):
+        stop = max(start + 1, int(np.searchsorted(ends, ends[start] - wedges[exact[start]] + block_size, 'right')))
+        block = exact[start:stop]
+        owner, a, b = _all_wedges(adjacency, block)
+        local[block] = np.bincount(owner, _has_edges(keys, num_nodes, a, b), minlength=len(block)) / wedges[block]
+        start = stop
+
+    sampled = centers[wedges[centers] > samples]
+    step = max(1, block_size // samples)
+    for start in range(0, len(sampled), step):
+        block = sampled[start:start + step]
+        closed = _sample_wedges(adjacency, keys, block, samples, rng)
+        local[block] = closed.reshape(len(block), samples).mean(axis=1)
+
+    transitivity = 0.0
+    if wedges.sum():
+        picked = rng.choice(num_nodes, size=samples, p=wedges / wedges.sum())
+        transitivity = _sample_wedges(adjacency, keys, picked, 1, rng).mean()
+    return local, (local.mean() if num_nodes else 0.0), transitivity
+
+
+# Write every edge with its overlap, weakest ties first
+def write_edge_overlap(filename, nodes, sources, targets, edge_overlap):
+    order = np.argsort(edge_overlap, kind='stable')
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['source', 'target', 'overlap'])
+        for i in order.tolist():
+            writer.writerow([nodes[sources[i]], nodes[targets[i]], edge_overlap[i]])
+
+
+# Node sizes between min_pixel and max_pixel from a per-node value, and colours
+# from (254 * degree / max degree, 0, 254) scaled to [0, 1]
+def size_color_arrays(values, degrees, min_pixel=200, max_pixel=2000):
+    values = np.asarray(values, dtype=float)
+    low = values.min() if len(values) else 0
+    spread = values.max() - low if len(values) else 0
+    scaled = (values - low) / spread if spread else np.zeros(len(values))
+    sizes = min_pixel + scaled * (max_pixel - min_pixel)
+
+    max_degree = degrees.max() if len(degrees) else 0
+    shade = degrees / max_degree if max_degree > 0 else np.zeros(len(degrees))
+    colors = np.column_stack([254 * shade / 255, np.zeros(len(degrees)), np.full(len(degrees), 254 / 255)])
+    return sizes, colors
@@ -0,0 +1,247 @@
+import heapq
+import json
+import math
+import os
+import random
+import tempfile
+import time
+from collections import deque
+from itertools import count
+
+import networkx as nx
+import numpy as np
+
+
+# Incremental Girvan-Newman partitioning shared by the graph_analysis scripts.
+# Shortest paths never leave a connected component, so removing an edge only
+# changes the betweenness inside the component it belonged to. We keep one
+# betweenness table per component, recompute just the touched one (or the two
+# halves after a split) and track the component count as splits happen.
+
+def serial_edge_betweenness(graph):
+    return nx.edge_betweenness_centrality(graph, normalized=False)
+
+
+# Brandes accumulates one shortest-path DAG per source node and sums them, so
+# the sources can be split into batches. A batch is scored with
+# edge_betweenness_centrality_subset (all nodes as targets); the batch sums add
+# up to the full unnormalised betweenness.
+def _source_batch_betweenness(graph, sources):
+    return nx.edge_betweenness_centrality_subset(graph, sources, list(graph), normalized=False)
+
+
+def _add_scores(total, scores):
+    for edge, value in scores.items():
+        total[edge] = total.get(edge, 0.0) + value
+    return total
+
+
+def _batches(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+# Worker side of the process pool. Every call writes the graph once, as an
+# int64 edge array in a temporary .npy file, and a task only carries the call
+# key, that file name and its batch of source ids. A worker loads the graph
+# the first time it sees a call and keeps it for the call's other batches.
+_SHARED = {}
+_calls = count()
+
+
+def _pool_batch(job):
+    key, filename, num_nodes, directed, sources = job
+    if _SHARED.get('key') != key:
+        graph = nx.DiGraph() if directed else nx.Graph()
+        graph.add_nodes_from(range(num_nodes))
+        graph.add_edges_from(np.load(filename).tolist())
+        _SHARED['key'], _SHARED['graph'] = key, graph
+    return _source_batch_betweenness(_SHARED['graph'], sources)
+
+
+def parallel_edge_betweenness(graph, pool, processes, min_nodes=200):
+    """Exact edge betweenness with the source nodes spread over a Pool."""
+    nodes = list(graph)
+    if len(nodes) < min_nodes or processes < 2 or graph.is_multigraph():
+        return serial_edge_betweenness(graph)  # not worth the pickling
+    ids = {node: i for i, node in enumerate(nodes)}
+    edges = list(graph.edges())
+    by_ids = {(ids[u], ids[v]): (u, v) for u, v in edges}
+    fd, filename = tempfile.mkstemp(suffix='.npy')
+    os.close(fd)
+    try:
+        np.save(filename, np.array(list(by_ids), dtype=np.int64).reshape(-1, 2))
+        key = (os.getpid(), next(_calls))
+        size = math.ceil(len(nodes) / (processes * 4))
+        jobs = [(key, filename, len(nodes), graph.is_directed(), batch)
+                for batch in _batches(list(range(len(nodes))), size)]
+        # Scores in graph.edges() order and orientation, as the serial call returns them
+        total = dict.fromkeys(edges, 0.0)
+        for scores in pool.imap_unordered(_pool_batch, jobs):
+            for pair, value in scores.items():
+                total[by_ids[pair] if pair in by_ids else by_ids[pair[::-1]]] += value
+    finally:
+        os.remove(filename)
+    return total
+
+
+# Number of pivots so every edge's normalised score is within epsilon with
+# probability 1 - delta (Hoeffding bound plus a union bound over the edges)
+def pivots_for_error(num_edges, epsilon, delta=0.1):
+    return math.ceil(math.log(2 * max(num_edges, 1) / delta) / (2 * epsilon ** 2))
+
+
+def sampled_edge_betweenness(graph, pivots, time_budget=None, seed=None, batch_size=32):
+    """Approximate edge betweenness from a random sample of source nodes.
+
+    Pivots are scored in batches until all are done or time_budget (seconds)
+    runs out; the sums are then scaled up by n / pivots_used.
+    """
+    nodes = list(graph)
+    if pivots >= len(nodes):
+        return serial_edge_betweenness(graph)
+
+    sample = random.Random(seed).sample(nodes, pivots)
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    total = dict.fromkeys(graph.edges(), 0.0)
+    used = 0
+    for batch in _batches(sample, batch_size):
+        _add_scores(total, _source_batch_betweenness(graph, batch))
+        used += len(batch)
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+
+    scale = len(nodes) / used
+    return {edge: value * scale for edge, value in total.items()}
+
+
+# Pick the betweenness function used by girvan_newman_splits. kind is one of
+# 'serial', 'parallel' (needs a Pool) or 'sampled'; the sampled mode uses
+# pivots sources, or enough of them to meet epsilon when pivots is None.
+def make_betweenness(kind, pool=None, processes=1, pivots=None, epsilon=0.05, time_budget=None, seed=None):
+    if kind == 'parallel':
+        return lambda graph: parallel_edge_betweenness(graph, pool, processes)
+    if kind == 'sampled':
+        def sampled(graph):
+            k = pivots if pivots else pivots_for_error(graph.number_of_edges(), epsilon)
+            return sampled_edge_betweenness(graph, k, time_budget, seed)
+        return sampled
+    return serial_edge_betweenness
+
+
+def time_betweenness(graph, betweenness):
+    start = time.perf_counter()
+    betweenness(graph)
+    return time.perf_counter() - start
+
+
+def girvan_newman_splits(graph, betweenness=serial_edge_betweenness):
+    """Remove highest-betweenness edges from graph in place, one per step.
+
+    Yields (edge, score, num_components, parts) after every removal. score is
+    normalised over the whole graph the same way nx.edge_betweenness_centrality
+    does it, and parts is the pair of new node lists when the removal split a
+    component (None otherwise). betweenness(subgraph) must return unnormalised
+    edge scores.
+    """
+    n = graph.number_of_nodes()
+    scale = 2 / (n * (n - 1)) if n > 1 else 1
+
+    components = {}
+    scores = {}
+    heap = []
+    versions = {}
+    ids = count()
+
+    def add_component(nodes):
+        comp_id = next(ids)
+        components[comp_id] = nodes
+        _rescore(comp_id)
+        return comp_id
+
+    def _rescore(comp_id):
+        nodes = components[comp_id]
+        table = betweenness(graph.subgraph(nodes)) if len(nodes) > 1 else {}
+        scores[comp_id] = table
+        versions[comp_id] = versions.get(comp_id, -1) + 1
+        if table:
+            best = max(table, key=table.get)
+            heapq.heappush(heap, (-table[best], comp_id, versions[comp_id], best))
+
+    for nodes in nx.connected_components(graph):
+        add_component(set(nodes))
+
+    while heap:
+        neg_score, comp_id, version, edge = heapq.heappop(heap)
+        if comp_id not in components or versions[comp_id] != version:
+            continue  # stale entry from before this component was rescored
+
+        u, v = edge
+        graph.remove_edge(u, v)
+        reached = _reachable(graph, u, v)
+
+        parts = None
+        if v in reached:
+            _rescore(comp_id)
+        else:
+            nodes = components.pop(comp_id)
+            del scores[comp_id]
+            other = nodes - reached
+            add_component(reached)
+            add_component(other)
+            parts = (list(reached), list(other))
+
+        yield edge, -neg_score * scale, len(components), parts
+
+
+# BFS from source, stopping early once target is found
+def _reachable(graph, source, target):
+    seen = {source}
+    queue = deque([source])
+    while queue:
+        node = queue.popleft()
+        for neighbor in graph.neighbors(node):
+            if neighbor not in seen:
+                if neighbor == target:
+                    seen.add(neighbor)
+                    return seen
+                seen.add(neighbor)
+                queue.append(neighbor)
+    return seen
+
+
+# Run Girvan-Newman on a copy of graph until no edges are left and record
+# every split, so a partition for any k can be rebuilt later without
+# recomputing betweenness.
+def build_dendrogram(graph, betweenness=serial_edge_betweenness):
+    working = graph.copy()
+    dendrogram = {
+        'initial': [list(nodes) for nodes in nx.connected_components(working)],
+        'splits': [],
+    }
+    for step, (edge, score, num_components, parts) in enumerate(
+            girvan_newman_splits(working, betweenness), start=1):
+        if parts:
+            dendrogram['splits'].append({
+                'step': step,
+                'edge': list(edge),
+                'betweenness': score,
+                'components': num_components,
+                'parts': [parts[0], parts[1]],
+            })
+    return dendrogram
+
+
+def partition_from_dendrogram(dendrogram, k):
+    components = [list(nodes) for nodes in dendrogram['initial']]
+    for split in dendrogram['splits']:
+        if len(components) >= k:
+            break
+        first = split['parts'][0][0]
+        parent = next(i for i, nodes in enumerate(components) if first in nodes)
+        components[parent:parent + 1] = [list(part) for part in split['parts']]
+    return components
+
+
+def write_dendrogram(dendrogram, filename):
+    with open(filename, 'w') as f:
+        json.dump(dendrogram, f, default=str)
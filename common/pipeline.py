@@ -0,0 +1,94 @@
+import time
+
+import networkx as nx
+import numpy as np
+
+from common import metrics
+from common.balance import attribute_violations, check_balance_csr, violation_counts
+from common.bfs import connected_component_labels
+from common.homophily import SIGNIFICANCE, homophily_test
+from common.partition import girvan_newman_splits
+
+
+# Pipeline mode of graph_analysis: several analyses run one after the other
+# against a single GraphIndex, so a report over a large graph costs one load
+# and one set of index arrays. Every analysis returns a JSON-friendly dict.
+# options holds the settings of the command line: attribute, permutations,
+# processes, components, betweenness (a backend from make_betweenness) and
+# clustering_epsilon.
+
+def _homophily(index, options):
+    result = homophily_test(index.nodes, index.sources, index.targets, index.node_colors(options['attribute']),
+                            options['permutations'], options['processes'])
+    if result['p_value'] is not None:
+        result['significant'] = result['p_value'] < SIGNIFICANCE
+    else:
+        result['significant'] = result['fraction'] > result['expected']
+    return result
+
+
+def _balance(index, options):
+    balanced, witness = check_balance_csr(*index.undirected_csr, index.signs)
+    if balanced:
+        return {'balanced': True, 'camp_sizes': np.bincount(witness, minlength=2).tolist()}
+    return {'balanced': False, 'frustrated_cycle': [index.nodes[node] for node in witness]}
+
+
+def _attribute_balance(index, options):
+    codes, _ = index.node_codes(options['attribute'])
+    counts = violation_counts(attribute_violations(codes, index.sources, index.targets, index.signs))
+    return {'attribute': options['attribute'], 'balanced': not any(counts.values()), 'violations': counts}
+
+
+# Girvan-Newman on a copy, so the other analyses still see the whole graph
+def _components(index, options):
+    num_components = len(np.unique(connected_component_labels(index.num_nodes, index.sources, index.targets)))
+    graph = index.graph.copy()
+    removed = []
+    if num_components < options['components']:
+        for edge, _, num_components, _ in girvan_newman_splits(graph, options['betweenness']):
+            removed.append(list(edge))
+            if num_components >= options['components']:
+                break
+    sizes = sorted((len(component) for component in nx.connected_components(graph)), reverse=True)
+    return {'components': num_components, 'sizes': sizes, 'removed_edges': removed}
+
+
+def _clustering(index, options):
+    if options['clustering_epsilon']:
+        _, average, transitivity = metrics.approximate_clustering(
+            index.num_nodes, index.sources, index.targets, options['clustering_epsilon'])
+    else:
+        _, average, transitivity = metrics.clustering(index.num_nodes, index.sources, index.targets)
+    return {'average': float(average), 'transitivity': float(transitivity)}
+
+
+# Edges without common neighbours (overlap 0) are local bridges
+def _overlap(index, options):
+    edge_overlap, _ = metrics.neighborhood_overlap(index.num_nodes, index.sources, index.targets)
+    return {'mean_edge_overlap': float(edge_overlap.mean()) if len(edge_overlap) else 0.0,
+            'local_bridges': int(np.count_nonzero(edge_overlap == 0))}
+
+
+ANALYSES = {
+    'homophily': _homophily,
+    'balance': _balance,
+    'attribute_balance': _attribute_balance,
+    'components': _components,
+    'clustering': _clustering,
+    'overlap': _overlap,
+}
+
+
+def run_pipeline(index, analyses, options):
+    """Run the named analyses in order; returns {name: result}.
+
+    Every result records the seconds it took under 'seconds'.
+    """
+    report = {}
+    for name in analyses:
+        start = time.perf_counter()
+        result = ANALYSES[name](index, options)
+        result['seconds'] = time.perf_counter() - start
+        report[name] = result
+    return report
@@ -0,0 +1,114 @@
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+
+
+# Batched graph drawing shared by every plotting path. nx.draw makes one
+# matplotlib artist per node and edge; here all edges are one LineCollection
+# and all nodes one scatter, which stays fast into the tens of thousands of
+# elements. Past density_threshold (nodes + edges) the graph is binned into a
+# density image instead of drawing individual edges and markers.
+# With an output file the figure is written with the Agg backend, so no
+# display is needed and nothing blocks.
+
+DENSITY_THRESHOLD = 50000
+DENSITY_BINS = 400
+LABEL_LIMIT = 500   # never draw more node labels than this
+EDGE_SAMPLES = 16
+
+
+def use_headless(output):
+    if output:
+        plt.switch_backend('Agg')
+
+
+def new_figure(figsize, output=None):
+    use_headless(output)
+    fig, ax = plt.subplots(figsize=figsize)
+    return fig, ax
+
+
+# Turn a networkx graph and a {node: (x, y)} layout into index arrays
+def graph_arrays(graph, pos, edges=None):
+    nodes = list(graph.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    xy = np.array([pos[node] for node in nodes], dtype=float).reshape(-1, 2)
+    edge_list = list(graph.edges()) if edges is None else list(edges)
+    sources = np.array([index[u] for u, _ in edge_list], dtype=np.int64)
+    targets = np.array([index[v] for _, v in edge_list], dtype=np.int64)
+    return nodes, xy[:, 0], xy[:, 1], sources, targets
+
+
+def draw_edges(ax, x, y, sources, targets, color='black', width=1.0, style='solid', alpha=1.0,
+               rasterized=False, zorder=1):
+    segments = np.stack([np.column_stack([x[sources], y[sources]]),
+                         np.column_stack([x[targets], y[targets]])], axis=1)
+    collection = LineCollection(segments, colors=color, linewidths=width, linestyles=style, alpha=alpha,
+                                rasterized=rasterized, zorder=zorder)
+    ax.add_collection(collection)
+    return collection
+
+
+def draw_nodes(ax, x, y, size=200, color='#1f78b4', alpha=1.0, zorder=2):
+    return ax.scatter(x, y, s=size, c=color, alpha=alpha, edgecolors='none', zorder=zorder)
+
+
+def draw_labels(ax, x, y, labels, font_size=12, font_weight='normal'):
+    for label, lx, ly in zip(labels, np.asarray(x).tolist(), np.asarray(y).tolist()):
+        ax.text(lx, ly, str(label), fontsize=font_size, fontweight=font_weight, ha='center', va='center',
+                zorder=3)
+
+
+# Density image for huge graphs: edges are sampled at EDGE_SAMPLES points each
+# and binned together with the nodes, so the cost is a couple of histograms
+# instead of one path per edge. Edges are shown in grey, nodes in colour.
+def draw_density(ax, x, y, sources, targets, bins=DENSITY_BINS):
+    extent = (x.min(), x.max(), y.min(), y.max())
+    value_range = [[extent[0], extent[1] + 1e-12], [extent[2], extent[3] + 1e-12]]
+
+    steps = np.linspace(0, 1, EDGE_SAMPLES)[:, None]
+    sources = np.asarray(sources)
+    targets = np.asarray(targets)
+    edge_x = (x[sources] + steps * (x[targets] - x[sources])).ravel()
+    edge_y = (y[sources] + steps * (y[targets] - y[sources])).ravel()
+    edge_counts, _, _ = np.histogram2d(edge_x, edge_y, bins=bins, range=value_range)
+    node_counts, _, _ = np.histogram2d(x, y, bins=bins, range=value_range)
+
+    ax.imshow(np.log1p(edge_counts.T), origin='lower', cmap='Greys', interpolation='nearest', aspect='auto',
+              extent=extent, zorder=1)
+    ax.imshow(np.ma.masked_equal(np.log1p(node_counts.T), 0), origin='lower', cmap='magma', aspect='auto',
+              interpolation='nearest', extent=extent, zorder=2)
+
+
+def draw_graph(ax, x, y, sources, targets, node_size=200, node_color='#1f78b4', edge_color='black',
+               labels=None, font_size=12, font_weight='normal', alpha=1.0, density_threshold=DENSITY_THRESHOLD):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    dense = len(x) + len(sources) > density_threshold
+
+    if dense:
+        draw_density(ax, x, y, sources, targets)
+    else:
+        draw_edges(ax, x, y, sources, targets, color=edge_color, alpha=alpha)
+        draw_nodes(ax, x, y, size=node_size, color=node_color, alpha=alpha)
+        if labels is not None and len(labels) <= LABEL_LIMIT:
+            draw_labels(ax, x, y, labels, font_size, font_weight)
+
+    ax.autoscale_view()
+    ax.set_axis_off()
+
+
+def draw_networkx(ax, graph, pos, **kwargs):
+    """draw_graph for a networkx graph and a position dict, nodes labelled."""
+    nodes, x, y, sources, targets = graph_arrays(graph, pos)
+    kwargs.setdefault('labels', nodes)
+    draw_graph(ax, x, y, sources, targets, **kwargs)
+
+
+def show_or_save(fig, output=None, dpi=150):
+    if output:
+        fig.savefig(output, dpi=dpi, bbox_inches='tight')
+        plt.close(fig)
+        print(f"Plot saved to {output}.")
+    else:
+        plt.show()
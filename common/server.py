@@ -0,0 +1,265 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import graph_cache, market
+from common.bfs import direction_optimizing_bfs
+from common.graph_index import GraphIndex, color_signs
+from common.partition import serial_edge_betweenness
+from common.pipeline import run_pipeline
+
+
+# Analysis daemon: graphs are loaded once and kept in memory with their
+# GraphIndex, and requests are answered over localhost HTTP with JSON, so a
+# query costs the analysis itself instead of interpreter start-up, imports
+# and a GML parse. Every graph keeps a cache of its answers (dropped when the
+# file changes on disk) and every endpoint records its latencies.
+#
+#   python -m common.server graph.gml market.gml --port 8765
+#   curl 'localhost:8765/balance?graph=graph.gml'
+#
+# Endpoints (GET, graph=<path> of a graph given on the command line, or of a
+# file inside --graph_dir, loaded on first use; answers served from the cache
+# say so with "cached": true):
+#   /graphs                            resident graphs
+#   /balance                           sign balance (camp sizes or a frustrated cycle)
+#   /homophily?attribute=&permutations=  same-colour edge test with p-value
+#   /components?k=                     Girvan-Newman until k components
+#   /bfs?source=[&target=]             hop distances from a node
+#   /market[?solver=]                  market-clearing prices and matching
+#   /metrics                           request counts and latency percentiles
+
+LATENCY_WINDOW = 1000   # latencies kept per endpoint for the percentiles
+
+
+class ResidentGraph:
+    """A loaded graph, its index and cached answers, valid while the file is unchanged."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.stamp = os.stat(filename).st_mtime_ns
+        self.graph, arrays = graph_cache.read_graph_and_arrays(filename)
+        # Same edge signs as graph_analysis.py
+        for _, _, data in self.graph.edges(data=True):
+            data['sign'] = -1 if data.get('color') == 'r' else 1
+        self.index = GraphIndex(self.graph, arrays, color_signs(arrays))
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def current(self):
+        return os.stat(self.filename).st_mtime_ns == self.stamp
+
+
+class AnalysisServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, graphs=(), graph_dir=None):
+        super().__init__(address, AnalysisHandler)
+        self.graphs = {}
+        self.allowed = {os.path.realpath(filename) for filename in graphs}
+        self.graph_dir = os.path.realpath(graph_dir) if graph_dir else None
+        self.loading = threading.Lock()
+        self.file_locks = {}
+        self.latencies = {}
+        self.counts = {}
+        self.cache_hits = 0
+        self.stats_lock = threading.Lock()
+        for filename in graphs:
+            self.resident(filename)
+
+    def permitted(self, filename):
+        """Real path of a requested graph; PermissionError unless it was given
+        on the command line or lies inside graph_dir."""
+        path = os.path.realpath(filename)
+        if path in self.allowed:
+            return path
+        if self.graph_dir:
+            path = os.path.realpath(os.path.join(self.graph_dir, filename))
+            if os.path.commonpath([path, self.graph_dir]) == self.graph_dir:
+                return path
+        raise PermissionError(f"graph '{filename}' is not served")
+
+    def resident(self, filename):
+        filename = self.permitted(filename)
+        entry = self.graphs.get(filename)
+        if entry is not None and entry.current():
+            return entry
+        # One lock per file: a graph being loaded never holds up requests for the others
+        with self.loading:
+            lock = self.file_locks.setdefault(filename, threading.Lock())
+        with lock:
+            entry = self.graphs.get(filename)
+            if entry is None or not entry.current():
+                entry = self.graphs[filename] = ResidentGraph(filename)
+                print(f"Loaded {filename}: {entry.graph.number_of_nodes()} nodes, "
+                      f"{entry.graph.number_of_edges()} edges.")
+        return entry
+
+    def record(self, endpoint, seconds, cached):
+        with self.stats_lock:
+            self.latencies.setdefault(endpoint, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+            self.cache_hits += cached
+
+    def metrics(self):
+        with self.stats_lock:
+            endpoints = {}
+            for endpoint, window in self.latencies.items():
+                values = np.array(window) * 1000
+                endpoints[endpoint] = {
+                    'requests': self.counts[endpoint],
+                    'mean_ms': float(values.mean()),
+                    'p50_ms': float(np.percentile(values, 50)),
+                    'p95_ms': float(np.percentile(values, 95)),
+                    'max_ms': float(values.max()),
+                }
+            return {'endpoints': endpoints, 'cache_hits': self.cache_hits, 'graphs': len(self.graphs)}
+
+
+def _node(index, text):
+    """Look a node label given as text up in the graph, trying it as an int too."""
+    if text in index.ids:
+        return index.ids[text]
+    try:
+        return index.ids[int(text)]
+    except (ValueError, KeyError):
+        raise KeyError(f"node {text!r} not in graph")
+
+
+def _balance(entry, params):
+    return run_pipeline(entry.index, ['balance'], {})['balance']
+
+
+def _homophily(entry, params):
+    options = {'attribute': params.get('attribute', 'color'),
+               'permutations': int(params.get('permutations', 1000)),
+               'processes': 1}
+    return run_pipeline(entry.index, ['homophily'], options)['homophily']
+
+
+def _components(entry, params):
+    options = {'components': int(params['k']), 'betweenness': serial_edge_betweenness}
+    return run_pipeline(entry.index, ['components'], options)['components']
+
+
+def _bfs(entry, params):
+    index = entry.index
+    source = _node(index, params['source'])
+    distances, _ = direction_optimizing_bfs(index.offsets, index.neighbors, source, index.graph.is_directed())
+    reached = distances[distances >= 0]
+    result = {'source': index.nodes[source], 'reached': int(len(reached)),
+              'levels': np.bincount(reached).tolist()}
+    if 'target' in params:
+        result['target'] = params['target']
+        result['distance'] = int(distances[_node(index, params['target'])])
+    return result
+
+
+def _market(entry, params):
+    solver = params.get('solver')
+    if solver is None:
+        prices, matching, rounds = market.clear_market(entry.graph)
+    elif solver in market.SOLVERS:
+        prices, matching, rounds = market.solve_market(entry.graph, solver)
+    else:
+        raise ValueError(f"unknown solver '{solver}'")
+    return {'prices': prices, 'matching': matching, 'rounds': rounds}
+
+
+ENDPOINTS = {
+    'balance': _balance,
+    'homophily': _homophily,
+    'components': _components,
+    'bfs': _bfs,
+    'market': _market,
+}
+
+
+class AnalysisHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        endpoint = url.path.strip('/')
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        cached = False
+        try:
+            if endpoint == 'metrics':
+                status, body = 200, self.server.metrics()
+            elif endpoint == 'graphs':
+                status, body = 200, {name: {'nodes': entry.graph.number_of_nodes(),
+                                            'edges': entry.graph.number_of_edges()}
+                                     for name, entry in list(self.server.graphs.items())}
+            elif endpoint in ENDPOINTS:
+                if 'graph' not in params:
+                    raise KeyError("missing 'graph' parameter")
+                entry = self.server.resident(params['graph'])
+                key = (endpoint, tuple(sorted((k, v) for k, v in params.items() if k != 'graph')))
+                with entry.lock:
+                    body = entry.results.get(key)
+                cached = body is not None
+                if not cached:
+                    body = ENDPOINTS[endpoint](entry, params)
+                    with entry.lock:
+                        entry.results[key] = body
+                # Timings inside a cached answer are those of its first computation
+                body = {**body, 'cached': cached}
+                status = 200
+            else:
+                status, body = 404, {'error': f"unknown endpoint '{endpoint}'",
+                                     'endpoints': sorted(ENDPOINTS) + ['graphs', 'metrics']}
+        except FileNotFoundError as e:
+            status, body = 404, {'error': str(e)}
+        except PermissionError as e:
+            status, body = 403, {'error': str(e)}
+        except (KeyError, ValueError) as e:
+            status, body = 400, {'error': str(e.args[0]) if e.args else str(e)}
+        except Exception as e:
+            # e.g. a file that is not a graph; the client still gets an answer
+            status, body = 500, {'error': f"{type(e).__name__}: {e}"}
+
+        seconds = time.perf_counter() - start
+        if status == 200 and endpoint in ENDPOINTS:
+            self.server.record(endpoint, seconds, cached)
+        payload = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('X-Latency-Ms', f"{seconds * 1000:.3f}")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass   # keep the terminal for load messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Graph analysis server')
+    parser.add_argument('graphs', nargs='*', help='Graph files (GML or .edges) to load at start-up')
+    parser.add_argument('--graph_dir', help='Also serve any graph file inside this directory, loaded on first use')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: localhost only)')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+    args = parser.parse_args()
+
+    if not args.graphs and not args.graph_dir:
+        parser.error("give graph files or --graph_dir")
+    server = AnalysisServer((args.host, args.port), args.graphs, args.graph_dir)
+    print(f"Serving on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# The scripts import the shared code as the top-level package 'common', and
+# plots must not need a display
+sys.path.insert(0, ROOT)
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+
+@pytest.fixture
+def script():
+    """Import an assignment script from its path relative to the repository root.
+
+    The module is registered in sys.modules so process pools can pickle its functions.
+    """
+    def load(path):
+        name = os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+        return module
+    return load
@@ -0,0 +1,83 @@
+import csv
+import json
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from common.balance import VIOLATION_TYPES, attribute_violations, violation_counts, write_violations
+from common.graph_index import GraphIndex
+
+
+def attributed_graph(seed):
+    rng = np.random.default_rng(seed)
+    graph = nx.gnm_random_graph(int(rng.integers(2, 40)), int(rng.integers(1, 80)), seed=seed)
+    for _, data in graph.nodes(data=True):
+        if rng.random() < 0.9:
+            data['color'] = ['red', 'blue', 'green'][rng.integers(3)]
+    for _, _, data in graph.edges(data=True):
+        if rng.random() < 0.9:
+            data['sign'] = [1, -1][rng.integers(2)]
+    return graph
+
+
+# The per-edge rule of the original is_graph_balanced_by_attributes
+def expected_kind(graph, u, v):
+    if 'color' not in graph.nodes[u] or 'color' not in graph.nodes[v]:
+        return 'missing_attribute'
+    sign = graph.edges[u, v].get('sign', 1)
+    if graph.nodes[u]['color'] == graph.nodes[v]['color']:
+        return None if sign == 1 else 'same_attribute_negative'
+    return None if sign == -1 else 'different_attribute_positive'
+
+
+def classify(graph):
+    index = GraphIndex(graph)
+    codes, _ = index.node_codes('color')
+    return index, attribute_violations(codes, index.sources, index.targets, index.signs)
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_every_edge_is_classified(seed):
+    graph = attributed_graph(seed)
+    _, kinds = classify(graph)
+    found = [VIOLATION_TYPES[kind] if kind >= 0 else None for kind in kinds.tolist()]
+    assert found == [expected_kind(graph, u, v) for u, v in graph.edges()]
+    counts = violation_counts(kinds)
+    assert counts == {kind: found.count(kind) for kind in VIOLATION_TYPES}
+
+
+def test_consistent_graph_has_no_violations():
+    graph = nx.Graph()
+    graph.add_nodes_from([(0, {'color': 'red'}), (1, {'color': 'red'}), (2, {'color': 'blue'})])
+    graph.add_edges_from([(0, 1, {'sign': 1}), (1, 2, {'sign': -1}), (0, 2, {'sign': -1})])
+    _, kinds = classify(graph)
+    assert not any(violation_counts(kinds).values())
+
+
+@pytest.mark.parametrize('extension', ['csv', 'jsonl'])
+def test_report_lists_every_violation(tmp_path, extension):
+    graph = attributed_graph(4)
+    index, kinds = classify(graph)
+    filename = str(tmp_path / f'violations.{extension}')
+    write_violations(filename, 'color', index.nodes, index.node_values('color'), index.sources, index.targets,
+                     index.signs, kinds)
+    with open(filename, newline='') as f:
+        rows = [json.loads(line) for line in f] if extension == 'jsonl' else list(csv.DictReader(f))
+    expected = [(u, v) for (u, v), kind in zip(graph.edges(), kinds.tolist()) if kind >= 0]
+    assert [(int(row['source']), int(row['target'])) for row in rows] == expected
+    assert [row['type'] for row in rows] == [VIOLATION_TYPES[kind] for kind in kinds.tolist() if kind >= 0]
+    assert set(rows[0]) == {'type', 'source', 'target', 'sign', 'source_color', 'target_color'}
+
+
+@pytest.mark.parametrize('path', ['Assignment 2/graph_analysis.py', 'Assignment 3/graph_analysis.py'])
+def test_script_wrapper_answers_like_the_per_edge_rule(script, path):
+    graph_analysis = script(path)
+    for seed in range(30):
+        graph = attributed_graph(seed)
+        # Drop the violations of half the graphs, so both answers come up
+        if seed % 2:
+            graph.remove_edges_from([(u, v) for u, v in graph.edges() if expected_kind(graph, u, v)])
+        expected = all(expected_kind(graph, u, v) is None for u, v in graph.edges())
+        assert graph_analysis.is_graph_balanced_by_attributes(graph, 'color') is expected
+        assert graph_analysis.is_graph_balanced_by_attributes(GraphIndex(graph), 'color') is expected
@@ -0,0 +1,172 @@
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from common import auction_log, market
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+MARKET = os.path.join(ROOT, 'Assignment 4', 'market.gml')
+
+
+# Random market graph where every buyer can get a seller of its own
+def random_market(seed):
+    rng = np.random.default_rng(seed)
+    num_sellers = int(rng.integers(2, 10))
+    num_buyers = int(rng.integers(1, num_sellers + 1))
+    graph = nx.Graph()
+    graph.add_nodes_from((f"s{i}", {'bipartite': 0, 'price': int(rng.integers(0, 3))}) for i in range(num_sellers))
+    graph.add_nodes_from((f"b{i}", {'bipartite': 1}) for i in range(num_buyers))
+    for buyer in range(num_buyers):
+        for seller in set(rng.choice(num_sellers, int(rng.integers(1, num_sellers + 1))).tolist()) | {buyer}:
+            graph.add_edge(f"s{seller}", f"b{buyer}", valuation=int(rng.integers(0, 15)))
+    return graph
+
+
+def record(bids, filename):
+    """Record an auction; returns the prices, shown edges and ties of every round."""
+    recorder = auction_log.RoundRecorder(filename, bids)
+    rounds = []
+    for round_num, state in market.auction_rounds(bids):
+        recorder.record(round_num, state)
+        rounds.append((state.price_vector.tolist(), state.shown_edges().tolist(), sorted(state.tie_edge_ids().tolist())))
+    recorder.close()
+    return rounds
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_log_replays_every_round(tmp_path, seed):
+    bids = market.Market.from_graph(random_market(seed))
+    filename = str(tmp_path / 'rounds.jsonl')
+    rounds = record(bids, filename)
+    records = list(auction_log.read_log(filename))
+    header, events = records[0], records[1:]
+    assert header['sellers'] == bids.sellers and header['buyers'] == bids.buyers
+    assert header['valuations'] == bids.valuations.tolist()
+    assert len(events) == len(rounds)
+    prices = np.array(header['prices'])
+    shown = np.full(bids.num_buyers, -1)
+    for number, (event, (round_prices, round_shown, ties)) in enumerate(zip(events, rounds), 1):
+        assert event['round'] == number
+        prices[event['raised']] += 1
+        for buyer, edge in event['chosen']:
+            shown[buyer] = edge
+        assert prices.tolist() == round_prices and shown.tolist() == round_shown
+        assert sorted(event['ties']) == ties
+    assert [event['perfect'] for event in events] == [False] * (len(events) - 1) + [True]
+
+
+# Log of the market.gml auction, written once per test directory
+def market_log(tmp_path):
+    filename = str(tmp_path / 'market.rounds.jsonl')
+    if not os.path.exists(filename):
+        record(market.Market.read(MARKET), filename)
+    return filename
+
+
+def test_read_log_stops_at_the_end_mark(tmp_path):
+    filename = str(tmp_path / 'rounds.jsonl')
+    recorder = auction_log.RoundRecorder(filename, market.Market.read(MARKET))
+    recorder.close()
+    assert len(list(auction_log.read_log(filename))) == 1
+    assert len(list(auction_log.read_log(filename, follow=True))) == 1
+
+
+def test_following_reader_sees_the_rounds_as_they_are_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(auction_log, 'FOLLOW_INTERVAL', 0.01)
+    lines = open(market_log(tmp_path)).read().splitlines(keepends=True)
+    filename = tmp_path / 'following.jsonl'
+    filename.write_text('')
+
+    def write():
+        with open(filename, 'a') as f:
+            for line in lines:
+                # Every line in two halves, so the reader also meets partial lines
+                for part in (line[:len(line) // 2], line[len(line) // 2:]):
+                    f.write(part)
+                    f.flush()
+                    time.sleep(0.02)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    followed = list(auction_log.read_log(str(filename), follow=True))
+    writer.join()
+    assert followed == list(auction_log.read_log(market_log(tmp_path)))
+    assert followed[-1]['perfect'] and len(followed) == 5
+
+
+def test_renders_png_frames(tmp_path):
+    output = tmp_path / 'frame.png'
+    assert auction_log.render_log(market_log(tmp_path), str(output)) == 5
+    names = sorted(path.name for path in tmp_path.glob('frame_*.png'))
+    assert names == ['frame_final.png', 'frame_round1.png', 'frame_round2.png', 'frame_round3.png',
+                     'frame_round4.png']
+    assert all(path.read_bytes().startswith(b'\x89PNG') for path in tmp_path.glob('frame_*.png'))
+
+
+def test_renders_a_gif(tmp_path):
+    output = tmp_path / 'rounds.gif'
+    assert auction_log.render_log(market_log(tmp_path), str(output), fps=4) == 5
+    from PIL import Image
+    with Image.open(output) as image:
+        assert image.n_frames == 5
+
+
+def test_frame_shows_the_round(tmp_path):
+    records = auction_log.read_log(market_log(tmp_path))
+    frame = auction_log._Frame(next(records))
+    bids = market.Market.read(MARKET)
+    for (round_num, state), event in zip(market.auction_rounds(bids), records):
+        frame.update(event)
+        assert [text.get_text() for text in frame.price_texts] == [f"Price: {p}" for p in state.price_vector.tolist()]
+        labels = state.payoff_labels()
+        assert [text.get_text() for text in frame.buyer_texts] == [labels[buyer] for buyer in bids.buyers]
+        assert frame.title.get_text() == f"Round {round_num}: Market vs Buyer"
+        assert len(frame.highlight.get_segments()) == bids.num_buyers
+        assert len(frame.tie.get_segments()) == len(state.tie_edge_ids())
+
+
+def run(tmp_path, *args, market_file=MARKET, returncode=0):
+    shutil.copy(market_file, tmp_path / 'market.gml')
+    # TMPDIR inside the test directory, to see what the script leaves behind
+    (tmp_path / 'tmp').mkdir(exist_ok=True)
+    env = {**os.environ, 'TMPDIR': str(tmp_path / 'tmp')}
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'Assignment 4', 'market_strategy.py'), 'market.gml',
+                             *args], cwd=tmp_path, capture_output=True, text=True, timeout=300, env=env)
+    assert result.returncode == returncode, result.stderr
+    assert not list((tmp_path / 'tmp').iterdir())
+    (tmp_path / 'tmp').rmdir()
+    return result.stdout
+
+
+def test_script_interactive_save_writes_the_round_frames(tmp_path):
+    stdout = run(tmp_path, '--interactive', '--save', 'm.png')
+    assert stdout.count('---- Round') == 4 and 'Rendered 5 frames to m.png.' in stdout
+    for name in ('m_round1.png', 'm_round4.png', 'm_final.png'):
+        assert (tmp_path / name).exists()
+    # The round log was only a temporary file
+    assert sorted(path.name for path in tmp_path.iterdir() if not path.name.endswith('.png')) == ['market.gml', 'market.gml.cache']
+
+
+def test_script_records_and_animates(tmp_path):
+    stdout = run(tmp_path, '--record', 'log.jsonl', '--animate', 'm.gif')
+    assert 'Perfect match found:' in stdout
+    assert (tmp_path / 'm.gif').exists()
+    assert len(list(auction_log.read_log(str(tmp_path / 'log.jsonl')))) == 5
+
+
+def test_script_removes_the_temporary_log_when_the_market_cannot_clear(tmp_path):
+    graph = nx.Graph()
+    graph.add_nodes_from([('s0', {'bipartite': 0, 'price': 0}), ('s1', {'bipartite': 0, 'price': 0}),
+                          ('b0', {'bipartite': 1}), ('b1', {'bipartite': 1})])
+    graph.add_edges_from([('s0', 'b0', {'valuation': 3}), ('s0', 'b1', {'valuation': 4})])
+    nx.write_gml(graph, str(tmp_path / 'stuck.gml'))
+    stdout = run(tmp_path, '--animate', 'm.gif', market_file=tmp_path / 'stuck.gml', returncode=1)
+    assert stdout.startswith('Error:')
+    assert not (tmp_path / 'm.rounds.jsonl').exists()
@@ -0,0 +1,125 @@
+import itertools
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from common.balance import check_balance, check_balance_csr, estimate_frustration, is_graph_balanced
+from common.graph_cache import build_csr
+
+
+# Random signed graph: mostly two camps, with a few signs flipped in some of them
+def signed_graph(seed):
+    rng = np.random.default_rng(seed)
+    graph = nx.gnm_random_graph(int(rng.integers(2, 30)), int(rng.integers(0, 60)), seed=seed)
+    camp = rng.integers(0, 2, graph.number_of_nodes())
+    flips = rng.random() < 0.5
+    for u, v in graph.edges():
+        sign = 1 if camp[u] == camp[v] else -1
+        graph[u][v]['sign'] = -sign if flips and rng.random() < 0.1 else sign
+    return graph
+
+
+def csr_arrays(graph):
+    sources, targets = np.array(list(graph.edges()), dtype=np.int64).reshape(-1, 2).T
+    signs = np.array([sign for _, _, sign in graph.edges(data='sign')], dtype=np.int64)
+    return build_csr(graph.number_of_nodes(), sources, targets, directed=False) + (signs,)
+
+
+# Reference: in the signed double cover a positive edge joins (u, s) to (v, s)
+# and a negative one (u, s) to (v, 1 - s); the graph is balanced exactly when
+# no node shares a component with its own copy
+def balanced_by_double_cover(graph):
+    cover = nx.Graph()
+    cover.add_nodes_from((node, side) for node in graph for side in (0, 1))
+    for u, v, sign in graph.edges(data='sign', default=1):
+        for side in (0, 1):
+            cover.add_edge((u, side), (v, side if sign != -1 else 1 - side))
+    return not any(nx.has_path(cover, (node, 0), (node, 1)) for node in graph)
+
+
+def is_frustrated_cycle(graph, cycle):
+    edges = list(zip(cycle, cycle[1:] + cycle[:1]))
+    return (len(set(cycle)) == len(cycle) and all(graph.has_edge(u, v) for u, v in edges)
+            and sum(graph[u][v]['sign'] == -1 for u, v in edges) % 2 == 1)
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_balance_matches_the_double_cover(seed):
+    graph = signed_graph(seed)
+    balanced, witness = check_balance(graph)
+    assert balanced == balanced_by_double_cover(graph) == is_graph_balanced(graph)
+    if balanced:
+        camp_a, camp_b = witness
+        assert sorted(camp_a + camp_b) == sorted(graph)
+        side = {node: 0 for node in camp_a} | {node: 1 for node in camp_b}
+        for u, v, sign in graph.edges(data='sign'):
+            assert (side[u] != side[v]) == (sign == -1)
+    else:
+        assert is_frustrated_cycle(graph, witness)
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_csr_agrees_with_networkx_check(seed):
+    graph = signed_graph(seed)
+    balanced, witness = check_balance(graph)
+    csr_balanced, csr_witness = check_balance_csr(*csr_arrays(graph))
+    assert csr_balanced == balanced
+    if balanced:
+        for u, v, sign in graph.edges(data='sign'):
+            assert (csr_witness[u] != csr_witness[v]) == (sign == -1)
+    else:
+        assert is_frustrated_cycle(graph, witness)
+        assert is_frustrated_cycle(graph, csr_witness)
+
+
+def test_directed_graphs_are_checked_as_undirected():
+    graph = nx.DiGraph([(0, 1, {'sign': -1}), (1, 2, {'sign': -1}), (2, 0, {'sign': -1})])
+    balanced, cycle = check_balance(graph)
+    assert not balanced and sorted(cycle) == [0, 1, 2]
+
+
+def minimum_frustration(graph):
+    nodes = list(graph)
+    best = None
+    for sides in itertools.product((0, 1), repeat=len(nodes) - 1):
+        side = dict(zip(nodes, (0,) + sides))
+        count = sum((side[u] == side[v]) == (sign == -1) for u, v, sign in graph.edges(data='sign'))
+        best = count if best is None else min(best, count)
+    return best
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_frustration_flips_make_the_graph_balanced(seed):
+    graph = signed_graph(seed)
+    count, edges = estimate_frustration(graph, time_budget=5, seed=seed)
+    assert count == len(edges) == len(set(edges))
+    if check_balance(graph)[0]:
+        assert count == 0
+    flipped = graph.copy()
+    for u, v in edges:
+        flipped[u][v]['sign'] *= -1
+    assert check_balance(flipped)[0]
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_frustration_of_small_graphs_is_the_minimum(seed):
+    rng = np.random.default_rng(seed)
+    graph = nx.gnm_random_graph(8, int(rng.integers(4, 20)), seed=seed)
+    for u, v in graph.edges():
+        graph[u][v]['sign'] = int(rng.choice([-1, 1]))
+    count, _ = estimate_frustration(graph, time_budget=5, seed=seed)
+    assert count == minimum_frustration(graph)
+
+
+def test_negative_self_loop_is_always_frustrated():
+    graph = nx.Graph([(0, 1, {'sign': 1}), (1, 1, {'sign': -1}), (0, 0, {'sign': 1})])
+    assert estimate_frustration(graph, seed=0) == (1, [(1, 1)])
+
+
+def test_script_wrapper(script):
+    graph_analysis = script('Assignment 2/graph_analysis.py')
+    graph = nx.Graph([(0, 1, {'sign': -1}), (1, 2, {'sign': 1})])
+    assert graph_analysis.is_graph_balanced(graph)
+    graph.add_edge(0, 2, sign=1)
+    assert not graph_analysis.is_graph_balanced(graph)
@@ -0,0 +1,150 @@
+import csv
+import json
+import os
+import subprocess
+import sys
+
+import networkx as nx
+import pytest
+
+from common import batch, market
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+MARKET = os.path.join(ROOT, 'Assignment 4', 'market.gml')
+
+SCENARIOS = [
+    ('base', []),
+    ('dear', [('price', '0', None, 5)]),
+    ('keen', [('valuation', '1', '3', 20)]),
+    ('cut', [('remove_edge', '0', '3', None), ('remove_edge', '0', '4', None)]),
+    ('swap', [('remove_buyer', None, '5', None), ('valuation', '2', '9', 3), ('valuation', '0', '9', 1)]),
+    ('unknown', [('price', 'x', None, 1)]),
+    ('crowded', [('valuation', '2', '9', 3)]),
+]
+
+
+# The scenarios applied by hand
+def edited(name):
+    graph = nx.read_gml(MARKET)
+    if name == 'dear':
+        graph.nodes['0']['price'] = 5
+    elif name == 'keen':
+        graph.edges['1', '3']['valuation'] = 20
+    elif name == 'cut':
+        graph.remove_edges_from([('0', '3'), ('0', '4')])
+    elif name in ('swap', 'crowded'):
+        if name == 'swap':
+            graph.remove_node('5')
+        graph.add_node('9', bipartite=1)
+        graph.add_edge('2', '9', valuation=3)
+        if name == 'swap':
+            graph.add_edge('0', '9', valuation=1)
+    return graph
+
+
+def without_seconds(results):
+    return [{key: value for key, value in result.items() if key != 'seconds'} for result in results]
+
+
+@pytest.mark.parametrize('method', batch.METHODS)
+def test_scenarios_clear_like_the_edited_markets(method):
+    results = list(batch.clear_scenarios(nx.read_gml(MARKET), SCENARIOS, method))
+    assert [result['scenario'] for result in results] == [name for name, _ in SCENARIOS]
+    for (name, _), result in zip(SCENARIOS, results):
+        assert result['seconds'] >= 0
+        if name == 'unknown':
+            assert 'x' in result['error']
+            continue
+        if name == 'crowded':
+            assert 'error' in result   # four buyers, three sellers
+            continue
+        graph = edited(name)
+        expected = market.clear_market(graph) if method == 'rounds' else market.solve_market(graph, method)
+        assert result['prices'] == expected[0]
+        if method == 'rounds':
+            assert result['matching'] == expected[1]
+
+
+def test_base_market_is_left_alone():
+    graph = nx.read_gml(MARKET)
+    list(batch.clear_scenarios(graph, SCENARIOS))
+    assert nx.utils.graphs_equal(graph, nx.read_gml(MARKET))
+    assert dict(graph.nodes(data=True)) == dict(nx.read_gml(MARKET).nodes(data=True))
+
+
+def test_pool_keeps_the_input_order():
+    graph = nx.read_gml(MARKET)
+    serial = without_seconds(batch.clear_scenarios(graph, SCENARIOS * 3))
+    pooled = without_seconds(batch.clear_scenarios(graph, SCENARIOS * 3, processes=2, chunksize=2))
+    assert pooled == serial
+
+
+def write_scenarios(tmp_path):
+    jsonl, table = tmp_path / 'scenarios.jsonl', tmp_path / 'scenarios.csv'
+    with open(jsonl, 'w') as f:
+        for name, deltas in SCENARIOS[1:]:
+            f.write(json.dumps({'scenario': name, 'deltas': [dict(zip(('kind', 'seller', 'buyer', 'value'), delta))
+                                                           for delta in deltas]}) + '\n')
+    with open(table, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['scenario', 'kind', 'seller', 'buyer', 'value'])
+        for name, deltas in SCENARIOS[1:]:
+            writer.writerows([name, *('' if field is None else field for field in delta)] for delta in deltas)
+    return str(jsonl), str(table)
+
+
+def test_jsonl_and_csv_scenarios_read_the_same(tmp_path):
+    jsonl, table = write_scenarios(tmp_path)
+    graph = nx.read_gml(MARKET)
+    from_jsonl = without_seconds(batch.clear_scenarios(graph, batch.read_scenarios(jsonl)))
+    from_csv = without_seconds(batch.clear_scenarios(graph, batch.read_scenarios(table)))
+    assert from_jsonl == from_csv == without_seconds(batch.clear_scenarios(graph, SCENARIOS[1:]))
+
+
+def test_cli_streams_jsonl_results(tmp_path):
+    jsonl, _ = write_scenarios(tmp_path)
+    output = tmp_path / 'results.jsonl'
+    market_file = tmp_path / 'market.gml'
+    market_file.write_bytes(open(MARKET, 'rb').read())
+    result = subprocess.run([sys.executable, '-m', 'common.batch', str(market_file), jsonl, '--processes', '2',
+                             '--output', str(output)], cwd=ROOT, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    lines = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [line['scenario'] for line in lines] == [name for name, _ in SCENARIOS[1:]]
+    assert 'Cleared 4 of 6 scenarios' in result.stderr
+
+
+@pytest.mark.parametrize('delta, message', [
+    (('valuation', '0', '3', None), 'valuation delta needs value'),
+    (('remove_buyer', None, None, None), 'remove_buyer delta needs buyer'),
+    (('price', None, None, 2), 'price delta needs seller'),
+    (('raise', '0', '3', 1), "unknown delta kind 'raise'"),
+    (('price', '0', None, 'cheap'), "is not a number"),
+    (('valuation', '0', '1', 5), "buyer '1' is a seller"),
+    (('remove_edge', '0', '7', None), "buyer '7' not in market"),
+])
+def test_bad_deltas_are_reported_and_the_batch_goes_on(delta, message):
+    scenarios = [('before', []), ('bad', [delta]), ('after', [('price', '1', None, 2)])]
+    results = list(batch.clear_scenarios(nx.read_gml(MARKET), scenarios))
+    assert 'prices' in results[0] and 'prices' in results[2]
+    assert message in results[1]['error']
+
+
+def test_scenarios_leave_the_base_arrays_alone():
+    base = batch.BaseMarket.from_graph(nx.read_gml(MARKET))
+    arrays = [base.market.prices.copy(), base.market.valuations.copy(),
+              base.market.edge_sellers.copy(), base.market.edge_buyers.copy()]
+    list(batch.clear_scenarios(base, SCENARIOS))
+    for before, after in zip(arrays, [base.market.prices, base.market.valuations,
+                                      base.market.edge_sellers, base.market.edge_buyers]):
+        assert (before == after).all()
+    assert base.buyer_labels == ['3', '4', '5']
+
+
+def test_removed_buyer_can_bid_again():
+    graph = nx.read_gml(MARKET)
+    deltas = [('remove_buyer', None, '5', None), ('valuation', '2', '5', 9)]
+    result, = batch.clear_scenarios(graph, [('back', deltas)])
+    graph.remove_edges_from([('0', '5'), ('1', '5')])
+    graph.edges['2', '5']['valuation'] = 9
+    assert (result['prices'], result['matching']) == market.clear_market(graph)[:2]
@@ -0,0 +1,129 @@
+import json
+import os
+import subprocess
+import sys
+
+import networkx as nx
+import pytest
+
+from common import benchmark
+from common.market import clear_market
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def results(name, times):
+    return [{'benchmark': name, 'size': size, 'best': best, 'median': best, 'repeat': 1} for size, best in times]
+
+
+def test_scaling_exponents_are_log_log_slopes():
+    measured = (results('linear', [(10, 0.1), (100, 1.0), (1000, 10.0)]) +
+                results('quadratic', [(10, 0.01), (100, 1.0)]) +
+                results('single', [(10, 0.5)]) +
+                results('zero', [(10, 0.0), (100, 0.2)]))
+    exponents = benchmark.scaling_exponents(measured)
+    assert exponents['linear'] == pytest.approx(1)
+    assert exponents['quadratic'] == pytest.approx(2)
+    # One size, or one size left after dropping a zero time, gives no slope
+    assert set(exponents) == {'linear', 'quadratic'}
+
+
+def test_compare_sorts_changes_beyond_the_tolerance():
+    baseline = {'results': results('a', [(10, 1.0), (100, 1.0), (1000, 1.0)]) + results('b', [(10, 0.001)])}
+    measured = results('a', [(10, 1.2), (100, 1.3), (1000, 0.7)]) + results('b', [(10, 0.004)]) + \
+        results('new', [(10, 1.0)])
+    comparison = benchmark.compare(measured, baseline, tolerance=0.25)
+    assert [(entry['benchmark'], entry['size'], entry['status']) for entry in comparison] == [
+        ('a', 10, 'same'), ('a', 100, 'regression'), ('a', 1000, 'improvement'),
+        ('b', 10, 'same'),   # four times slower, but within the noise floor
+    ]
+    assert comparison[1]['ratio'] == pytest.approx(1.3)
+
+
+def test_inputs_are_balanced_graphs_and_clearable_markets(tmp_path):
+    inputs = benchmark.Inputs(200, str(tmp_path), seed=3)
+    graph = inputs.graph
+    assert graph.number_of_nodes() == 200 and graph.number_of_edges() > 0
+    assert nx.utils.graphs_equal(nx.read_gml(inputs.random_file), graph)
+    assert benchmark.graph_analysis.is_graph_balanced(inputs.signed_graph)
+    assert nx.utils.graphs_equal(nx.read_gml(inputs.signed_file), inputs.signed_graph)
+    market = inputs.market
+    assert market.num_sellers == market.num_buyers == 200
+    prices, matching, _ = clear_market(market)
+    assert len(set(matching.values())) == 200
+
+
+def test_attribute_balance_times_the_wrapper_on_an_index_built_once(tmp_path, monkeypatch):
+    inputs = benchmark.Inputs(200, str(tmp_path), seed=3)
+    call = benchmark.BENCHMARKS['attribute_balance'][0](inputs)
+    # The edge arrays and the colour column exist before the timed call, which checks the arrays of that index
+    assert '_edges' in vars(inputs.index) and 'color' in inputs.index._node_columns
+    checked = []
+    violations = benchmark.graph_analysis.attribute_violations
+    monkeypatch.setattr(benchmark.graph_analysis, 'attribute_violations',
+                        lambda codes, sources, *rest: checked.append(sources) or violations(codes, sources, *rest))
+    assert call() is True
+    assert checked[0] is inputs.index.sources
+    monkeypatch.undo()
+    node = next(iter(inputs.signed_graph))
+    inputs.signed_graph.nodes[node]['color'] = 'r' if inputs.signed_graph.nodes[node]['color'] == 'g' else 'g'
+    inputs.index._node_columns.clear()
+    assert benchmark.graph_analysis.is_graph_balanced_by_attributes(inputs.index, 'color') is False
+
+
+def test_every_benchmark_runs_at_a_small_scale(capsys):
+    measured = benchmark.run_benchmarks(list(benchmark.BENCHMARKS), scale=0.005, repeat=2, seed=1)
+    assert {result['benchmark'] for result in measured} == set(benchmark.BENCHMARKS)
+    for result in measured:
+        assert 0 <= result['best'] <= result['median'] and result['repeat'] == 2
+    assert len(capsys.readouterr().out.splitlines()) == len(measured)
+
+
+def run(tmp_path, *args):
+    return subprocess.run([sys.executable, '-m', 'common.benchmark', '--only', 'market_rounds,balance',
+                           '--scale', '0.05', '--repeat', '1', *args], cwd=ROOT, capture_output=True, text=True,
+                          timeout=300)
+
+
+def test_cli_saves_a_baseline_and_flags_regressions(tmp_path):
+    baseline = str(tmp_path / 'baseline.json')
+    result = run(tmp_path, '--baseline', baseline, '--save_baseline')
+    assert result.returncode == 0, result.stderr
+    with open(baseline) as f:
+        report = json.load(f)
+    assert {entry['benchmark'] for entry in report['results']} == {'market_rounds', 'balance'}
+    assert set(report['scaling']) == {'market_rounds', 'balance'}
+
+    # A baseline a thousand times faster: everything above the noise floor is a regression
+    faster = str(tmp_path / 'faster.json')
+    with open(faster, 'w') as f:
+        json.dump({**report, 'results': [{**entry, 'best': entry['best'] / 1000} for entry in report['results']]}, f)
+    output = str(tmp_path / 'results.json')
+    result = run(tmp_path, '--baseline', faster, '--output', output)
+    assert result.returncode == 1
+    with open(output) as f:
+        compared = json.load(f)['comparison']
+    assert len(compared) == len(report['results'])
+    slow = [entry for entry in compared if entry['best'] >= 2 * benchmark.NOISE_FLOOR]
+    assert slow and all(entry['status'] == 'regression' for entry in slow)
+    assert f"regressions in {len(compared)} comparisons" in result.stdout
+
+
+def test_zero_baseline_is_compared_against_the_noise_floor(tmp_path):
+    comparison = benchmark.compare(results('a', [(10, 0.1), (100, 0.001)]),
+                                   {'results': results('a', [(10, 0.0), (100, 0.0)])})
+    assert [entry['status'] for entry in comparison] == ['regression', 'same']
+    assert [entry['ratio'] for entry in comparison] == pytest.approx([0.1 / benchmark.NOISE_FLOOR, 0.2])
+
+    baseline = str(tmp_path / 'zero.json')
+    with open(baseline, 'w') as f:
+        json.dump({'results': results('balance', [(50, 0.0), (500, 0.0), (5000, 0.0)])}, f)
+    result = run(tmp_path, '--baseline', baseline)
+    assert result.returncode == 1, result.stderr
+    assert 'regression: balance n=5000 0.0000s' in result.stdout
+
+
+def test_cli_rejects_unknown_benchmarks():
+    result = subprocess.run([sys.executable, '-m', 'common.benchmark', '--only', 'nothing'], cwd=ROOT,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 2 and 'unknown benchmarks: nothing' in result.stderr
@@ -0,0 +1,54 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from common.bfs import bfs_many, connected_component_labels, direction_optimizing_bfs
+from common.graph_cache import build_csr
+
+
+def random_graph(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 300))
+    # Dense enough in some cases for the bottom-up steps to run
+    return nx.gnm_random_graph(n, int(rng.integers(0, 4 * n)), seed=seed, directed=bool(seed % 3 == 0))
+
+
+def csr(graph):
+    sources, targets = np.array(list(graph.edges()), dtype=np.int64).reshape(-1, 2).T
+    return build_csr(graph.number_of_nodes(), sources, targets, graph.is_directed())[:2]
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_distances_and_parents_match_networkx(seed):
+    graph = random_graph(seed)
+    offsets, neighbors = csr(graph)
+    source = seed % graph.number_of_nodes()
+    distances, parents = direction_optimizing_bfs(offsets, neighbors, source, graph.is_directed())
+    expected = nx.single_source_shortest_path_length(graph, source)
+    assert {node: d for node, d in enumerate(distances.tolist()) if d >= 0} == expected
+    for node, parent in enumerate(parents.tolist()):
+        if node == source:
+            assert parent == source
+        elif node in expected:
+            assert graph.has_edge(parent, node) and distances[parent] == distances[node] - 1
+        else:
+            assert parent == -1
+
+
+def test_bfs_many_rows_match_single_runs():
+    graph = random_graph(7)
+    offsets, neighbors = csr(graph)
+    sources = [0, 3, 5]
+    distances, parents = bfs_many(offsets, neighbors, sources)
+    for i, source in enumerate(sources):
+        single = direction_optimizing_bfs(offsets, neighbors, source)
+        assert np.array_equal(distances[i], single[0]) and np.array_equal(parents[i], single[1])
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_component_labels_match_networkx(seed):
+    graph = random_graph(seed).to_undirected()
+    sources, targets = np.array(list(graph.edges()), dtype=np.int64).reshape(-1, 2).T
+    labels = connected_component_labels(graph.number_of_nodes(), sources, targets)
+    for component in nx.connected_components(graph):
+        assert set(labels[list(component)].tolist()) == {min(component)}
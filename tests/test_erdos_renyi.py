@@ -0,0 +1,99 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from common import graph_cache
+
+SCRIPT = 'Assignment 1 (Graph)/erdos_renyi_graph.py'
+
+
+def edge_list(script, n, p, seed, chunk_size=1 << 12):
+    chunks = list(script.erdos_renyi_edges(n, p, seed, chunk_size))
+    if not chunks:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate([w for w, _ in chunks]), np.concatenate([v for _, v in chunks])
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_edges_are_distinct_pairs_below_the_diagonal(script, seed):
+    sources, targets = edge_list(script(SCRIPT), 500, 0.05, seed, chunk_size=997)
+    assert (sources >= 0).all() and (sources < targets).all() and (targets < 500).all()
+    pairs = targets * (targets - 1) // 2 + sources
+    assert (np.diff(pairs) > 0).all()
+
+
+def test_edge_count_follows_the_binomial(script):
+    module = script(SCRIPT)
+    n, p = 2000, 0.01
+    expected = p * n * (n - 1) / 2
+    std = np.sqrt(expected * (1 - p))
+    counts = [len(edge_list(module, n, p, seed)[0]) for seed in range(5)]
+    assert abs(np.mean(counts) - expected) < 3 * std
+
+
+def test_pairs_are_chosen_uniformly(script):
+    module = script(SCRIPT)
+    n, p = 30, 0.3
+    hits = np.zeros((n, n))
+    runs = 400
+    for seed in range(runs):
+        sources, targets = edge_list(module, n, p, seed)
+        hits[sources, targets] += 1
+    frequencies = hits[np.tril_indices(n, -1)[::-1]] / runs
+    assert abs(frequencies.mean() - p) < 0.01
+    assert np.abs(frequencies - p).max() < 5 * np.sqrt(p * (1 - p) / runs)
+
+
+def test_seed_and_chunk_size_do_not_change_the_graph(script):
+    module = script(SCRIPT)
+    first = edge_list(module, 300, 0.1, 7)
+    for chunk_size in (1, 50, 1 << 20):
+        again = edge_list(module, 300, 0.1, 7, chunk_size)
+        assert np.array_equal(first[0], again[0]) and np.array_equal(first[1], again[1])
+    other = edge_list(module, 300, 0.1, 8)
+    assert not np.array_equal(first[1], other[1])
+
+
+def test_probability_one_gives_the_complete_graph(script):
+    sources, targets = edge_list(script(SCRIPT), 40, 1.0, 0)
+    graph = nx.Graph(list(zip(sources.tolist(), targets.tolist())))
+    assert nx.utils.graphs_equal(graph, nx.complete_graph(40))
+
+
+def test_gml_and_edge_list_outputs_hold_the_same_graph(script, tmp_path):
+    module = script(SCRIPT)
+    gml, edges = str(tmp_path / 'random.gml'), str(tmp_path / 'random.edges')
+    module.create_random_graph_in_gml(200, 2.0, gml, seed=3)
+    module.create_random_graph_in_gml(200, 2.0, edges, seed=3)
+    from_gml = nx.read_gml(gml)
+    from_edges = graph_cache.read_graph(edges)
+    assert list(from_gml) == [str(node) for node in range(200)]
+    assert list(from_edges) == list(range(200))
+    assert [(int(u), int(v)) for u, v in from_gml.edges()] == list(from_edges.edges())
+    assert from_gml.number_of_edges() > 0
+
+
+def test_edge_list_round_trip(tmp_path):
+    filename = str(tmp_path / 'graph.edges')
+    chunks = [(np.array([0, 1]), np.array([1, 2])), (np.array([0]), np.array([3]))]
+    assert graph_cache.write_edge_list(filename, 5, chunks) == 3
+    arrays = graph_cache.read_edge_list_arrays(filename)
+    assert arrays['labels'].tolist() == [0, 1, 2, 3, 4]
+    assert arrays['sources'].tolist() == [0, 1, 0] and arrays['targets'].tolist() == [1, 2, 3]
+    graph = graph_cache.read_graph(filename)
+    assert sorted(graph.edges()) == [(0, 1), (0, 3), (1, 2)] and 4 in graph
+    assert sorted(graph_cache.read_graph(filename).edges()) == [(0, 1), (0, 3), (1, 2)]
+
+
+def test_empty_edge_list(tmp_path):
+    filename = str(tmp_path / 'empty.edges')
+    graph_cache.write_edge_list(filename, 3, [])
+    graph = graph_cache.read_graph(filename)
+    assert list(graph) == [0, 1, 2] and graph.number_of_edges() == 0
+
+
+def test_edge_list_with_bad_magic_raises(tmp_path):
+    filename = tmp_path / 'bad.edges'
+    filename.write_bytes(b'NOTEDGES' + bytes(8))
+    with pytest.raises(nx.NetworkXError):
+        graph_cache.read_edge_list_arrays(str(filename))
@@ -0,0 +1,93 @@
+import math
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from common import gml_stream
+
+
+def attribute_value(rng):
+    kind = rng.integers(4)
+    if kind == 0:
+        return int(rng.integers(-1000, 1000))
+    if kind == 1:
+        return float(rng.choice([rng.normal() * 10.0 ** rng.integers(-8, 20), math.inf, -math.inf, 0.5, 1e22]))
+    if kind == 2:
+        return f"v{rng.integers(100)} & \"x\" é"
+    return ['red', 'blue', 'green'][rng.integers(3)]
+
+
+def random_graph(seed):
+    rng = np.random.default_rng(seed)
+    graph = nx.gnm_random_graph(int(rng.integers(1, 25)), int(rng.integers(0, 50)), seed=seed,
+                                directed=bool(seed % 2))
+    graph = nx.relabel_nodes(graph, {node: f"node {node}" for node in graph})
+    graph.graph['name'] = f"graph {seed}"
+    for _, data in graph.nodes(data=True):
+        if rng.random() < 0.8:
+            data['value'] = attribute_value(rng)
+        data['color'] = ['red', 'blue'][rng.integers(2)]
+    for _, _, data in graph.edges(data=True):
+        data['weight'] = attribute_value(rng)
+    return graph
+
+
+def assert_same_graph(ours, theirs):
+    assert type(ours) is type(theirs)
+    assert ours.graph == theirs.graph
+    assert list(ours.nodes(data=True)) == list(theirs.nodes(data=True))
+    assert list(ours.edges(data=True)) == list(theirs.edges(data=True))
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_writes_the_same_text_as_networkx(seed, tmp_path):
+    graph = random_graph(seed)
+    gml_stream.write_gml(graph, tmp_path / 'ours.gml')
+    nx.write_gml(graph, tmp_path / 'theirs.gml')
+    assert (tmp_path / 'ours.gml').read_text() == (tmp_path / 'theirs.gml').read_text()
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_round_trip_reads_like_networkx(seed, tmp_path):
+    filename = str(tmp_path / 'graph.gml')
+    gml_stream.write_gml(random_graph(seed), filename)
+    assert_same_graph(gml_stream.read_gml(filename), nx.read_gml(filename))
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_reads_networkx_files_like_networkx(seed, tmp_path):
+    filename = str(tmp_path / 'graph.gml')
+    nx.write_gml(random_graph(seed), filename)
+    assert_same_graph(gml_stream.read_gml(filename), nx.read_gml(filename))
+    assert_same_graph(gml_stream.read_gml(filename, label='id'), nx.read_gml(filename, label='id'))
+
+
+def test_multigraph_keys_survive(tmp_path):
+    graph = nx.MultiGraph([(0, 1), (0, 1), (1, 2)])
+    graph.edges[0, 1, 1]['sign'] = -1
+    filename = str(tmp_path / 'multi.gml')
+    gml_stream.write_gml(graph, filename)
+    assert_same_graph(gml_stream.read_gml(filename), nx.read_gml(filename))
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_arrays_list_the_same_nodes_and_edges(seed, tmp_path):
+    filename = str(tmp_path / 'graph.gml')
+    gml_stream.write_gml(random_graph(seed), filename)
+    graph = nx.read_gml(filename)
+    arrays = gml_stream.read_gml_arrays(filename, node_attributes=['color'])
+    assert arrays['labels'] == list(graph)
+    assert arrays['directed'] == graph.is_directed()
+    ids = {node: i for i, node in enumerate(graph)}
+    assert [(ids[u], ids[v]) for u, v in graph.edges()] == list(zip(arrays['sources'].tolist(),
+                                                                     arrays['targets'].tolist()))
+    codes, categories = arrays['node_attrs']['color']
+    assert [categories[code] for code in codes.tolist()] == [color for _, color in graph.nodes(data='color')]
+
+
+def test_malformed_file_raises(tmp_path):
+    filename = tmp_path / 'bad.gml'
+    filename.write_text('graph [\n  node [\n    id 0\n')
+    with pytest.raises(nx.NetworkXError):
+        gml_stream.read_gml(str(filename))
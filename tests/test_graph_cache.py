@@ -0,0 +1,141 @@
+import math
+import os
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from common import graph_cache, gml_stream
+
+
+def random_graph(seed):
+    rng = np.random.default_rng(seed)
+    graph = nx.gnm_random_graph(int(rng.integers(1, 30)), int(rng.integers(0, 60)), seed=seed,
+                                directed=bool(seed % 2))
+    graph.graph['name'] = f"graph {seed}"
+    for _, data in graph.nodes(data=True):
+        if rng.random() < 0.7:
+            data['size'] = int(rng.integers(-50, 50))
+        data['color'] = ['red', 'blue', 'green'][rng.integers(3)]
+    for _, _, data in graph.edges(data=True):
+        data['weight'] = round(float(rng.normal()), 4)
+        if rng.random() < 0.5:
+            data['sign'] = ['+', '-'][rng.integers(2)]
+    return graph
+
+
+def assert_same_graph(ours, theirs):
+    assert type(ours) is type(theirs)
+    assert ours.graph == theirs.graph
+    assert list(ours.nodes(data=True)) == list(theirs.nodes(data=True))
+    assert list(ours.edges(data=True)) == list(theirs.edges(data=True))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_read_graph_matches_networkx_with_and_without_cache(seed, tmp_path):
+    filename = str(tmp_path / 'graph.gml')
+    nx.write_gml(random_graph(seed), filename)
+    expected = nx.read_gml(filename)
+    assert_same_graph(graph_cache.read_graph(filename), expected)
+    assert os.path.isdir(graph_cache.cache_path(filename))
+    assert_same_graph(graph_cache.read_graph(filename), expected)
+    assert_same_graph(graph_cache.read_graph(filename, use_cache=False), expected)
+
+
+def test_second_load_is_memory_mapped(tmp_path):
+    filename = str(tmp_path / 'graph.gml')
+    nx.write_gml(random_graph(3), filename)
+    first = graph_cache.load_graph_arrays(filename)
+    assert not isinstance(first['sources'], np.memmap)
+    second = graph_cache.load_graph_arrays(filename)
+    assert isinstance(second['sources'], np.memmap)
+    assert isinstance(second['offsets'], np.memmap)
+
+
+def test_changed_file_invalidates_the_cache(tmp_path):
+    filename = str(tmp_path / 'graph.gml')
+    nx.write_gml(random_graph(1), filename)
+    graph_cache.read_graph(filename)
+    nx.write_gml(random_graph(2), filename)
+    assert_same_graph(graph_cache.read_graph(filename), nx.read_gml(filename))
+
+
+def test_touched_file_keeps_the_cache(tmp_path):
+    filename = str(tmp_path / 'graph.gml')
+    nx.write_gml(random_graph(4), filename)
+    graph_cache.read_graph(filename)
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert isinstance(graph_cache.load_graph_arrays(filename)['sources'], np.memmap)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_csr_lists_every_neighbour(seed, tmp_path):
+    filename = str(tmp_path / 'graph.gml')
+    nx.write_gml(random_graph(seed), filename)
+    graph = nx.read_gml(filename)
+    arrays = graph_cache.load_graph_arrays(filename)
+    labels = list(arrays['labels'])
+    offsets, neighbors = arrays['offsets'], arrays['neighbors']
+    for i, node in enumerate(labels):
+        found = sorted(labels[j] for j in neighbors[offsets[i]:offsets[i + 1]].tolist())
+        assert found == sorted(graph.successors(node) if graph.is_directed() else graph.neighbors(node))
+
+
+def test_nested_attributes_fall_back_to_gml(tmp_path):
+    graph = nx.Graph([(0, 1)])
+    graph.nodes[0]['position'] = {'x': 1, 'y': 2}
+    filename = str(tmp_path / 'nested.gml')
+    nx.write_gml(graph, filename)
+    assert_same_graph(graph_cache.read_graph(filename), nx.read_gml(filename))
+
+
+def exact_graph(seed):
+    rng = np.random.default_rng(seed)
+    graph = nx.path_graph(int(rng.integers(2, 30)))
+    for node, data in graph.nodes(data=True):
+        kind = rng.integers(5)
+        if kind == 0:
+            data['value'] = int(rng.integers(1 << 62)) * 3      # beyond int64
+        elif kind == 1:
+            data['value'] = (1 << 53) + int(rng.integers(1000))   # not exact as a float
+        elif kind == 2:
+            data['value'] = float(rng.choice([math.nan, math.inf, rng.normal()]))
+        elif kind == 3:
+            data['value'] = int(rng.integers(-10, 10))
+        data['count'] = (1 << 60) + node
+    for _, _, data in graph.edges(data=True):
+        data['weight'] = float(rng.choice([math.nan, 0.1, -2.5]))
+    return graph
+
+
+def same_value(a, b):
+    return a == b or (isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_values_stay_exact_through_the_cache(seed, tmp_path):
+    filename = str(tmp_path / 'exact.gml')
+    gml_stream.write_gml(exact_graph(seed), filename)
+    expected = nx.read_gml(filename)
+    for graph in (graph_cache.read_graph(filename), graph_cache.read_graph(filename)):
+        assert list(graph) == list(expected)
+        for node, data in graph.nodes(data=True):
+            assert data.keys() == expected.nodes[node].keys()
+            for name, value in data.items():
+                assert same_value(value, expected.nodes[node][name])
+                assert type(value) is type(expected.nodes[node][name])
+        for (_, _, weight), (_, _, other) in zip(graph.edges(data='weight'), expected.edges(data='weight')):
+            assert same_value(weight, other)
+
+
+def test_column_array_masks_missing_values(tmp_path):
+    graph = nx.path_graph(3)
+    graph.nodes[0]['size'] = 1 << 62
+    graph.nodes[2]['size'] = 5
+    filename = str(tmp_path / 'masked.gml')
+    gml_stream.write_gml(graph, filename)
+    arrays = graph_cache.load_graph_arrays(filename)
+    column = arrays['node_attrs']['size']
+    assert arrays['kinds']['node']['size'] == 'int'
+    assert graph_cache.column_values(column, 'int') == [1 << 62, None, 5]
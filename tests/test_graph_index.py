@@ -0,0 +1,82 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from common.graph_cache import read_graph_and_arrays
+from common.graph_index import GraphIndex, color_signs
+
+
+def labelled_graph(directed=False):
+    graph = nx.gnm_random_graph(30, 60, seed=3, directed=directed)
+    graph = nx.relabel_nodes(graph, {node: f"n{node}" for node in graph})
+    for i, (node, data) in enumerate(graph.nodes(data=True)):
+        if i % 4:
+            data['color'] = ['red', 'blue'][i % 2]
+    for i, (_, _, data) in enumerate(graph.edges(data=True)):
+        data['sign'] = -1 if i % 3 == 0 else 1
+    return graph
+
+
+def test_arrays_follow_the_graph_order():
+    graph = labelled_graph()
+    index = GraphIndex(graph)
+    assert index.nodes == list(graph) and index.num_nodes == 30
+    assert all(index.nodes[index.ids[node]] == node for node in graph)
+    assert [(index.nodes[u], index.nodes[v]) for u, v in zip(index.sources, index.targets)] == list(graph.edges())
+    assert index.signs.tolist() == [sign for _, _, sign in graph.edges(data='sign')]
+    assert index.degrees.tolist() == [graph.degree(node) for node in graph]
+
+
+def test_csr_lists_every_neighbour():
+    for directed in (False, True):
+        graph = labelled_graph(directed)
+        index = GraphIndex(graph)
+        for i, node in enumerate(index.nodes):
+            found = sorted(index.nodes[j] for j in index.neighbors[index.offsets[i]:index.offsets[i + 1]])
+            assert found == sorted(graph.successors(node) if directed else graph.neighbors(node))
+
+
+def test_arrays_are_built_once():
+    graph = labelled_graph()
+    index = GraphIndex(graph)
+    sources, degrees, offsets, colors = index.sources, index.degrees, index.offsets, index.node_values('color')
+    graph.add_edge('n0', 'new', sign=-1)
+    graph.nodes['n0']['color'] = 'green'
+    assert len(index.sources) == len(sources) and index.degrees is degrees and index.offsets is offsets
+    assert index.node_values('color') is colors and index.num_nodes == 30
+
+
+def test_node_codes_and_colors():
+    graph = labelled_graph()
+    index = GraphIndex(graph)
+    codes, categories = index.node_codes('color')
+    assert categories == ['blue', 'red']
+    assert [categories[code] if code >= 0 else None for code in codes.tolist()] == [
+        color for _, color in graph.nodes(data='color')]
+    assert index.node_colors() == {node: color for node, color in graph.nodes(data='color') if color}
+
+
+@pytest.mark.parametrize('cached', [False, True])
+def test_index_from_cached_arrays_matches_the_graph_walk(tmp_path, cached):
+    graph = labelled_graph()
+    for u, v, sign in graph.edges(data='sign'):
+        graph.edges[u, v]['color'] = 'r' if sign == -1 else 'g'
+    filename = str(tmp_path / 'graph.gml')
+    nx.write_gml(graph, filename)
+    if cached:
+        read_graph_and_arrays(filename)
+    loaded, arrays = read_graph_and_arrays(filename)
+    assert isinstance(arrays['sources'], np.memmap) == cached
+
+    walked = GraphIndex(nx.read_gml(filename))
+    for u, v, data in walked.graph.edges(data=True):
+        data['sign'] = -1 if data.get('color') == 'r' else 1
+    index = GraphIndex(loaded, arrays, color_signs(arrays))
+    assert index.nodes == walked.nodes
+    assert index.sources.tolist() == walked.sources.tolist()
+    assert index.targets.tolist() == walked.targets.tolist()
+    assert index.signs.tolist() == walked.signs.tolist()
+    assert index.node_values('color') == walked.node_values('color')
+    assert index.node_values('missing') == [None] * 30
+    assert index.offsets.tolist() == walked.offsets.tolist()
+    assert index.neighbors.tolist() == walked.neighbors.tolist()
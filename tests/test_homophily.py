@@ -0,0 +1,90 @@
+import itertools
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from common import homophily
+
+
+def colored_graph(seed, n=40):
+    rng = np.random.default_rng(seed)
+    graph = nx.gnm_random_graph(n, int(rng.integers(n, 3 * n)), seed=seed)
+    colors = {node: ['red', 'blue', 'green'][rng.integers(3)] for node in graph if rng.random() < 0.9}
+    return graph, colors
+
+
+def edge_arrays(graph):
+    return np.array(list(graph.edges()), dtype=np.int64).reshape(-1, 2).T
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_counts_leave_out_uncolored_nodes(seed):
+    graph, colors = colored_graph(seed)
+    sources, targets = edge_arrays(graph)
+    result = homophily.homophily_test(list(graph), sources, targets, colors, permutations=0)
+    colored = [(u, v) for u, v in graph.edges() if u in colors and v in colors]
+    same = sum(colors[u] == colors[v] for u, v in colored)
+    assert (result['same'], result['different']) == (same, len(colored) - same)
+    assert result['fraction'] == pytest.approx(same / len(colored))
+    assert result['categories'] == sorted(set(colors.values()))
+    assert result['p_value'] is None
+
+
+def all_shuffles(codes, sources, targets):
+    return [np.count_nonzero(np.array(p)[sources] == np.array(p)[targets])
+            for p in itertools.permutations(codes.tolist())]
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_expected_fraction_is_the_mean_over_all_shuffles(seed):
+    rng = np.random.default_rng(seed)
+    codes = rng.integers(3, size=7)
+    graph = nx.gnm_random_graph(7, 10, seed=seed)
+    graph.add_edge(2, 2)
+    sources, targets = edge_arrays(graph)
+    counts = all_shuffles(codes, sources, targets)
+    assert homophily.expected_same_fraction(codes, sources, targets) == pytest.approx(np.mean(counts) / len(sources))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_p_value_matches_the_exact_permutation_distribution(seed):
+    rng = np.random.default_rng(seed)
+    codes = rng.integers(2, size=8)
+    graph = nx.gnm_random_graph(8, 12, seed=seed)
+    sources, targets = edge_arrays(graph)
+    observed = homophily.same_color_count(codes, sources, targets)
+    exact = np.mean(np.array(all_shuffles(codes, sources, targets)) >= observed)
+    p_value = homophily.permutation_p_value(codes, sources, targets, observed, permutations=4000, seed=seed)
+    assert abs(p_value - exact) < 0.03
+
+
+def test_segregated_colors_are_significant():
+    graph = nx.disjoint_union(nx.complete_graph(15), nx.complete_graph(15))
+    graph.add_edge(0, 15)
+    colors = {node: 'red' if node < 15 else 'blue' for node in graph}
+    sources, targets = edge_arrays(graph)
+    result = homophily.homophily_test(list(graph), sources, targets, colors, permutations=500, seed=1)
+    assert result['p_value'] == pytest.approx(1 / 501)
+    assert result['fraction'] > result['expected']
+
+
+def test_pool_gives_the_same_p_value_as_one_process():
+    graph, colors = colored_graph(3, n=200)
+    sources, targets = edge_arrays(graph)
+    serial = homophily.homophily_test(list(graph), sources, targets, colors, permutations=300, processes=1, seed=5)
+    pooled = homophily.homophily_test(list(graph), sources, targets, colors, permutations=300, processes=2, seed=5)
+    assert pooled['p_value'] == serial['p_value']
+    assert 1 / 301 <= serial['p_value'] <= 1
+
+
+def test_read_colors_takes_the_node_attribute(tmp_path):
+    graph = nx.path_graph(4)
+    graph.nodes[0]['color'] = 'red'
+    graph.nodes[2]['color'] = 'blue'
+    graph.nodes[3]['shade'] = 'dark'
+    filename = str(tmp_path / 'colors.gml')
+    nx.write_gml(graph, filename)
+    assert homophily.read_colors(filename) == {'0': 'red', '2': 'blue'}
+    assert homophily.read_colors(filename, 'shade') == {'3': 'dark'}
+    assert homophily.read_colors(filename, 'missing') == {}
@@ -0,0 +1,90 @@
+import os
+import time
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from common import layout
+
+
+def index_edges(graph):
+    index = {node: i for i, node in enumerate(graph)}
+    edges = np.array([(index[u], index[v]) for u, v in graph.edges()], dtype=np.int64).reshape(-1, 2)
+    return edges[:, 0], edges[:, 1]
+
+
+def test_small_graphs_use_the_seeded_spring_layout(tmp_path):
+    graph = nx.karate_club_graph()
+    pos = layout.graph_layout(graph, directory=None)
+    expected = nx.spring_layout(graph, seed=layout.SEED)
+    for node in graph:
+        assert np.allclose(pos[node], expected[node])
+
+
+def test_layouts_are_served_from_the_cache(tmp_path):
+    graph = nx.les_miserables_graph()
+    first = layout.graph_layout(graph, directory=str(tmp_path))
+    files = os.listdir(tmp_path)
+    assert len(files) == 1 and files[0] == layout.graph_key(list(graph), *index_edges(graph)) + '.npy'
+
+    # A planted file under the graph's key is what comes back
+    planted = np.arange(2 * len(graph), dtype=float).reshape(-1, 2)
+    np.save(tmp_path / files[0], planted)
+    second = layout.graph_layout(graph, directory=str(tmp_path))
+    assert [tuple(second[node]) for node in graph] == [tuple(row) for row in planted]
+    assert not np.allclose(first[next(iter(graph))], planted[0])
+
+
+def test_a_different_graph_gets_a_different_key():
+    graph = nx.path_graph(5)
+    key = layout.graph_key(list(graph), *index_edges(graph))
+    graph.add_edge(0, 4)
+    assert layout.graph_key(list(graph), *index_edges(graph)) != key
+    assert layout.graph_key([1, 0, 2, 3, 4], *index_edges(nx.path_graph(5))) != key
+
+
+def test_trimming_drops_the_least_recently_used_layouts(tmp_path):
+    graphs = [nx.path_graph(n) for n in range(10, 14)]
+    for i, graph in enumerate(graphs):
+        layout.graph_layout(graph, directory=str(tmp_path))
+        path = tmp_path / (layout.graph_key(list(graph), *index_edges(graph)) + '.npy')
+        os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+    # Reading the oldest one marks it as recently used
+    layout.graph_layout(graphs[0], directory=str(tmp_path))
+    size = os.path.getsize(tmp_path / (layout.graph_key(list(graphs[3]), *index_edges(graphs[3])) + '.npy'))
+    layout._trim_cache(str(tmp_path), 2 * size + 200)
+    kept = set(os.listdir(tmp_path))
+    assert kept == {layout.graph_key(list(graph), *index_edges(graph)) + '.npy' for graph in (graphs[0], graphs[3])}
+
+
+def test_mesh_repulsion_approximates_the_exact_sum():
+    rng = np.random.default_rng(0)
+    xy = rng.random((3000, 2))
+    k = 1 / np.sqrt(len(xy))
+    exact = layout._repulsion_exact(xy, k)
+    mesh = layout._repulsion_mesh(xy, k)
+    error = np.linalg.norm(mesh - exact, axis=1) / np.linalg.norm(exact, axis=1)
+    assert np.median(error) < 0.1
+
+
+def test_multilevel_layout_keeps_neighbours_close():
+    graph = nx.grid_2d_graph(33, 33)
+    sources, targets = index_edges(graph)
+    xy = layout.multilevel_layout(len(graph), sources, targets)
+    assert xy.shape == (1089, 2) and np.abs(xy).max() == pytest.approx(1)
+    assert np.array_equal(xy, layout.multilevel_layout(len(graph), sources, targets))
+    edge_length = np.linalg.norm(xy[sources] - xy[targets], axis=1).mean()
+    rng = np.random.default_rng(1)
+    pairs = rng.integers(len(graph), size=(2000, 2))
+    pair_distance = np.linalg.norm(xy[pairs[:, 0]] - xy[pairs[:, 1]], axis=1).mean()
+    assert edge_length < pair_distance / 10
+
+
+def test_large_graphs_use_the_multilevel_layout(monkeypatch):
+    monkeypatch.setattr(layout, 'SPRING_LIMIT', 100)
+    graph = nx.balanced_tree(3, 4)
+    pos = layout.graph_layout(graph, directory=None)
+    sources, targets = index_edges(graph)
+    expected = layout.multilevel_layout(len(graph), sources, targets)
+    assert np.array_equal(np.array([pos[node] for node in graph]), expected)
@@ -0,0 +1,357 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import networkx as nx
+import numpy as np
+import pytest
+from scipy.optimize import linear_sum_assignment
+
+from common import market
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+MARKET = os.path.join(ROOT, 'Assignment 4', 'market.gml')
+
+
+# Random market graph where every buyer can get a seller of its own
+def random_market(seed, square=False, decimals=False):
+    rng = np.random.default_rng(seed)
+    num_sellers = int(rng.integers(1, 12))
+    num_buyers = num_sellers if square else int(rng.integers(1, num_sellers + 1))
+    graph = nx.Graph()
+    graph.add_nodes_from((f"s{i}", {'bipartite': 0, 'price': int(rng.integers(0, 3))}) for i in range(num_sellers))
+    graph.add_nodes_from((f"b{i}", {'bipartite': 1}) for i in range(num_buyers))
+    for buyer in range(num_buyers):
+        for seller in set(rng.choice(num_sellers, int(rng.integers(1, num_sellers + 1))).tolist()) | {buyer}:
+            valuation = round(float(rng.uniform(0, 10)), 2) if decimals else int(rng.integers(0, 15))
+            graph.add_edge(f"s{seller}", f"b{buyer}", valuation=valuation)
+    return graph
+
+
+def best_total(graph):
+    sellers = [node for node, side in graph.nodes(data='bipartite') if side == 0]
+    buyers = [node for node, side in graph.nodes(data='bipartite') if side == 1]
+    weights = np.full((len(buyers), len(sellers)), -1e9)
+    for u, v, valuation in graph.edges(data='valuation'):
+        seller, buyer = (u, v) if graph.nodes[u]['bipartite'] == 0 else (v, u)
+        weights[buyers.index(buyer), sellers.index(seller)] = valuation - graph.nodes[seller]['price']
+    rows, cols = linear_sum_assignment(weights, maximize=True)
+    return weights[rows, cols].sum()
+
+
+def test_market_gml_clears():
+    graph = nx.read_gml(MARKET)
+    prices, matching, rounds = market.clear_market(graph)
+    assert prices == {'0': 3, '1': 1, '2': 0}
+    assert matching == {'3': '0', '4': '2', '5': '1'}
+    assert rounds == 4
+
+
+def test_rounds_raise_prices_until_the_picks_match():
+    graph = nx.read_gml(MARKET)
+    prices = market.initial_prices(graph)
+    history = []
+    for round_num, state in market.auction_rounds(graph, prices):
+        history.append((dict(prices), state.perfect))
+        for buyer, (seller, payoff) in state.connections().items():
+            assert payoff == graph.edges[seller, buyer]['valuation'] - prices[seller]
+            assert all(graph.edges[other, buyer]['valuation'] - prices[other] <= payoff for other in graph[buyer])
+    assert [perfect for _, perfect in history] == [False] * 3 + [True]
+    for (before, _), (after, _) in zip(history, history[1:]):
+        assert all(after[seller] >= before[seller] for seller in before)
+
+
+def preferred_sellers(graph, prices, buyer):
+    payoffs = {seller: graph.edges[seller, buyer]['valuation'] - prices[seller] for seller in graph[buyer]}
+    best = max(payoffs.values())
+    return {seller for seller, payoff in payoffs.items() if payoff == best}
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_every_round_raises_a_constricted_set(seed):
+    graph = random_market(seed)
+    prices = market.initial_prices(graph)
+    for _, state in market.auction_rounds(graph, prices):
+        preferred = {buyer: preferred_sellers(graph, prices, buyer) for buyer in state.buyers}
+        matching = {buyer: seller for buyer, (seller, _) in state.connections().items()
+                    if state.matched[state.buyers.index(buyer)] >= 0}
+        assert all(seller in preferred[buyer] for buyer, seller in matching.items())
+        assert len(set(matching.values())) == len(matching)
+        # The matching is a maximum one of the preferred-seller graph
+        bipartite = nx.Graph((('b', buyer), ('s', seller)) for buyer, sellers in preferred.items() for seller in sellers)
+        maximum = nx.bipartite.maximum_matching(bipartite, top_nodes=[('b', buyer) for buyer in preferred])
+        assert len(matching) == len(maximum) // 2
+        if state.perfect:
+            break
+        # Hall's condition fails, for one unmatched buyer's tree and for the union the round raises
+        sellers, buyers = state.constricted()
+        tree = {state.sellers[seller] for seller in sellers.tolist()}
+        assert len(buyers) == len(tree) + 1
+        assert all(preferred[state.buyers[buyer]] <= tree for buyer in buyers.tolist())
+        raised = {state.sellers[seller] for seller in state.reached.tolist()}
+        inside = [buyer for buyer, sellers in preferred.items() if sellers <= raised]
+        assert tree <= raised and len(inside) > len(raised)
+
+
+def test_constricted_sets_of_two_separate_groups():
+    # Buyers b0, b1 both prefer s0 and b2, b3 both prefer s2; s1 and s3 are their fallbacks
+    graph = nx.Graph()
+    graph.add_nodes_from((f"s{i}", {'bipartite': 0, 'price': 0}) for i in range(4))
+    graph.add_nodes_from((f"b{i}", {'bipartite': 1}) for i in range(4))
+    graph.add_edges_from([('s0', 'b0', {'valuation': 9}), ('s1', 'b0', {'valuation': 1}),
+                          ('s0', 'b1', {'valuation': 8}), ('s1', 'b1', {'valuation': 1}),
+                          ('s2', 'b2', {'valuation': 9}), ('s3', 'b2', {'valuation': 2}),
+                          ('s2', 'b3', {'valuation': 7}), ('s3', 'b3', {'valuation': 2})])
+    state = market.AuctionState(market.Market.from_graph(graph))
+    free = sorted(state.free)
+    groups = [state.constricted(buyer) for buyer in free]
+    assert [([state.sellers[s] for s in sellers.tolist()], [state.buyers[b] for b in buyers.tolist()])
+            for sellers, buyers in groups] == [(['s0'], ['b0', 'b1']), (['s2'], ['b2', 'b3'])]
+    assert state.constricted(None)[0].tolist() == groups[0][0].tolist()
+    assert [state.sellers[s] for s in state.reached.tolist()] == ['s0', 's2']
+    matched = next(buyer for buyer in range(4) if buyer not in state.free)
+    with pytest.raises(ValueError):
+        state.constricted(matched)
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_round_loop_ends_at_the_minimal_clearing_prices(seed):
+    graph = random_market(seed)
+    prices, matching, _ = market.clear_market(graph)
+    assert prices == market.solve_market(graph, 'hungarian')[0]
+    assert len(set(matching.values())) == len(matching)
+    for buyer, seller in matching.items():
+        assert seller in preferred_sellers(graph, prices, buyer)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_edges_listed_buyer_first_give_the_same_result(seed):
+    graph = random_market(seed)
+    # Buyers before sellers, so graph.edges() lists every edge buyer first
+    flipped = nx.Graph()
+    flipped.add_nodes_from(node for node in graph.nodes(data=True) if node[1]['bipartite'] == 1)
+    flipped.add_nodes_from(node for node in graph.nodes(data=True) if node[1]['bipartite'] == 0)
+    flipped.add_edges_from((v, u, data) for u, v, data in graph.edges(data=True))
+    prices, matching, rounds = market.clear_market(flipped)
+    assert prices == market.clear_market(graph)[0]
+    assert all(seller in preferred_sellers(graph, prices, buyer) for buyer, seller in matching.items())
+
+
+def test_given_prices_are_the_floor():
+    graph = nx.read_gml(MARKET)
+    prices, matching, _ = market.clear_market(graph, {'0': 4, '1': 0, '2': 0})
+    assert prices['0'] >= 4 and len(set(matching.values())) == 3
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_round_loop_applies_given_prices_to_a_market(seed):
+    graph = random_market(seed)
+    given = {seller: price + 2 * (i % 2) for i, (seller, price) in enumerate(market.initial_prices(graph).items())}
+    bids = market.Market.from_graph(graph)
+    expected = market.clear_market(graph, given)
+    assert market.clear_market(bids, dict(given)) == expected
+    # auction_rounds starts from the given prices and keeps the dict in step
+    prices = dict(given)
+    for _, state in market.auction_rounds(bids, prices):
+        assert prices == state.price_dict()
+    assert prices == expected[0]
+    with pytest.raises(ValueError, match="no price given for seller"):
+        market.clear_market(bids, dict(list(given.items())[1:]))
+
+
+@pytest.mark.parametrize('method', ['hungarian', 'auction'])
+@pytest.mark.parametrize('seed', range(20))
+def test_solvers_apply_given_prices_to_a_market(seed, method):
+    graph = random_market(seed)
+    given = {seller: price + 2 * (i % 2) for i, (seller, price) in enumerate(market.initial_prices(graph).items())}
+    bids = market.Market.from_graph(graph)
+    start = bids.prices.copy()
+    assert market.solve_market(bids, method, given) == market.solve_market(graph, method, given)
+    assert (bids.prices == start).all()
+    with pytest.raises(ValueError, match="no price given for seller"):
+        market.solve_market(bids, method, dict(list(given.items())[1:]))
+
+
+@pytest.mark.parametrize('method', ['hungarian', 'auction'])
+@pytest.mark.parametrize('seed', range(60))
+def test_solvers_find_clearing_prices_and_an_optimal_matching(seed, method):
+    graph = random_market(seed)
+    prices, matching, _ = market.solve_market(graph, method)
+    buyers = [node for node, side in graph.nodes(data='bipartite') if side == 1]
+    assert sorted(matching) == sorted(buyers) and len(set(matching.values())) == len(buyers)
+    # Sellers left unsold may differ in starting price, so the optimum is net of those
+    assert sum(graph.edges[seller, buyer]['valuation'] - graph.nodes[seller]['price']
+               for buyer, seller in matching.items()) == best_total(graph)
+    for buyer, seller in matching.items():
+        payoff = graph.edges[seller, buyer]['valuation'] - prices[seller]
+        assert all(graph.edges[other, buyer]['valuation'] - prices[other] <= payoff for other in graph[buyer])
+    assert all(prices[seller] >= graph.nodes[seller]['price'] for seller in prices)
+    if method == 'auction':
+        assert prices == market.solve_market(graph, 'hungarian')[0]
+
+
+@pytest.mark.parametrize('seed', range(60))
+def test_auction_is_exact_on_decimal_valuations(seed):
+    graph = random_market(seed, decimals=True)
+    prices, matching, _ = market.solve_market(graph, 'hungarian')
+    auction_prices, auction_matching, _ = market.solve_market(graph, 'auction')
+    assert auction_prices == prices
+    assert sum(graph.edges[seller, buyer]['valuation'] for buyer, seller in auction_matching.items()) == \
+        pytest.approx(sum(graph.edges[seller, buyer]['valuation'] for buyer, seller in matching.items()))
+    # Prices have no more decimals than the valuations
+    assert all(round(price, 2) == price for price in prices.values())
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_auction_with_many_more_sellers_than_buyers(seed):
+    rng = np.random.default_rng(seed)
+    graph = nx.Graph()
+    graph.add_nodes_from((f"s{i}", {'bipartite': 0, 'price': int(rng.integers(0, 4))}) for i in range(60))
+    graph.add_nodes_from((f"b{i}", {'bipartite': 1}) for i in range(6))
+    for buyer in range(6):
+        for seller in rng.choice(60, 5, replace=False).tolist():
+            graph.add_edge(f"s{seller}", f"b{buyer}", valuation=int(rng.integers(0, 20)))
+    prices, matching, _ = market.solve_market(graph, 'auction')
+    assert prices == market.solve_market(graph, 'hungarian')[0]
+    assert sum(graph.edges[seller, buyer]['valuation'] - graph.nodes[seller]['price']
+               for buyer, seller in matching.items()) == best_total(graph)
+
+
+def test_solvers_agree_with_the_round_loop_on_market_gml():
+    graph = nx.read_gml(MARKET)
+    expected = market.clear_market(graph)[:2]
+    assert market.solve_market(graph, 'hungarian')[:2] == expected
+    assert market.solve_market(graph, 'auction')[:2] == expected
+
+
+def write_flat(graph, filename):
+    # Sellers and buyers by their number, one "seller buyer valuation" line per bid
+    separator = ',' if filename.endswith('.csv') else ' '
+    with open(filename, 'w') as f:
+        f.write('# seller buyer valuation\n')
+        for u, v, valuation in graph.edges(data='valuation'):
+            seller, buyer = (u, v) if u.startswith('s') else (v, u)
+            f.write(f"{seller[1:]}{separator}{buyer[1:]}{separator}{valuation}\n")
+
+
+@pytest.mark.parametrize('extension', ['.txt', '.csv'])
+@pytest.mark.parametrize('seed', range(10))
+def test_flat_file_clears_like_the_graph(tmp_path, monkeypatch, seed, extension):
+    graph = random_market(seed)
+    for seller in market.sellers(graph):
+        graph.nodes[seller]['price'] = 0      # flat files have no starting prices
+    filename = str(tmp_path / f"market{extension}")
+    write_flat(graph, filename)
+    monkeypatch.setattr(market, 'BID_CHUNK', 3)
+    flat = market.Market.read(filename)
+    assert len(flat.valuations) == graph.number_of_edges()
+    prices, matching, rounds = market.clear_market(flat)
+    expected = market.clear_market(graph)
+    # Sellers without bids are not in the file, and keep a price of 0 in the graph
+    assert {f"s{seller}": price for seller, price in prices.items()} == {
+        seller: price for seller, price in expected[0].items() if graph.degree(seller) or price}
+    assert rounds == expected[2]
+    assert {f"b{buyer}": f"s{seller}" for buyer, seller in matching.items()} == expected[1]
+
+
+def test_gml_market_loads_like_the_graph(tmp_path):
+    shutil.copy(MARKET, tmp_path)
+    graph = nx.read_gml(MARKET)
+    expected = market.Market.from_graph(graph)
+    for _ in range(2):   # parsed, then from the cache
+        loaded = market.Market.read(str(tmp_path / 'market.gml'))
+        assert loaded.sellers == expected.sellers and loaded.buyers == expected.buyers
+        assert loaded.prices.tolist() == expected.prices.tolist()
+        bids = sorted(zip(loaded.edge_sellers.tolist(), loaded.edge_buyers.tolist(), loaded.valuations.tolist()))
+        assert bids == sorted(zip(expected.edge_sellers.tolist(), expected.edge_buyers.tolist(),
+                                  expected.valuations.tolist()))
+    assert market.clear_market(loaded) == market.clear_market(graph)
+    rebuilt = expected.to_graph()
+    assert dict(rebuilt.nodes(data='bipartite')) == dict(graph.nodes(data='bipartite'))
+    assert {frozenset(edge[:2]): edge[2] for edge in rebuilt.edges(data='valuation')} == {
+        frozenset(edge[:2]): edge[2] for edge in graph.edges(data='valuation')}
+
+
+def test_bids_are_grouped_per_buyer_and_per_seller():
+    graph = random_market(3)
+    bids = market.Market.from_graph(graph)
+    for side, order, offsets in ((bids.edge_buyers, bids.by_buyer, bids.buyer_offsets),
+                                 (bids.edge_sellers, bids.by_seller, bids.seller_offsets)):
+        grouped = side[order]
+        for i in range(len(offsets) - 1):
+            assert (grouped[offsets[i]:offsets[i + 1]] == i).all()
+        assert offsets[-1] == len(side)
+
+
+def test_unclearable_market_raises():
+    graph = nx.Graph()
+    graph.add_nodes_from([('s0', {'bipartite': 0}), ('s1', {'bipartite': 0}), ('b0', {'bipartite': 1}),
+                          ('b1', {'bipartite': 1})])
+    graph.add_edges_from([('s0', 'b0', {'valuation': 3}), ('s0', 'b1', {'valuation': 4})])
+    for method in ('hungarian', 'auction'):
+        with pytest.raises(ValueError):
+            market.solve_market(graph, method)
+    with pytest.raises(ValueError):
+        market.clear_market(graph)
+
+
+def test_script_solver_prints_the_same_match(tmp_path):
+    shutil.copy(MARKET, tmp_path)
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'Assignment 4', 'market_strategy.py'), 'market.gml',
+                             '--solver', 'hungarian'], cwd=tmp_path, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert 'Node 0 = 3\nNode 1 = 1\nNode 2 = 0\n' in result.stdout
+    for line in ('Node 0 is matched with Node 3', 'Node 2 is matched with Node 4', 'Node 1 is matched with Node 5'):
+        assert line in result.stdout
+
+
+def test_script_reads_a_flat_file(tmp_path):
+    graph = random_market(5)
+    for seller in market.sellers(graph):
+        graph.nodes[seller]['price'] = 0
+    write_flat(graph, str(tmp_path / 'market.txt'))
+    prices, matching, _ = market.clear_market(graph)
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'Assignment 4', 'market_strategy.py'), 'market.txt',
+                             '--details'], cwd=tmp_path, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert 'Best Payoffs:' in result.stdout
+    for buyer, seller in matching.items():
+        assert f"Node {seller[1:]} is matched with Node {buyer[1:]}" in result.stdout
+
+
+def test_flat_file_sellers_and_buyers_stay_apart_in_the_graph(tmp_path):
+    graph = random_market(5)
+    write_flat(graph, str(tmp_path / 'market.txt'))
+    flat = market.Market.read(str(tmp_path / 'market.txt'))
+    rebuilt = flat.to_graph()
+    # Flat-file sellers and buyers share ids, so the nodes become s<id> and b<id> as in random_market
+    assert set(rebuilt) == {node for node in graph if graph.degree(node)}
+    assert {frozenset(edge[:2]): edge[2] for edge in rebuilt.edges(data='valuation')} == {
+        frozenset(edge[:2]): edge[2] for edge in graph.edges(data='valuation')}
+    # GML labels are distinct already and stay the nodes
+    gml = market.Market.read(MARKET).to_graph()
+    assert dict(gml.nodes(data='bipartite')) == dict(nx.read_gml(MARKET).nodes(data='bipartite'))
+
+
+@pytest.mark.parametrize('args', [['--interactive'], ['--interactive', '--save', 'plot.png'],
+                                  ['--solver', 'hungarian', '--plot', '--save', 'plot.png'],
+                                  ['--solver', 'auction', '--interactive'], ['--plot', '--save', 'plot.png']])
+def test_script_plots_a_flat_file(tmp_path, args):
+    write_flat(random_market(5), str(tmp_path / 'market.txt'))
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'Assignment 4', 'market_strategy.py'), 'market.txt',
+                             *args], cwd=tmp_path, capture_output=True, text=True, timeout=120,
+                            env={**os.environ, 'MPLBACKEND': 'Agg'})
+    assert result.returncode == 0, result.stderr
+    if '--save' in args:
+        assert list(tmp_path.glob('plot*.png'))
+
+
+def test_script_output_is_unchanged(tmp_path):
+    shutil.copy(MARKET, tmp_path)
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'Assignment 4', 'market_strategy.py'), 'market.gml'],
+                            cwd=tmp_path, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.count('---- Round') == 4
+    assert result.stdout.endswith('Perfect match found:\nNode 0 is matched with Node 3\n'
+                                  'Node 2 is matched with Node 4\nNode 1 is matched with Node 5\n')
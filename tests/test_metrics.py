@@ -0,0 +1,60 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from common.metrics import (approximate_clustering, clustering, neighborhood_overlap, triangle_counts,
+                            wedges_for_error)
+
+
+def random_graph(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(2, 80))
+    graph = nx.gnm_random_graph(n, int(rng.integers(0, 5 * n)), seed=seed)
+    graph.add_edges_from((u, u) for u in range(0, n, 7))   # self-loops are left out of clustering
+    return graph
+
+
+def edge_arrays(graph):
+    return np.array(list(graph.edges()), dtype=np.int64).reshape(-1, 2).T
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_overlap_is_the_jaccard_index_of_the_neighbourhoods(seed):
+    graph = random_graph(seed)
+    sources, targets = edge_arrays(graph)
+    edge_overlap, node_average = neighborhood_overlap(graph.number_of_nodes(), sources, targets)
+    for (u, v), value in zip(graph.edges(), edge_overlap.tolist()):
+        a, b = set(graph[u]), set(graph[v])
+        assert value == pytest.approx(len(a & b) / len(a | b))
+    for node in graph:
+        values = [edge_overlap[i] for i, edge in enumerate(graph.edges()) if node in edge]
+        assert node_average[node] == pytest.approx(np.mean(values) if values else 0)
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_clustering_matches_networkx(seed):
+    graph = random_graph(seed)
+    sources, targets = edge_arrays(graph)
+    triangles, _ = triangle_counts(graph.number_of_nodes(), sources, targets)
+    assert triangles.tolist() == [nx.triangles(graph)[node] for node in graph]
+    local, average, transitivity = clustering(graph.number_of_nodes(), sources, targets)
+    expected = nx.clustering(graph)
+    assert local.tolist() == pytest.approx([expected[node] for node in graph])
+    assert average == pytest.approx(nx.average_clustering(graph))
+    assert transitivity == pytest.approx(nx.transitivity(graph))
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_approximate_clustering_is_within_epsilon(seed):
+    graph = nx.barabasi_albert_graph(400, 6, seed=seed)
+    sources, targets = edge_arrays(graph)
+    local, average, transitivity = approximate_clustering(graph.number_of_nodes(), sources, targets, 0.05,
+                                                          delta=0.01, seed=seed)
+    exact, _, exact_transitivity = clustering(graph.number_of_nodes(), sources, targets)
+    degrees = np.array([graph.degree(node) for node in graph])
+    # Nodes with few wedges are counted, not sampled
+    small = degrees * (degrees - 1) // 2 <= wedges_for_error(0.05, 0.01)
+    assert np.array_equal(local[small], exact[small])
+    assert np.abs(local - exact).max() <= 0.05
+    assert abs(average - exact.mean()) <= 0.05
+    assert abs(transitivity - exact_transitivity) <= 0.05
@@ -0,0 +1,101 @@
+import json
+from multiprocessing import Pool
+
+import networkx as nx
+import pytest
+
+from common.partition import (build_dendrogram, girvan_newman_splits, make_betweenness, parallel_edge_betweenness,
+                              partition_from_dendrogram, sampled_edge_betweenness, serial_edge_betweenness,
+                              write_dendrogram)
+
+
+def random_graph(seed):
+    return nx.gnm_random_graph(12 + seed % 8, 20 + seed % 15, seed=seed)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_every_removal_is_a_highest_betweenness_edge(seed):
+    graph = random_graph(seed)
+    reference = graph.copy()
+    for (u, v), score, num_components, parts in girvan_newman_splits(graph):
+        scores = nx.edge_betweenness_centrality(reference)
+        assert score == pytest.approx(max(scores.values()))
+        assert scores.get((u, v), scores.get((v, u))) == pytest.approx(score)
+        reference.remove_edge(u, v)
+        assert num_components == nx.number_connected_components(reference)
+        if parts:
+            assert set(parts[0]) | set(parts[1]) == nx.node_connected_component(reference, u) | \
+                nx.node_connected_component(reference, v)
+    assert reference.number_of_edges() == 0
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_dendrogram_gives_connected_partitions_of_every_size(seed):
+    graph = random_graph(seed)
+    dendrogram = build_dendrogram(graph)
+    assert graph.number_of_edges() == random_graph(seed).number_of_edges()   # works on a copy
+    start = nx.number_connected_components(graph)
+    for k in range(start, graph.number_of_nodes() + 1):
+        parts = partition_from_dendrogram(dendrogram, k)
+        assert len(parts) == k
+        assert sorted(node for part in parts for node in part) == sorted(graph)
+        for part in parts:
+            assert nx.is_connected(graph.subgraph(part))
+
+
+def test_first_split_matches_networkx_girvan_newman():
+    # Two cliques joined by one bridge: the bridge carries the highest betweenness
+    graph = nx.barbell_graph(5, 0)
+    expected = next(nx.community.girvan_newman(graph))
+    parts = partition_from_dendrogram(build_dendrogram(graph), 2)
+    assert sorted(map(sorted, parts)) == sorted(map(sorted, expected))
+
+
+def test_written_dendrogram_reads_back(tmp_path):
+    graph = random_graph(3)
+    dendrogram = build_dendrogram(graph)
+    write_dendrogram(dendrogram, tmp_path / 'splits.json')
+    with open(tmp_path / 'splits.json') as f:
+        saved = json.load(f)
+    for k in (2, 4, 6):
+        assert partition_from_dendrogram(saved, k) == partition_from_dendrogram(dendrogram, k)
+
+
+def unordered(scores):
+    return {frozenset(edge): value for edge, value in scores.items()}
+
+
+def test_parallel_betweenness_matches_serial():
+    graph = nx.relabel_nodes(nx.gnm_random_graph(60, 150, seed=3), lambda node: f"n{node}")
+    with Pool(2) as pool:
+        parallel = parallel_edge_betweenness(graph, pool, 2, min_nodes=0)
+        # A second call must not reuse the graph the workers kept from the first
+        smaller = parallel_edge_betweenness(graph.subgraph(list(graph)[:40]), pool, 2, min_nodes=0)
+    serial = serial_edge_betweenness(graph)
+    # Same edges, in the same order and orientation as the serial scores
+    assert list(parallel) == list(serial)
+    assert parallel == pytest.approx(serial)
+    assert smaller == pytest.approx(serial_edge_betweenness(graph.subgraph(list(graph)[:40])))
+
+
+def test_sampled_betweenness_with_every_source_is_exact():
+    graph = nx.gnm_random_graph(30, 60, seed=4)
+    assert sampled_edge_betweenness(graph, 30, seed=1) == serial_edge_betweenness(graph)
+
+
+def test_sampled_betweenness_is_close_to_exact():
+    graph = nx.connected_watts_strogatz_graph(300, 6, 0.1, seed=5)
+    exact = serial_edge_betweenness(graph)
+    sampled = sampled_edge_betweenness(graph, 150, seed=2)
+    assert sampled.keys() == exact.keys()
+    # Normalised like nx.edge_betweenness_centrality
+    scale = 2 / (300 * 299)
+    assert max(abs(sampled[edge] - exact[edge]) * scale for edge in exact) < 0.02
+
+
+@pytest.mark.parametrize('kind', ['serial', 'sampled'])
+def test_components_agree_across_backends(kind):
+    graph = nx.barbell_graph(6, 2)
+    betweenness = make_betweenness(kind, pivots=graph.number_of_nodes(), seed=0)
+    parts = partition_from_dendrogram(build_dendrogram(graph, betweenness), 2)
+    assert sorted(map(sorted, parts)) == sorted(map(sorted, partition_from_dendrogram(build_dendrogram(graph), 2)))
@@ -0,0 +1,88 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from common.balance import check_balance
+from common.graph_index import GraphIndex
+from common.partition import serial_edge_betweenness
+from common.pipeline import ANALYSES, run_pipeline
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def analysed_graph(seed):
+    rng = np.random.default_rng(seed)
+    graph = nx.connected_watts_strogatz_graph(40, 4, 0.2, seed=seed)
+    for node, data in graph.nodes(data=True):
+        data['color'] = ['red', 'blue'][rng.integers(2)]
+    for _, _, data in graph.edges(data=True):
+        data['sign'] = [1, -1][rng.integers(2)] if seed % 2 else 1
+    return graph
+
+
+def options(**overrides):
+    return {'attribute': 'color', 'permutations': 0, 'processes': 1, 'components': 3,
+            'betweenness': serial_edge_betweenness, 'clustering_epsilon': None, **overrides}
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_analyses_match_networkx(seed):
+    graph = analysed_graph(seed)
+    report = run_pipeline(GraphIndex(graph), list(ANALYSES), options())
+    assert list(report) == list(ANALYSES)
+    assert all(result['seconds'] >= 0 for result in report.values())
+
+    colors = dict(graph.nodes(data='color'))
+    same = sum(colors[u] == colors[v] for u, v in graph.edges())
+    assert (report['homophily']['same'], report['homophily']['different']) == (same, graph.number_of_edges() - same)
+
+    balanced, _ = check_balance(graph)
+    assert report['balance']['balanced'] == balanced
+    if balanced:
+        assert sum(report['balance']['camp_sizes']) == 40
+
+    consistent = all((colors[u] == colors[v]) == (sign == 1) for u, v, sign in graph.edges(data='sign'))
+    assert report['attribute_balance']['balanced'] == consistent
+
+    assert report['clustering']['average'] == pytest.approx(nx.average_clustering(graph))
+    assert report['clustering']['transitivity'] == pytest.approx(nx.transitivity(graph))
+    assert report['overlap']['local_bridges'] == len(list(nx.local_bridges(graph, with_span=False)))
+
+    split = graph.copy()
+    for u, v in report['components']['removed_edges']:
+        split.remove_edge(u, v)
+    assert report['components']['components'] == nx.number_connected_components(split) >= 3
+    assert report['components']['sizes'] == sorted(map(len, nx.connected_components(split)), reverse=True)
+
+
+def test_components_leave_the_graph_alone():
+    graph = analysed_graph(1)
+    run_pipeline(GraphIndex(graph), ['components'], options())
+    assert graph.number_of_edges() == analysed_graph(1).number_of_edges()
+
+
+def test_cli_writes_the_report(tmp_path):
+    shutil.copy(os.path.join(ROOT, 'Assignment 2', 'homophily.gml'), tmp_path)
+    report = tmp_path / 'report.json'
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'Assignment 2', 'graph_analysis.py'), 'homophily.gml',
+                             '--pipeline', 'homophily,balance,clustering', '--permutations', '0',
+                             '--report', str(report)], cwd=tmp_path, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    content = json.loads(report.read_text())
+    assert list(content['analyses']) == ['homophily', 'balance', 'clustering']
+    graph = nx.read_gml(tmp_path / 'homophily.gml')
+    assert (content['nodes'], content['edges']) == (graph.number_of_nodes(), graph.number_of_edges())
+
+
+def test_cli_rejects_unknown_analyses(tmp_path):
+    shutil.copy(os.path.join(ROOT, 'Assignment 2', 'homophily.gml'), tmp_path)
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'Assignment 2', 'graph_analysis.py'), 'homophily.gml',
+                             '--pipeline', 'homophily,nonsense'], cwd=tmp_path, capture_output=True, text=True,
+                            timeout=120)
+    assert result.returncode == 2 and 'nonsense' in result.stderr
@@ -0,0 +1,108 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import networkx as nx
+import numpy as np
+import pytest
+from matplotlib.collections import LineCollection, PathCollection
+from matplotlib.image import AxesImage
+
+from common import render
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+PNG = b'\x89PNG\r\n\x1a\n'
+
+
+def test_graph_arrays_index_nodes_in_order():
+    graph = nx.Graph([('a', 'b'), ('b', 'c')])
+    pos = {'a': (0, 1), 'b': (2, 3), 'c': (4, 5)}
+    nodes, x, y, sources, targets = render.graph_arrays(graph, pos)
+    assert nodes == ['a', 'b', 'c']
+    assert x.tolist() == [0, 2, 4] and y.tolist() == [1, 3, 5]
+    assert sources.tolist() == [0, 1] and targets.tolist() == [1, 2]
+
+
+def test_small_graphs_are_one_line_collection_and_one_scatter():
+    graph = nx.cycle_graph(6)
+    pos = nx.circular_layout(graph)
+    fig, ax = plt.subplots()
+    render.draw_networkx(ax, graph, pos)
+    lines = [c for c in ax.collections if isinstance(c, LineCollection)]
+    points = [c for c in ax.collections if isinstance(c, PathCollection)]
+    assert len(lines) == 1 and len(points) == 1
+    segments = lines[0].get_segments()
+    assert len(segments) == 6
+    for (u, v), segment in zip(graph.edges(), segments):
+        assert np.allclose(segment, [pos[u], pos[v]])
+    assert np.allclose(points[0].get_offsets(), [pos[node] for node in graph])
+    assert [text.get_text() for text in ax.texts] == [str(node) for node in graph]
+    plt.close(fig)
+
+
+def test_large_graphs_become_a_density_image():
+    graph = nx.grid_2d_graph(20, 20)
+    pos = {node: node for node in graph}
+    fig, ax = plt.subplots()
+    render.draw_networkx(ax, graph, pos, density_threshold=100)
+    assert not ax.collections and not ax.texts
+    assert len([image for image in ax.images if isinstance(image, AxesImage)]) == 2
+    plt.close(fig)
+
+
+def test_density_bins_every_edge_sample():
+    x = np.array([0.0, 1.0, 1.0])
+    y = np.array([0.0, 0.0, 1.0])
+    fig, ax = plt.subplots()
+    render.draw_density(ax, x, y, np.array([0, 1]), np.array([1, 2]), bins=10)
+    edges, nodes = ax.images
+    assert np.expm1(edges.get_array()).sum() == pytest.approx(2 * render.EDGE_SAMPLES)
+    assert np.expm1(nodes.get_array()).sum() == pytest.approx(3)
+    plt.close(fig)
+
+
+def test_labels_are_skipped_past_the_limit():
+    graph = nx.path_graph(render.LABEL_LIMIT + 1)
+    fig, ax = plt.subplots()
+    render.draw_networkx(ax, graph, {node: (node, 0) for node in graph})
+    assert not ax.texts
+    plt.close(fig)
+
+
+@pytest.mark.parametrize('extension', ['png', 'svg'])
+def test_show_or_save_writes_the_file(tmp_path, extension):
+    output = str(tmp_path / f'graph.{extension}')
+    fig, ax = render.new_figure((3, 3), output)
+    render.draw_networkx(ax, nx.star_graph(4), nx.spring_layout(nx.star_graph(4), seed=0))
+    render.show_or_save(fig, output)
+    content = open(output, 'rb').read()
+    assert content.startswith(PNG) if extension == 'png' else b'<svg' in content
+
+
+def run(*args, cwd):
+    # HOME keeps caches the scripts write under ~ inside the test directory
+    env = dict(os.environ, MPLBACKEND='Agg', HOME=str(cwd))
+    result = subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True, text=True,
+                            timeout=120)
+    assert result.returncode == 0, result.stdout + result.stderr
+    return result.stdout
+
+
+def test_scripts_save_plots_without_a_display(tmp_path):
+    shutil.copy(os.path.join(ROOT, 'Assignment 2', 'graph_file.gml'), tmp_path)
+    shutil.copy(os.path.join(ROOT, 'Assignment 4', 'market.gml'), tmp_path)
+    run(os.path.join(ROOT, 'Assignment 2', 'graph_analysis.py'), 'graph_file.gml', '--components', '2',
+        '--plot', 'C', '--save', 'components.svg', cwd=tmp_path)
+    run(os.path.join(ROOT, 'Assignment 1 (Graph)', 'erdos_renyi_graph.py'), '--input', 'graph_file.gml',
+        '--BFS', '1', '--plot', '--save', 'bfs.png', cwd=tmp_path)
+    run(os.path.join(ROOT, 'Assignment 4', 'market_strategy.py'), 'market.gml', '--plot', '--save',
+        'market.png', cwd=tmp_path)
+    assert b'<svg' in (tmp_path / 'components.svg').read_bytes()
+    assert (tmp_path / 'bfs.png').read_bytes().startswith(PNG)
+    assert (tmp_path / 'market.png').read_bytes().startswith(PNG)
@@ -0,0 +1,171 @@
+import json
+import os
+import shutil
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import networkx as nx
+import pytest
+
+from common import server
+from common.balance import check_balance
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+@pytest.fixture
+def serve():
+    """Start an AnalysisServer on a free port; returns get(endpoint, **params) -> (status, body)."""
+    running = []
+
+    def start(*args, **kwargs):
+        instance = server.AnalysisServer(('127.0.0.1', 0), *args, **kwargs)
+        threading.Thread(target=instance.serve_forever, daemon=True).start()
+        running.append(instance)
+
+        def get(endpoint, **params):
+            url = f"http://127.0.0.1:{instance.server_address[1]}/{endpoint}?{urllib.parse.urlencode(params)}"
+            try:
+                with urllib.request.urlopen(url, timeout=60) as response:
+                    return response.status, json.loads(response.read())
+            except urllib.error.HTTPError as e:
+                return e.code, json.loads(e.read())
+        return get
+
+    yield start
+    for instance in running:
+        instance.shutdown()
+        instance.server_close()
+
+
+def signed_file(tmp_path, seed, name='signed.gml'):
+    graph = nx.gnm_random_graph(30, 50, seed=seed)
+    for i, (_, _, data) in enumerate(graph.edges(data=True)):
+        data['color'] = 'r' if (i * (seed + 1)) % 5 == 0 else 'g'
+    filename = str(tmp_path / name)
+    nx.write_gml(graph, filename)
+    return filename
+
+
+def test_answers_match_the_direct_analyses(serve, tmp_path):
+    filename = signed_file(tmp_path, 1)
+    get = serve([filename])
+    graph = nx.read_gml(filename)
+    for _, _, data in graph.edges(data=True):
+        data['sign'] = -1 if data['color'] == 'r' else 1
+
+    status, body = get('balance', graph=filename)
+    assert status == 200 and body['balanced'] == check_balance(graph)[0]
+
+    status, body = get('bfs', graph=filename, source='0', target='7')
+    distances = nx.single_source_shortest_path_length(graph, '0')
+    assert status == 200 and body['reached'] == len(distances)
+    assert body['levels'] == [list(distances.values()).count(d) for d in range(max(distances.values()) + 1)]
+    assert body['distance'] == distances.get('7', -1)
+
+    status, body = get('components', graph=filename, k='3')
+    assert status == 200 and body['components'] >= 3 and sum(body['sizes']) == 30
+
+    status, body = get('graphs')
+    assert body == {os.path.realpath(filename): {'nodes': 30, 'edges': 50}}
+
+
+def test_market_endpoint_clears_the_market(serve, tmp_path):
+    shutil.copy(os.path.join(ROOT, 'Assignment 4', 'market.gml'), tmp_path)
+    get = serve(graph_dir=str(tmp_path))
+    status, body = get('market', graph=str(tmp_path / 'market.gml'))
+    assert status == 200
+    assert body['prices'] == {'0': 3, '1': 1, '2': 0}
+    assert body['matching'] == {'3': '0', '4': '2', '5': '1'}
+
+
+def test_answers_are_cached_until_the_file_changes(serve, tmp_path):
+    filename = signed_file(tmp_path, 1)
+    get = serve([filename])
+    first = get('bfs', graph=filename, source='0')[1]
+    second = get('bfs', graph=filename, source='0')[1]
+    assert first.pop('cached') is False and second.pop('cached') is True
+    assert second == first
+    assert get('metrics')[1]['cache_hits'] == 1
+
+    graph = nx.path_graph(4)
+    nx.write_gml(graph, filename)
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    status, body = get('bfs', graph=filename, source='0')
+    assert status == 200 and body['reached'] == 4 and body['levels'] == [1, 1, 1, 1]
+    assert get('metrics')[1]['cache_hits'] == 1
+
+
+def test_metrics_count_every_endpoint(serve, tmp_path):
+    filename = signed_file(tmp_path, 2)
+    get = serve([filename])
+    for source in ('0', '1', '2'):
+        get('bfs', graph=filename, source=source)
+    get('balance', graph=filename)
+    metrics = get('metrics')[1]
+    assert metrics['graphs'] == 1
+    assert metrics['endpoints']['bfs']['requests'] == 3
+    assert metrics['endpoints']['balance']['requests'] == 1
+    bfs = metrics['endpoints']['bfs']
+    assert 0 <= bfs['p50_ms'] <= bfs['p95_ms'] <= bfs['max_ms']
+
+
+def test_bad_requests(serve, tmp_path):
+    filename = signed_file(tmp_path, 3)
+    get = serve([filename])
+    assert get('nonsense')[0] == 404
+    assert get('balance')[0] == 400
+    assert get('bfs', graph=filename, source='no such node')[0] == 400
+    assert get('balance', graph=str(tmp_path / 'missing.gml'))[0] == 403
+
+
+def test_only_configured_graphs_are_served(serve, tmp_path):
+    served = tmp_path / 'served'
+    served.mkdir()
+    inside = signed_file(served, 4, 'inside.gml')
+    listed = signed_file(tmp_path, 5, 'listed.gml')
+    other = signed_file(tmp_path, 6, 'other.gml')
+    get = serve([listed], graph_dir=str(served))
+    assert get('balance', graph=listed)[0] == 200
+    assert get('balance', graph=inside)[0] == 200
+    assert get('balance', graph='inside.gml')[0] == 200
+    assert get('balance', graph=other)[0] == 403
+    assert get('balance', graph='../other.gml')[0] == 403
+    assert get('balance', graph='/etc/passwd')[0] == 403
+    os.symlink(other, served / 'link.gml')
+    assert get('balance', graph='link.gml')[0] == 403
+    assert get('balance', graph='missing.gml')[0] == 404
+
+
+def test_analysis_errors_are_500(serve, tmp_path):
+    (tmp_path / 'broken.gml').write_text('graph [\n  node [\n')
+    get = serve(graph_dir=str(tmp_path))
+    status, body = get('balance', graph='broken.gml')
+    assert status == 500 and body['error']
+
+
+def test_a_slow_load_does_not_block_other_graphs(serve, tmp_path, monkeypatch):
+    slow, fast = signed_file(tmp_path, 7, 'slow.gml'), signed_file(tmp_path, 8, 'fast.gml')
+    release, started = threading.Event(), threading.Event()
+
+    class SlowGraph(server.ResidentGraph):
+        def __init__(self, filename):
+            if filename.endswith('slow.gml'):
+                started.set()
+                assert release.wait(30)
+            super().__init__(filename)
+
+    monkeypatch.setattr(server, 'ResidentGraph', SlowGraph)
+    get = serve(graph_dir=str(tmp_path))
+    results = {}
+    waiting = threading.Thread(target=lambda: results.update(slow=get('balance', graph=slow)))
+    waiting.start()
+    assert started.wait(30)
+    assert get('balance', graph=fast)[0] == 200
+    assert waiting.is_alive()
+    release.set()
+    waiting.join(30)
+    assert results['slow'][0] == 200
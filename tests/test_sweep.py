@@ -0,0 +1,61 @@
+import csv
+import json
+
+import networkx as nx
+import numpy as np
+import pytest
+
+SCRIPT = 'Assignment 1 (Graph)/erdos_renyi_graph.py'
+
+
+def replica_graph(module, n, c, seed):
+    graph = nx.empty_graph(n)
+    for sources, targets in module.erdos_renyi_edges(n, (c * np.log(n)) / n, seed):
+        graph.add_edges_from(zip(sources.tolist(), targets.tolist()))
+    return graph
+
+
+@pytest.mark.parametrize('seed', range(15))
+def test_replica_stats_match_networkx(script, seed):
+    module = script(SCRIPT)
+    n, c = 120, [0.3, 0.8, 1.5][seed % 3]
+    stats = module._replica_stats((n, c, 0, seed, 5))
+    graph = replica_graph(module, n, c, seed)
+    components = list(nx.connected_components(graph))
+    giant = max(components, key=len)
+    assert stats['edges'] == graph.number_of_edges()
+    assert stats['connected'] == nx.is_connected(graph)
+    assert stats['components'] == len(components)
+    assert stats['giant_fraction'] == len(giant) / n
+    assert stats['bfs_depth'] == max(nx.single_source_shortest_path_length(graph, 5).values())
+    eccentricities = nx.eccentricity(graph.subgraph(giant))
+    assert max(eccentricities.values()) / 2 <= stats['diameter_estimate'] <= max(eccentricities.values())
+
+
+def test_sweep_writes_reproducible_json(script, tmp_path):
+    module = script(SCRIPT)
+    first, second = str(tmp_path / 'a.json'), str(tmp_path / 'b.json')
+    module.run_ensemble_sweep([50, 80], [0.5, 2.0], 3, first, seed=11, processes=1)
+    module.run_ensemble_sweep([50, 80], [0.5, 2.0], 3, second, seed=11, processes=1)
+    with open(first) as f:
+        results = json.load(f)
+    with open(second) as f:
+        assert json.load(f) == results
+
+    assert len(results['replicas']) == 12
+    assert [(row['nodes'], row['constant']) for row in results['aggregate']] == [
+        (50, 0.5), (50, 2.0), (80, 0.5), (80, 2.0)]
+    for row in results['aggregate']:
+        group = [r for r in results['replicas'] if (r['nodes'], r['constant']) == (row['nodes'], row['constant'])]
+        assert row['replicas'] == 3
+        assert row['p_connected'] == sum(r['connected'] for r in group) / 3
+        assert row['mean_giant_fraction'] == pytest.approx(np.mean([r['giant_fraction'] for r in group]))
+
+
+def test_sweep_writes_csv_averages(script, tmp_path):
+    results = str(tmp_path / 'sweep.csv')
+    script(SCRIPT).run_ensemble_sweep([40], [1.0, 3.0], 2, results, seed=1, processes=1)
+    with open(results, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [(row['nodes'], row['constant'], row['replicas']) for row in rows] == [('40', '1.0', '2'), ('40', '3.0', '2')]
+    assert all(0 <= float(row['p_connected']) <= 1 for row in rows)
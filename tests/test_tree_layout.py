@@ -0,0 +1,74 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+SCRIPT = 'Assignment 1 (Graph)/erdos_renyi_graph.py'
+
+
+# The recursive layout the script used before tree_layout
+def baseline_pos(G, root, width=1, vert_gap=1, vert_loc=0, xcenter=0.5, pos=None, parent=None):
+    if pos is None:
+        pos = {root: (xcenter, vert_loc)}
+    else:
+        pos[root] = (xcenter, vert_loc)
+    children = list(G.neighbors(root))
+    if not isinstance(G, nx.DiGraph) and parent is not None:
+        children.remove(parent)
+    if len(children) != 0:
+        dx = width / len(children)
+        nextx = xcenter - width / 2 - dx / 2
+        for child in children:
+            nextx += dx
+            pos = baseline_pos(G, child, width=dx, vert_gap=vert_gap, vert_loc=vert_loc - vert_gap,
+                               xcenter=nextx, pos=pos, parent=root)
+    return pos
+
+
+def random_tree(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 200))
+    graph = nx.gnm_random_graph(n, int(rng.integers(0, 3 * n)), seed=seed)
+    root = int(rng.integers(n))
+    return nx.bfs_tree(graph, root) if seed % 2 else nx.Graph(nx.bfs_tree(graph, root)), root
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_hierarchy_pos_matches_the_recursive_layout(script, seed):
+    module = script(SCRIPT)
+    tree, root = random_tree(seed)
+    width, vert_gap = 1 + seed % 5, 0.1 * (1 + seed % 3)
+    ours = module.hierarchy_pos(tree, root, width=width, vert_gap=vert_gap)
+    expected = baseline_pos(tree, root, width=width, vert_gap=vert_gap)
+    assert ours.keys() == expected.keys()
+    for node, (x, y) in expected.items():
+        assert ours[node] == pytest.approx((x, y))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_proportional_slots_nest_and_follow_subtree_sizes(script, seed):
+    module = script(SCRIPT)
+    tree, root = random_tree(seed)
+    tree = nx.bfs_tree(tree, root)
+    nodes, x, y = module.hierarchy_layout_arrays(tree, root, width=10, proportional=True)
+    pos = dict(zip(nodes, zip(x.tolist(), y.tolist())))
+    sizes = {node: len(nx.descendants(tree, node)) + 1 for node in tree}
+    slots = {root: 10.0}
+    for parent in nodes:
+        children = list(tree.successors(parent))
+        left = pos[parent][0] - slots[parent] / 2
+        for child in children:
+            slots[child] = slots[parent] * sizes[child] / (sizes[parent] - 1)
+            assert pos[child][0] == pytest.approx(left + slots[child] / 2)
+            assert pos[child][1] == pytest.approx(pos[parent][1] - 1)
+            left += slots[child]
+        if children:
+            assert left == pytest.approx(pos[parent][0] + slots[parent] / 2)
+
+
+def test_tree_layout_takes_arrays_indexed_by_node(script):
+    module = script(SCRIPT)
+    # 2 is the root, 0 and 3 its children, 1 a child of 3
+    x, y = module.tree_layout([2, 0, 3, 1], np.array([2, 3, -1, 2]), np.array([1, 2, 0, 1]),
+                              width=2, vert_gap=1, xcenter=0)
+    assert x.tolist() == pytest.approx([-0.5, 0.5, 0, 0.5])
+    assert y.tolist() == [-1, -2, 0, -1]